@@ -1,29 +1,10 @@
-import cv2
-from threading import Thread
-import time
-import struct
+from VisionFrameSource import SingleImageFrameSource
 
-class SingleFrameGrabber:
-    def __init__(self, file_path):
-        self.frame = cv2.imread(file_path)
-        self.stopped = False
-
-    def start(self):
-        Thread(target=self.update, args=()).start()
-        return self
-
-    def read(self):
-        """
-        Reads a frame from the frame grabber
-        """
-        return self.frame
 
-    def update(self):
-        while True:
-            if self.stopped:
-                break
+class SingleFrameGrabber(SingleImageFrameSource):
+    """
+    This serves a single image as if it were the camera, kept for the scripts that still use it
+    """
 
-            time.sleep(.1)
-
-    def stop(self):
-        self.stopped = True
\ No newline at end of file
+    def __init__(self, file_path):
+        SingleImageFrameSource.__init__(self, file_path, fps=10.0)
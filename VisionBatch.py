@@ -0,0 +1,272 @@
+import argparse
+import cv2
+import logging
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing.pool import ThreadPool
+from threading import Thread, BoundedSemaphore, local
+from VisionConfiguration import VisionConfiguration
+from VisionFrameSource import IMAGE_EXTENSIONS
+from VisionPlan import PIXEL_BGR
+from VisionProcessPool import get_worker_count
+from VisionProcessor import VisionProcessor, ProcessingContext, order_corners
+from VisionRecorder import VisionRecordReader, LOG_EXTENSION
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+'''
+This module is for running the vision over a whole directory, video or frame log of frames at once, so a
+configuration can be checked against thousands of snapshots without a camera. Frames are decoded ahead
+on their own thread and processed on a pool of threads, each with its own processor.
+'''
+
+logger = logging.getLogger('VisionBatch')
+
+# Frames decoded ahead of the ones being processed
+DEFAULT_PREFETCH = 8
+
+# Stages timed in the output, a column each
+TIMED_STAGES = ('total', 'smooth', 'threshold', 'open', 'close', 'contours', 'components', 'candidates', 'coarse')
+
+
+def read_frames(src):
+    """
+    Reads every frame of a directory of images, an image, a video or a frame log, as fast as it can
+    :param src: The path to read
+    :return: A generator of (name, frame), the name is the file name, or the frame number for videos and logs
+    """
+    extension = os.path.splitext(src)[1].lower()
+
+    if os.path.isdir(src):
+        for name in sorted(os.listdir(src)):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            frame = cv2.imread(os.path.join(src, name))
+            if frame is None:
+                logger.warning('Could not read %s', name)
+                continue
+
+            yield name, frame
+    elif extension in IMAGE_EXTENSIONS:
+        frame = cv2.imread(src)
+        if frame is not None:
+            yield os.path.basename(src), frame
+    elif extension == LOG_EXTENSION:
+        reader = VisionRecordReader(src)
+        try:
+            for k in range(len(reader)):
+                sequence, timestamp, frame = reader.read(k)
+                yield str(sequence), np.array(frame)
+        finally:
+            reader.close()
+    else:
+        stream = cv2.VideoCapture(src)
+        try:
+            position = 0
+            while True:
+                (grabbed, frame) = stream.read()
+                if not grabbed:
+                    break
+
+                yield str(position), frame
+                position += 1
+        finally:
+            stream.release()
+
+
+def prefetch(frames, depth=DEFAULT_PREFETCH):
+    """
+    Reads the frames on their own thread, keeping up to depth of them decoded ahead of the caller
+    :param frames: The iterable of frames to read
+    :param depth: How many frames to read ahead
+    :return: A generator of the same frames
+    """
+    decoded = queue.Queue(max(depth, 1))
+    end = object()
+    errors = []
+
+    def decode():
+        try:
+            for item in frames:
+                decoded.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            decoded.put(end)
+
+    thread = Thread(target=decode, args=())
+    thread.daemon = True
+    thread.start()
+
+    while True:
+        item = decoded.get()
+        if item is end:
+            break
+
+        yield item
+
+    if len(errors) > 0:
+        raise errors[0]
+
+
+class BatchResults:
+    """
+    This collects what was found in each frame a column at a time, so it's compact to save and easy to
+    filter with numpy
+    """
+
+    def __init__(self):
+        self.names = []
+        self.found = []
+        self.corners = []
+        self.areas = []
+        self.scores = []
+        self.candidates = []
+        self.sizes = []
+        self.timings = dict((stage, []) for stage in TIMED_STAGES)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, shape, points, candidates, timings):
+        """
+        Adds the detection of a frame
+        :param name: The name of the frame
+        :param shape: The shape of the frame
+        :param points: The corners of the target, None if it wasn't found
+        :param candidates: The Candidates found in the frame, best first
+        :param timings: The milliseconds each stage took
+        """
+        self.names.append(name)
+        self.found.append(points is not None)
+        self.corners.append(np.nan if points is None else order_corners(points))
+        self.areas.append(candidates[0].area if points is not None else 0.0)
+        self.scores.append(candidates[0].score if points is not None else 0.0)
+        self.candidates.append(len(candidates))
+        self.sizes.append(shape[1::-1])
+
+        for stage in TIMED_STAGES:
+            self.timings[stage].append(timings.get(stage, np.nan))
+
+    def get_columns(self):
+        """
+        Gets the columns of the results
+        :return: A dict of numpy arrays, one row per frame
+        """
+        corners = np.full((len(self), 4, 2), np.nan, dtype=np.float32)
+        for i, points in enumerate(self.corners):
+            corners[i] = points
+
+        columns = {
+            'name': np.array(self.names, dtype=str),
+            'found': np.array(self.found, dtype=bool),
+            'corners': corners,
+            'area': np.array(self.areas, dtype=np.float32),
+            'score': np.array(self.scores, dtype=np.float32),
+            'candidates': np.array(self.candidates, dtype=np.uint8),
+            'size': np.array(self.sizes, dtype=np.uint16).reshape(-1, 2)
+        }
+
+        for stage in TIMED_STAGES:
+            columns['ms_' + stage] = np.array(self.timings[stage], dtype=np.float32)
+
+        return columns
+
+    def save(self, path):
+        """
+        Saves the columns to a compressed npz
+        :param path: The path to save to
+        """
+        np.savez_compressed(path, **self.get_columns())
+
+
+def process_batch(frames, config, workers=0, prefetch_depth=DEFAULT_PREFETCH):
+    """
+    Finds the target in every frame, each searched in full since the frames needn't follow each other
+    :param frames: The iterable of (name, frame) to process, like read_frames gives
+    :param config: The VisionConfiguration to process with
+    :param workers: The amount of threads to process on, 0 for one per core
+    :param prefetch_depth: How many frames to decode ahead
+    :return: The BatchResults in frame order
+    """
+    workers = get_worker_count(workers)
+    pool = ThreadPool(workers)
+    processors = local()
+    results = BatchResults()
+
+    # Only let the pool have as many frames as it can work on, or it would read the whole batch into memory
+    in_flight = BoundedSemaphore(workers + max(prefetch_depth, 1))
+
+    def limit(items):
+        for item in items:
+            in_flight.acquire()
+            yield item
+
+    def process(item):
+        name, frame = item
+        processor = getattr(processors, 'processor', None)
+        if processor is None:
+            processor = processors.processor = VisionProcessor(config, ProcessingContext())
+
+        # The thread moves on to its next frame once this returns, so take what it found with it
+        processor.tracker.reset()
+        hull, points = processor.find_target(frame)
+        return name, frame.shape, points, processor.candidates, dict(processor.timings)
+
+    # Compile the plan once up front instead of in every thread
+    config.get_plan()
+
+    try:
+        for row in pool.imap(process, limit(prefetch(frames, prefetch_depth))):
+            results.add(*row)
+            in_flight.release()
+    finally:
+        pool.terminate()
+
+    return results
+
+
+def main(args=None):
+    """
+    Runs the vision over every frame of a source and saves what it found
+    :param args: The command line arguments, None for sys.argv
+    :return: The exit code
+    """
+    parser = argparse.ArgumentParser(description='Runs the vision over every frame of a directory, video or log')
+    parser.add_argument('source', help='Image directory, image, video or frame log to process')
+    parser.add_argument('-c', '--config', default='settings.conf', help='Configuration to process with')
+    parser.add_argument('-o', '--output', default='detections.npz', help='Where to save the detections')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='Threads to process on, 0 for one per core')
+    parser.add_argument('-p', '--prefetch', type=int, default=DEFAULT_PREFETCH, help='Frames to decode ahead')
+    args = parser.parse_args(args)
+
+    config = VisionConfiguration(args.config)
+
+    # Only frame logs keep the camera's format, everything else decodes to BGR
+    if os.path.splitext(args.source)[1].lower() != LOG_EXTENSION and config.get_pixel_format() != PIXEL_BGR:
+        logger.warning('Processing %s as bgr instead of %s', args.source, config.get_pixel_format())
+        config.set_pixel_format(PIXEL_BGR)
+
+    start = time.time()
+    results = process_batch(read_frames(args.source), config, args.workers, args.prefetch)
+    elapsed = time.time() - start
+    results.save(args.output)
+
+    columns = results.get_columns()
+    count = len(results)
+    print('Processed %d frames in %.2f seconds (%.1f fps)' % (count, elapsed, count / elapsed if elapsed > 0 else 0.0))
+    if count > 0:
+        print('Found the target in %d frames, %.2f ms per frame' % (columns['found'].sum(),
+                                                                    np.nanmean(columns['ms_total'])))
+    print('Saved the detections to ' + args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
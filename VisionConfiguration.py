@@ -1,6 +1,7 @@
 import ConfigParser as cP
 import numpy as np
 import logging
+from VisionPlan import VisionPlan
 
 """
 This Module is for retrieving and setting the configuration of the vision processing
@@ -15,6 +16,7 @@ TWO_LOW_KEY = "two_low"
 TWO_HIGH_KEY = "two_high"
 ONE_LOW_KEY = "one_low"
 ONE_HIGH_KEY = "one_high"
+EXTRA_RANGES_KEY = "extra_ranges"
 
 # Keys for Processing section
 PROCESSING_SECTION = "processing"
@@ -25,6 +27,61 @@ SHOULD_SMOOTH_KEY = "use_smooth"
 OPEN_KERNEL_KEY = "open_kernel_size"
 CLOSE_KERNEL_KEY = "close_kernel_size"
 SMOOTH_KERNEL_KEY = "smooth_kernel_size"
+PYRAMID_LEVELS_KEY = "pyramid_levels"
+SEGMENTATION_KEY = "segmentation"
+SMOOTH_METHOD_KEY = "smooth_method"
+TILE_BANDS_KEY = "tile_bands"
+
+# Keys for Snapshot section
+SNAPSHOT_SECTION = "snapshots"
+SNAPSHOT_FORMAT_KEY = "format"
+SNAPSHOT_QUALITY_KEY = "quality"
+SNAPSHOT_QUEUE_KEY = "queue_size"
+SNAPSHOT_DROP_POLICY_KEY = "drop_policy"
+
+# Keys for Recording section
+RECORDING_SECTION = "recording"
+RECORD_PATH_KEY = "path"
+RECORD_MAX_FRAMES_KEY = "max_frames"
+
+# Keys for Tracking section
+TRACKING_SECTION = "tracking"
+USE_ROI_KEY = "use_roi"
+ROI_PADDING_KEY = "roi_padding"
+ROI_MAX_FRAMES_KEY = "roi_max_frames"
+USE_FLOW_KEY = "use_flow"
+DETECT_INTERVAL_KEY = "detect_interval"
+MIN_CONFIDENCE_KEY = "min_confidence"
+DRIFT_TOLERANCE_KEY = "drift_tolerance"
+
+# Keys for Candidates section
+CANDIDATES_SECTION = "candidates"
+MIN_AREA_KEY = "min_area"
+MAX_CANDIDATES_KEY = "max_candidates"
+TARGET_ASPECT_KEY = "target_aspect"
+MIN_SOLIDITY_KEY = "min_solidity"
+BLOB_ENGINE_KEY = "blob_engine"
+MIN_FILL_KEY = "min_fill"
+
+# Keys for Camera section
+CAMERA_SECTION = "camera"
+PIXEL_FORMAT_KEY = "pixel_format"
+CALIBRATION_KEY = "calibration"
+TARGET_WIDTH_KEY = "target_width"
+TARGET_HEIGHT_KEY = "target_height"
+
+# Keys for Pipeline section
+PIPELINE_SECTION = "pipeline"
+USE_PIPELINE_KEY = "use_pipeline"
+PIPELINE_QUEUE_KEY = "queue_size"
+USE_PROCESS_POOL_KEY = "use_process_pool"
+POOL_WORKERS_KEY = "workers"
+
+# Keys for Table section
+TABLE_SECTION = "table"
+PUBLISH_RATE_KEY = "publish_rate"
+TELEMETRY_HOST_KEY = "telemetry_host"
+TELEMETRY_PORT_KEY = "telemetry_port"
 
 # Range values for color range
 MIN_COLOR_VALUE = 0
@@ -39,6 +96,114 @@ DEFAULT_CLOSE_VALUE = 50
 DEFAULT_OPEN_VALUE = 5
 DEFAULT_FILTER_VALUE = 2
 
+# Values for the snapshot writer
+SNAPSHOT_FORMATS = ("jpg", "png")
+SNAPSHOT_DROP_POLICIES = ("oldest", "newest")
+MIN_SNAPSHOT_QUALITY = 0
+MAX_SNAPSHOT_QUALITY = 100
+MIN_SNAPSHOT_QUEUE = 1
+MAX_SNAPSHOT_QUEUE = 64
+DEFAULT_SNAPSHOT_FORMAT = "jpg"
+DEFAULT_SNAPSHOT_QUALITY = 90
+DEFAULT_SNAPSHOT_QUEUE = 8
+DEFAULT_SNAPSHOT_DROP_POLICY = "oldest"
+
+# Values for the frame recorder, an empty path turns recording off
+MIN_RECORD_FRAMES = 1
+MAX_RECORD_FRAMES = 100000
+DEFAULT_RECORD_PATH = ""
+DEFAULT_RECORD_FRAMES = 4500
+
+# Values for region of interest tracking, the padding is added around the last target
+MIN_ROI_PADDING = 0
+MAX_ROI_PADDING = 320
+MIN_ROI_FRAMES = 1
+MAX_ROI_FRAMES = 1000
+DEFAULT_ROI_PADDING = 40
+DEFAULT_ROI_FRAMES = 15
+
+# Values for coarse to fine detection, each level halves the size of the coarse search
+MIN_PYRAMID_LEVELS = 0
+MAX_PYRAMID_LEVELS = 2
+DEFAULT_PYRAMID_LEVELS = 0
+
+# Values for optical flow tracking, confidence is a percent and drift is in pixels
+MIN_DETECT_INTERVAL = 1
+MAX_DETECT_INTERVAL = 60
+MIN_CONFIDENCE = 0
+MAX_CONFIDENCE = 100
+MIN_DRIFT_TOLERANCE = 1
+MAX_DRIFT_TOLERANCE = 100
+DEFAULT_DETECT_INTERVAL = 5
+DEFAULT_MIN_CONFIDENCE = 60
+DEFAULT_DRIFT_TOLERANCE = 4
+
+# Values for ranking candidates, aspect is width over height in percent with 0 for any, solidity is a percent
+MIN_AREA = 0
+MAX_AREA = 100000
+MIN_CANDIDATES = 1
+MAX_CANDIDATES = 10
+MIN_ASPECT = 0
+MAX_ASPECT = 1000
+MIN_SOLIDITY = 0
+MAX_SOLIDITY = 100
+DEFAULT_MIN_AREA = 20
+DEFAULT_CANDIDATES = 3
+DEFAULT_ASPECT = 0
+DEFAULT_SOLIDITY = 0
+
+# Values for finding blobs, fill is the percent of its bounding box a blob covers
+BLOB_ENGINES = ("contours", "components")
+MIN_FILL = 0
+MAX_FILL = 100
+DEFAULT_BLOB_ENGINE = "contours"
+DEFAULT_FILL = 0
+
+# Values for segmenting the colors, a lookup table is built over every color once per change
+SEGMENTATIONS = ("range", "lut")
+DEFAULT_SEGMENTATION = "range"
+
+# Values for the camera, bgr is converted by OpenCV, yuyv is the raw camera format and gray is just its Y
+PIXEL_FORMATS = ("bgr", "yuyv", "gray")
+DEFAULT_PIXEL_FORMAT = "bgr"
+
+# Values for smoothing, from cheapest to most expensive on the color image, mask smooths the threshold instead
+SMOOTH_METHODS = ("box", "gaussian", "median", "bilateral", "mask")
+DEFAULT_SMOOTH_METHOD = "box"
+
+# Values for the threaded pipeline, each queue between its stages keeps this many frames
+MIN_PIPELINE_QUEUE = 1
+MAX_PIPELINE_QUEUE = 8
+DEFAULT_PIPELINE_QUEUE = 2
+
+# Values for the process pool, 0 workers runs one per core
+MIN_POOL_WORKERS = 0
+MAX_POOL_WORKERS = 16
+DEFAULT_POOL_WORKERS = 0
+
+# Values for splitting the frame into bands processed on their own threads, 0 or 1 processes it whole
+MIN_TILE_BANDS = 0
+MAX_TILE_BANDS = 16
+DEFAULT_TILE_BANDS = 0
+
+# Values for the pose, the size of the target is in millimeters and the pose comes out in the same units
+DEFAULT_CALIBRATION = ""
+MIN_TARGET_SIZE = 1
+MAX_TARGET_SIZE = 10000
+DEFAULT_TARGET_WIDTH = 508
+DEFAULT_TARGET_HEIGHT = 356
+
+# Values for publishing to the table, in detections a second, 0 publishes every frame
+MIN_PUBLISH_RATE = 0
+MAX_PUBLISH_RATE = 1000
+DEFAULT_PUBLISH_RATE = 0
+
+# Values for the telemetry sent straight to the robot, an empty host turns it off, FRC leaves these ports open
+DEFAULT_TELEMETRY_HOST = ""
+MIN_TELEMETRY_PORT = 5800
+MAX_TELEMETRY_PORT = 5810
+DEFAULT_TELEMETRY_PORT = 5800
+
 # Logger variable
 logger = logging.getLogger("VisionConfiguration")
 
@@ -66,6 +231,43 @@ def clamp(x, low, high, debug_with=None):
     return x
 
 
+def parse_ranges(text):
+    """
+    Parses the extra color ranges from the config, each range is 6 numbers of the low then high values
+    separated by commas, and the ranges are separated by semicolons. A low above its high wraps around
+    :param text: The ranges as written in the config
+    :return: The list of ((one, two, three) low, (one, two, three) high) ranges
+    """
+    ranges = []
+
+    for part in text.split(';'):
+        if part.strip() == '':
+            continue
+
+        try:
+            values = [int(value) for value in part.split(',')]
+        except ValueError:
+            logger.debug("Color range %s not numbers, skipping", part)
+            continue
+
+        if len(values) != 6:
+            logger.debug("Color range %s not 6 values, skipping", part)
+            continue
+
+        ranges.append((tuple(values[:3]), tuple(values[3:])))
+
+    return ranges
+
+
+def format_ranges(ranges):
+    """
+    Formats the extra color ranges to be written to the config
+    :param ranges: The list of (low, high) ranges
+    :return: The ranges as text
+    """
+    return '; '.join(','.join(str(value) for value in low + high) for low, high in ranges)
+
+
 # noinspection PyAttributeOutsideInit
 class VisionConfiguration:
     """
@@ -76,6 +278,8 @@ class VisionConfiguration:
         # Configuration file loading
         self.__config = cP.RawConfigParser()
         self.__config.read(file_location)
+        self.__plan = None
+        self.__plan_version = 0
         self.__sync()
         self.__default_location = file_location
 
@@ -87,7 +291,9 @@ class VisionConfiguration:
         if one > self.__one_high:
             one = self.__one_high
 
-        self.__one_low = one
+        if one != self.__one_low:
+            self.__one_low = one
+            self.__invalidate()
 
     def set_one_high(self, one):
         """
@@ -97,7 +303,9 @@ class VisionConfiguration:
         if one < self.__one_low:
             one = self.__one_low
 
-        self.__one_high = one
+        if one != self.__one_high:
+            self.__one_high = one
+            self.__invalidate()
 
     def set_two_low(self, two):
         """
@@ -107,7 +315,9 @@ class VisionConfiguration:
         if two > self.__two_high:
             two = self.__two_high
 
-        self.__two_low = two
+        if two != self.__two_low:
+            self.__two_low = two
+            self.__invalidate()
 
     def set_two_high(self, two):
         """
@@ -117,7 +327,9 @@ class VisionConfiguration:
         if two < self.__two_low:
             two = self.__two_low
 
-        self.__two_high = two
+        if two != self.__two_high:
+            self.__two_high = two
+            self.__invalidate()
 
     def set_three_low(self, three):
         """
@@ -127,7 +339,9 @@ class VisionConfiguration:
         if three > self.__three_high:
             three = self.__three_high
 
-        self.__three_low = three
+        if three != self.__three_low:
+            self.__three_low = three
+            self.__invalidate()
 
     def set_three_high(self, three):
         """
@@ -137,56 +351,362 @@ class VisionConfiguration:
         if three < self.__three_low:
             three = self.__three_low
 
-        self.__three_high = three
+        if three != self.__three_high:
+            self.__three_high = three
+            self.__invalidate()
 
     def set_kernel_close_size(self, size):
         """
         Sets the kernel close size
         :param size: The size of the kernel size close
         """
-        self.__kernel_size_close = size
+        if size != self.__kernel_size_close:
+            self.__kernel_size_close = size
+            self.__invalidate()
 
     def set_kernel_open_size(self, size):
         """
         Sets the kernel open size
         :param size: The size of the kernel size open
         """
-        self.__kernel_size_open = size
+        if size != self.__kernel_size_open:
+            self.__kernel_size_open = size
+            self.__invalidate()
 
     def set_kernel_smoothing_size(self, size):
         """
         Sets the kernel smoothing size
         :param size: The size of the kernel size smooth
         """
-        self.__kernel_size_smooth = size
+        if size != self.__kernel_size_smooth:
+            self.__kernel_size_smooth = size
+            self.__invalidate()
 
     def set_should_close(self, should_close):
         """
         Sets if the vision should run the morphology close operation after open
         :param should_close: To close the threshold
         """
-        self.__should_close = should_close
+        if should_close != self.__should_close:
+            self.__should_close = should_close
+            self.__invalidate()
 
     def set_should_open(self, should_open):
         """
         Sets if the vision should run the morphology open operation
         :param should_open: To close the threshold
         """
-        self.__should_open = should_open
+        if should_open != self.__should_open:
+            self.__should_open = should_open
+            self.__invalidate()
 
     def set_should_use_hsv(self, should_use_hsv):
         """
         Sets if the vision should use HSV Ranges instead of RGB
         :param should_use_hsv: Use HSV Ranges
         """
-        self.__should_use_hsv = should_use_hsv
+        if should_use_hsv != self.__should_use_hsv:
+            self.__should_use_hsv = should_use_hsv
+            self.__invalidate()
 
     def set_should_use_smoothing(self, should_smooth):
         """
         Sets if the vision should use smoothing
         :param should_smooth: If the vision should smooth
         """
-        self.__should_use_smoothing = should_smooth
+        if should_smooth != self.__should_use_smoothing:
+            self.__should_use_smoothing = should_smooth
+            self.__invalidate()
+
+    def set_snapshot_format(self, image_format):
+        """
+        Sets the image format snapshots are encoded as
+        :param image_format: The format, jpg or png
+        """
+        self.__snapshot_format = image_format
+
+    def set_snapshot_quality(self, quality):
+        """
+        Sets the encode quality of snapshots, jpg quality or png compression out of 100
+        :param quality: The quality from 0 to 100
+        """
+        self.__snapshot_quality = quality
+
+    def set_snapshot_queue_size(self, queue_size):
+        """
+        Sets how many snapshots can wait to be written before some are dropped
+        :param queue_size: The size of the queue
+        """
+        self.__snapshot_queue_size = queue_size
+
+    def set_snapshot_drop_policy(self, drop_policy):
+        """
+        Sets which snapshot is dropped when the queue is full
+        :param drop_policy: oldest or newest
+        """
+        self.__snapshot_drop_policy = drop_policy
+
+    def set_record_path(self, path):
+        """
+        Sets the frame log file to record to, an empty path turns recording off
+        :param path: The path of the frame log
+        """
+        self.__record_path = path
+
+    def set_record_max_frames(self, max_frames):
+        """
+        Sets how many frames the frame log is preallocated for
+        :param max_frames: The amount of frames
+        """
+        self.__record_max_frames = max_frames
+
+    def set_should_use_roi(self, should_use_roi):
+        """
+        Sets if the vision should only process a window around the last target it found
+        :param should_use_roi: Use region of interest tracking
+        """
+        if should_use_roi != self.__should_use_roi:
+            self.__should_use_roi = should_use_roi
+            self.__invalidate()
+
+    def set_roi_padding(self, padding):
+        """
+        Sets how many pixels are added around the last target to make the window
+        :param padding: The padding in pixels
+        """
+        if padding != self.__roi_padding:
+            self.__roi_padding = padding
+            self.__invalidate()
+
+    def set_roi_max_frames(self, max_frames):
+        """
+        Sets how many frames can be processed in the window before a full frame search
+        :param max_frames: The amount of frames
+        """
+        if max_frames != self.__roi_max_frames:
+            self.__roi_max_frames = max_frames
+            self.__invalidate()
+
+    def set_pyramid_levels(self, levels):
+        """
+        Sets how many times the frame is halved to search for the target before refining it, 0 turns it off
+        :param levels: The amount of pyramid levels, 1 is half size and 2 is quarter size
+        """
+        if levels != self.__pyramid_levels:
+            self.__pyramid_levels = levels
+            self.__invalidate()
+
+    def set_should_use_flow(self, should_use_flow):
+        """
+        Sets if the vision should follow the target with optical flow between full detections
+        :param should_use_flow: Use optical flow tracking
+        """
+        if should_use_flow != self.__should_use_flow:
+            self.__should_use_flow = should_use_flow
+            self.__invalidate()
+
+    def set_detect_interval(self, interval):
+        """
+        Sets how many frames apart full detections are run while tracking with optical flow
+        :param interval: The amount of frames
+        """
+        if interval != self.__detect_interval:
+            self.__detect_interval = interval
+            self.__invalidate()
+
+    def set_min_confidence(self, confidence):
+        """
+        Sets the confidence the optical flow has to keep to skip a full detection
+        :param confidence: The confidence in percent
+        """
+        if confidence != self.__min_confidence:
+            self.__min_confidence = confidence
+            self.__invalidate()
+
+    def set_drift_tolerance(self, tolerance):
+        """
+        Sets how far the tracked corners can drift from a full detection before detections are run more often
+        :param tolerance: The drift in pixels
+        """
+        if tolerance != self.__drift_tolerance:
+            self.__drift_tolerance = tolerance
+            self.__invalidate()
+
+    def set_min_area(self, area):
+        """
+        Sets the smallest contour area that is scored as a candidate
+        :param area: The area in pixels
+        """
+        if area != self.__min_area:
+            self.__min_area = area
+            self.__invalidate()
+
+    def set_max_candidates(self, amount):
+        """
+        Sets how many of the best scored targets are kept
+        :param amount: The amount of candidates
+        """
+        if amount != self.__max_candidates:
+            self.__max_candidates = amount
+            self.__invalidate()
+
+    def set_target_aspect(self, aspect):
+        """
+        Sets the width over height the target should have, candidates further from it score lower
+        :param aspect: The aspect ratio in percent, 0 scores every shape the same
+        """
+        if aspect != self.__target_aspect:
+            self.__target_aspect = aspect
+            self.__invalidate()
+
+    def set_min_solidity(self, solidity):
+        """
+        Sets how much of its hull a contour has to fill to be a candidate
+        :param solidity: The solidity in percent
+        """
+        if solidity != self.__min_solidity:
+            self.__min_solidity = solidity
+            self.__invalidate()
+
+    def set_blob_engine(self, engine):
+        """
+        Sets how blobs are found, by tracing contours or by labelling connected components
+        :param engine: contours or components
+        """
+        if engine != self.__blob_engine:
+            self.__blob_engine = engine
+            self.__invalidate()
+
+    def set_min_fill(self, fill):
+        """
+        Sets how much of its bounding box a blob has to cover to be a candidate
+        :param fill: The fill in percent
+        """
+        if fill != self.__min_fill:
+            self.__min_fill = fill
+            self.__invalidate()
+
+    def set_segmentation(self, segmentation):
+        """
+        Sets how the color ranges are applied, with inRange or a lookup table of every color
+        :param segmentation: range or lut
+        """
+        if segmentation != self.__segmentation:
+            self.__segmentation = segmentation
+            self.__invalidate()
+
+    def set_pixel_format(self, pixel_format):
+        """
+        Sets the format frames are captured and thresholded in. In yuyv the color ranges are Y, U, V
+        and in gray only range one is used, on Y
+        :param pixel_format: bgr, yuyv or gray
+        """
+        if pixel_format != self.__pixel_format:
+            self.__pixel_format = pixel_format
+            self.__invalidate()
+
+    def set_smooth_method(self, method):
+        """
+        Sets the filter used to smooth the image, mask runs a median on the threshold instead of the colors
+        :param method: box, gaussian, median, bilateral or mask
+        """
+        if method != self.__smooth_method:
+            self.__smooth_method = method
+            self.__invalidate()
+
+    def set_should_use_pipeline(self, should_use_pipeline):
+        """
+        Sets if the vision should run its stages on separate threads, overlapping frames
+        :param should_use_pipeline: Use the threaded pipeline
+        """
+        self.__should_use_pipeline = should_use_pipeline
+
+    def set_pipeline_queue_size(self, size):
+        """
+        Sets how many frames can wait between stages of the pipeline before the oldest is dropped
+        :param size: The amount of frames
+        """
+        self.__pipeline_queue_size = size
+
+    def set_should_use_process_pool(self, should_use_process_pool):
+        """
+        Sets if the vision should process frames on a pool of worker processes, taking turns on frames
+        :param should_use_process_pool: Use the process pool
+        """
+        self.__should_use_process_pool = should_use_process_pool
+
+    def set_pool_workers(self, workers):
+        """
+        Sets how many worker processes the process pool runs
+        :param workers: The amount of workers, 0 for one per core
+        """
+        self.__pool_workers = workers
+
+    def set_tile_bands(self, bands):
+        """
+        Sets how many horizontal bands the frame is split into to smooth, threshold and morph on separate threads
+        :param bands: The amount of bands, 0 or 1 to process the frame whole
+        """
+        if bands != self.__tile_bands:
+            self.__tile_bands = bands
+            self.__invalidate()
+
+    def set_calibration(self, path):
+        """
+        Sets the camera calibration file to work out the pose of the target with, an empty path turns the pose off
+        :param path: The path of the OpenCV calibration file
+        """
+        self.__calibration = path
+
+    def set_target_width(self, width):
+        """
+        Sets the real width of the target, used to work out its pose
+        :param width: The width in millimeters
+        """
+        self.__target_width = width
+
+    def set_target_height(self, height):
+        """
+        Sets the real height of the target, used to work out its pose
+        :param height: The height in millimeters
+        """
+        self.__target_height = height
+
+    def set_publish_rate(self, rate):
+        """
+        Sets the most detections a second to publish to the table, the latest waits if they come faster
+        :param rate: The detections a second, 0 to publish every frame
+        """
+        self.__publish_rate = rate
+
+    def set_telemetry_host(self, host):
+        """
+        Sets where to send the telemetry of each detection, next to the table, an empty host turns it off
+        :param host: The host name or address of the robot
+        """
+        self.__telemetry_host = host
+
+    def set_telemetry_port(self, port):
+        """
+        Sets the port the robot listens for the telemetry on
+        :param port: The UDP port
+        """
+        self.__telemetry_port = port
+
+    def get_plan(self):
+        """
+        Gets the compiled processing plan, only compiling a new one if something changed since the last
+        :return: The VisionPlan for the current configuration
+        """
+        plan = self.__plan
+        version = self.__plan_version
+
+        if plan is None or plan.version != version:
+            # Swap the whole plan in at once so readers never see half of one
+            plan = VisionPlan.compile(self, version)
+            self.__plan = plan
+
+        return plan
 
     def get_low_range(self):
         """
@@ -202,6 +722,25 @@ class VisionConfiguration:
         """
         return np.array([self.__one_high, self.__two_high, self.__three_high], dtype=np.uint8)
 
+    def set_extra_ranges(self, ranges):
+        """
+        Sets the color ranges let through as well as the main range, any channel with a low above its high
+        wraps around, like the hue of red
+        :param ranges: The list of ((one, two, three) low, (one, two, three) high) ranges
+        """
+        ranges = [(tuple(low), tuple(high)) for low, high in ranges]
+
+        if ranges != self.__extra_ranges:
+            self.__extra_ranges = ranges
+            self.__invalidate()
+
+    def get_extra_ranges(self):
+        """
+        Gets the color ranges let through as well as the main range
+        :return: The list of ((one, two, three) low, (one, two, three) high) ranges
+        """
+        return list(self.__extra_ranges)
+
     def get_kernel_close(self):
         """
         Gets the value of the kernel size as a numpy matrix of 1's of the kernel size by kernel size
@@ -272,6 +811,244 @@ class VisionConfiguration:
         """
         return self.__should_use_smoothing
 
+    def get_snapshot_format(self):
+        """
+        Gets the image format snapshots are encoded as
+        :return: The format, jpg or png
+        """
+        return self.__snapshot_format
+
+    def get_snapshot_quality(self):
+        """
+        Gets the encode quality of snapshots
+        :return: The quality from 0 to 100
+        """
+        return self.__snapshot_quality
+
+    def get_snapshot_queue_size(self):
+        """
+        Gets how many snapshots can wait to be written
+        :return: The size of the queue
+        """
+        return self.__snapshot_queue_size
+
+    def get_snapshot_drop_policy(self):
+        """
+        Gets which snapshot is dropped when the queue is full
+        :return: oldest or newest
+        """
+        return self.__snapshot_drop_policy
+
+    def get_record_path(self):
+        """
+        Gets the frame log file to record to
+        :return: The path of the frame log, empty if recording is off
+        """
+        return self.__record_path
+
+    def get_record_max_frames(self):
+        """
+        Gets how many frames the frame log is preallocated for
+        :return: The amount of frames
+        """
+        return self.__record_max_frames
+
+    def get_should_use_roi(self):
+        """
+        Gets if the vision should only process a window around the last target
+        :return: If the vision should use region of interest tracking
+        """
+        return self.__should_use_roi
+
+    def get_roi_padding(self):
+        """
+        Gets how many pixels are added around the last target to make the window
+        :return: The padding in pixels
+        """
+        return self.__roi_padding
+
+    def get_roi_max_frames(self):
+        """
+        Gets how many frames can be processed in the window before a full frame search
+        :return: The amount of frames
+        """
+        return self.__roi_max_frames
+
+    def get_pyramid_levels(self):
+        """
+        Gets how many times the frame is halved to search for the target before refining it
+        :return: The amount of pyramid levels
+        """
+        return self.__pyramid_levels
+
+    def get_should_use_flow(self):
+        """
+        Gets if the vision should follow the target with optical flow between full detections
+        :return: If the vision should use optical flow tracking
+        """
+        return self.__should_use_flow
+
+    def get_detect_interval(self):
+        """
+        Gets how many frames apart full detections are run while tracking with optical flow
+        :return: The amount of frames
+        """
+        return self.__detect_interval
+
+    def get_min_confidence(self):
+        """
+        Gets the confidence the optical flow has to keep to skip a full detection
+        :return: The confidence in percent
+        """
+        return self.__min_confidence
+
+    def get_drift_tolerance(self):
+        """
+        Gets how far the tracked corners can drift from a full detection
+        :return: The drift in pixels
+        """
+        return self.__drift_tolerance
+
+    def get_min_area(self):
+        """
+        Gets the smallest contour area that is scored as a candidate
+        :return: The area in pixels
+        """
+        return self.__min_area
+
+    def get_max_candidates(self):
+        """
+        Gets how many of the best scored targets are kept
+        :return: The amount of candidates
+        """
+        return self.__max_candidates
+
+    def get_target_aspect(self):
+        """
+        Gets the width over height the target should have
+        :return: The aspect ratio in percent
+        """
+        return self.__target_aspect
+
+    def get_min_solidity(self):
+        """
+        Gets how much of its hull a contour has to fill to be a candidate
+        :return: The solidity in percent
+        """
+        return self.__min_solidity
+
+    def get_blob_engine(self):
+        """
+        Gets how blobs are found
+        :return: contours or components
+        """
+        return self.__blob_engine
+
+    def get_min_fill(self):
+        """
+        Gets how much of its bounding box a blob has to cover to be a candidate
+        :return: The fill in percent
+        """
+        return self.__min_fill
+
+    def get_segmentation(self):
+        """
+        Gets how the color ranges are applied
+        :return: range or lut
+        """
+        return self.__segmentation
+
+    def get_pixel_format(self):
+        """
+        Gets the format frames are captured and thresholded in
+        :return: bgr, yuyv or gray
+        """
+        return self.__pixel_format
+
+    def get_smooth_method(self):
+        """
+        Gets the filter used to smooth the image
+        :return: box, gaussian, median, bilateral or mask
+        """
+        return self.__smooth_method
+
+    def get_should_use_pipeline(self):
+        """
+        Gets if the vision should run its stages on separate threads
+        :return: If the vision should use the threaded pipeline
+        """
+        return self.__should_use_pipeline
+
+    def get_pipeline_queue_size(self):
+        """
+        Gets how many frames can wait between stages of the pipeline
+        :return: The amount of frames
+        """
+        return self.__pipeline_queue_size
+
+    def get_should_use_process_pool(self):
+        """
+        Gets if the vision should process frames on a pool of worker processes
+        :return: If the vision should use the process pool
+        """
+        return self.__should_use_process_pool
+
+    def get_pool_workers(self):
+        """
+        Gets how many worker processes the process pool runs
+        :return: The amount of workers, 0 for one per core
+        """
+        return self.__pool_workers
+
+    def get_tile_bands(self):
+        """
+        Gets how many horizontal bands the frame is split into to process on separate threads
+        :return: The amount of bands, 0 or 1 if the frame is processed whole
+        """
+        return self.__tile_bands
+
+    def get_calibration(self):
+        """
+        Gets the camera calibration file to work out the pose of the target with
+        :return: The path of the calibration file, empty if the pose is off
+        """
+        return self.__calibration
+
+    def get_target_width(self):
+        """
+        Gets the real width of the target
+        :return: The width in millimeters
+        """
+        return self.__target_width
+
+    def get_target_height(self):
+        """
+        Gets the real height of the target
+        :return: The height in millimeters
+        """
+        return self.__target_height
+
+    def get_publish_rate(self):
+        """
+        Gets the most detections a second to publish to the table
+        :return: The detections a second, 0 if every frame is published
+        """
+        return self.__publish_rate
+
+    def get_telemetry_host(self):
+        """
+        Gets where to send the telemetry of each detection
+        :return: The host name or address of the robot, empty if the telemetry is off
+        """
+        return self.__telemetry_host
+
+    def get_telemetry_port(self):
+        """
+        Gets the port the robot listens for the telemetry on
+        :return: The UDP port
+        """
+        return self.__telemetry_port
+
     def save(self, file_location=None, validate=True):
         """
         Saves the config file to the given location, or the same file read from if not given
@@ -335,7 +1112,7 @@ class VisionConfiguration:
             self.__should_close = True
             logger.debug("Kernel Should Close not bool, setting to True")
 
-        if type(self.__kernel_size_open) is not bool:
+        if type(self.__should_open) is not bool:
             self.__should_open = True
             logger.debug("Kernel Should Open not bool, setting to True")
 
@@ -347,6 +1124,134 @@ class VisionConfiguration:
             self.__should_use_smoothing = True
             logger.debug("Should use smoothing not bool, setting to True")
 
+        if self.__snapshot_format not in SNAPSHOT_FORMATS:
+            self.__snapshot_format = DEFAULT_SNAPSHOT_FORMAT
+            logger.debug("Snapshot format unknown, setting to jpg")
+
+        if self.__snapshot_drop_policy not in SNAPSHOT_DROP_POLICIES:
+            self.__snapshot_drop_policy = DEFAULT_SNAPSHOT_DROP_POLICY
+            logger.debug("Snapshot drop policy unknown, setting to oldest")
+
+        if type(self.__snapshot_quality) is not int:
+            self.__snapshot_quality = DEFAULT_SNAPSHOT_QUALITY
+            logger.debug("Snapshot quality not int, setting to 90")
+
+        if type(self.__snapshot_queue_size) is not int:
+            self.__snapshot_queue_size = DEFAULT_SNAPSHOT_QUEUE
+            logger.debug("Snapshot queue size not int, setting to 8")
+
+        if type(self.__record_max_frames) is not int:
+            self.__record_max_frames = DEFAULT_RECORD_FRAMES
+            logger.debug("Record max frames not int, setting to 4500")
+
+        if type(self.__should_use_roi) is not bool:
+            self.__should_use_roi = True
+            logger.debug("Should use ROI not bool, setting to True")
+
+        if type(self.__roi_padding) is not int:
+            self.__roi_padding = DEFAULT_ROI_PADDING
+            logger.debug("ROI Padding not int, setting to 40")
+
+        if type(self.__roi_max_frames) is not int:
+            self.__roi_max_frames = DEFAULT_ROI_FRAMES
+            logger.debug("ROI Max Frames not int, setting to 15")
+
+        if type(self.__pyramid_levels) is not int:
+            self.__pyramid_levels = DEFAULT_PYRAMID_LEVELS
+            logger.debug("Pyramid Levels not int, setting to 0")
+
+        if type(self.__should_use_flow) is not bool:
+            self.__should_use_flow = False
+            logger.debug("Should use flow not bool, setting to False")
+
+        if type(self.__detect_interval) is not int:
+            self.__detect_interval = DEFAULT_DETECT_INTERVAL
+            logger.debug("Detect Interval not int, setting to 5")
+
+        if type(self.__min_confidence) is not int:
+            self.__min_confidence = DEFAULT_MIN_CONFIDENCE
+            logger.debug("Min Confidence not int, setting to 60")
+
+        if type(self.__drift_tolerance) is not int:
+            self.__drift_tolerance = DEFAULT_DRIFT_TOLERANCE
+            logger.debug("Drift Tolerance not int, setting to 4")
+
+        if type(self.__min_area) is not int:
+            self.__min_area = DEFAULT_MIN_AREA
+            logger.debug("Min Area not int, setting to 20")
+
+        if type(self.__max_candidates) is not int:
+            self.__max_candidates = DEFAULT_CANDIDATES
+            logger.debug("Max Candidates not int, setting to 3")
+
+        if type(self.__target_aspect) is not int:
+            self.__target_aspect = DEFAULT_ASPECT
+            logger.debug("Target Aspect not int, setting to 0")
+
+        if type(self.__min_solidity) is not int:
+            self.__min_solidity = DEFAULT_SOLIDITY
+            logger.debug("Min Solidity not int, setting to 0")
+
+        if self.__blob_engine not in BLOB_ENGINES:
+            self.__blob_engine = DEFAULT_BLOB_ENGINE
+            logger.debug("Blob engine unknown, setting to contours")
+
+        if type(self.__min_fill) is not int:
+            self.__min_fill = DEFAULT_FILL
+            logger.debug("Min Fill not int, setting to 0")
+
+        if self.__segmentation not in SEGMENTATIONS:
+            self.__segmentation = DEFAULT_SEGMENTATION
+            logger.debug("Segmentation unknown, setting to range")
+
+        if type(self.__extra_ranges) is not list:
+            self.__extra_ranges = []
+            logger.debug("Extra ranges not list, setting to none")
+
+        if self.__pixel_format not in PIXEL_FORMATS:
+            self.__pixel_format = DEFAULT_PIXEL_FORMAT
+            logger.debug("Pixel format unknown, setting to bgr")
+
+        if self.__smooth_method not in SMOOTH_METHODS:
+            self.__smooth_method = DEFAULT_SMOOTH_METHOD
+            logger.debug("Smooth method unknown, setting to box")
+
+        if type(self.__should_use_pipeline) is not bool:
+            self.__should_use_pipeline = False
+            logger.debug("Should use pipeline not bool, setting to False")
+
+        if type(self.__pipeline_queue_size) is not int:
+            self.__pipeline_queue_size = DEFAULT_PIPELINE_QUEUE
+            logger.debug("Pipeline Queue Size not int, setting to 2")
+
+        if type(self.__should_use_process_pool) is not bool:
+            self.__should_use_process_pool = False
+            logger.debug("Should use process pool not bool, setting to False")
+
+        if type(self.__pool_workers) is not int:
+            self.__pool_workers = DEFAULT_POOL_WORKERS
+            logger.debug("Pool Workers not int, setting to 0")
+
+        if type(self.__tile_bands) is not int:
+            self.__tile_bands = DEFAULT_TILE_BANDS
+            logger.debug("Tile Bands not int, setting to 0")
+
+        if type(self.__target_width) is not int:
+            self.__target_width = DEFAULT_TARGET_WIDTH
+            logger.debug("Target Width not int, setting to 508")
+
+        if type(self.__target_height) is not int:
+            self.__target_height = DEFAULT_TARGET_HEIGHT
+            logger.debug("Target Height not int, setting to 356")
+
+        if type(self.__publish_rate) is not int:
+            self.__publish_rate = DEFAULT_PUBLISH_RATE
+            logger.debug("Publish Rate not int, setting to 0")
+
+        if type(self.__telemetry_port) is not int:
+            self.__telemetry_port = DEFAULT_TELEMETRY_PORT
+            logger.debug("Telemetry Port not int, setting to 5800")
+
         # Clamp Values
         self.__two_low = clamp(self.__two_low, MIN_COLOR_VALUE, MAX_COLOR_VALUE, "Green/Saturation Low")
         self.__one_low = clamp(self.__one_low, MIN_COLOR_VALUE, MAX_COLOR_VALUE, "Blue/Hue Low")
@@ -359,6 +1264,42 @@ class VisionConfiguration:
         self.__kernel_size_open = clamp(self.__kernel_size_open, MIN_KERNEL_VALUE, MAX_KERNEL_VALUE, "Kernel Size Open")
         self.__kernel_size_smooth = clamp(self.__kernel_size_smooth, MIN_KERNEL_VALUE, MAX_KERNEL_VALUE,
                                           "Kernel Size Smooth")
+        self.__snapshot_quality = clamp(self.__snapshot_quality, MIN_SNAPSHOT_QUALITY, MAX_SNAPSHOT_QUALITY,
+                                        "Snapshot Quality")
+        self.__snapshot_queue_size = clamp(self.__snapshot_queue_size, MIN_SNAPSHOT_QUEUE, MAX_SNAPSHOT_QUEUE,
+                                           "Snapshot Queue Size")
+        self.__record_max_frames = clamp(self.__record_max_frames, MIN_RECORD_FRAMES, MAX_RECORD_FRAMES,
+                                         "Record Max Frames")
+        self.__roi_padding = clamp(self.__roi_padding, MIN_ROI_PADDING, MAX_ROI_PADDING, "ROI Padding")
+        self.__roi_max_frames = clamp(self.__roi_max_frames, MIN_ROI_FRAMES, MAX_ROI_FRAMES, "ROI Max Frames")
+        self.__pyramid_levels = clamp(self.__pyramid_levels, MIN_PYRAMID_LEVELS, MAX_PYRAMID_LEVELS, "Pyramid Levels")
+        self.__detect_interval = clamp(self.__detect_interval, MIN_DETECT_INTERVAL, MAX_DETECT_INTERVAL,
+                                       "Detect Interval")
+        self.__min_confidence = clamp(self.__min_confidence, MIN_CONFIDENCE, MAX_CONFIDENCE, "Min Confidence")
+        self.__drift_tolerance = clamp(self.__drift_tolerance, MIN_DRIFT_TOLERANCE, MAX_DRIFT_TOLERANCE,
+                                       "Drift Tolerance")
+        self.__min_area = clamp(self.__min_area, MIN_AREA, MAX_AREA, "Min Area")
+        self.__max_candidates = clamp(self.__max_candidates, MIN_CANDIDATES, MAX_CANDIDATES, "Max Candidates")
+        self.__target_aspect = clamp(self.__target_aspect, MIN_ASPECT, MAX_ASPECT, "Target Aspect")
+        self.__min_solidity = clamp(self.__min_solidity, MIN_SOLIDITY, MAX_SOLIDITY, "Min Solidity")
+        self.__min_fill = clamp(self.__min_fill, MIN_FILL, MAX_FILL, "Min Fill")
+        self.__extra_ranges = [(tuple(clamp(value, MIN_COLOR_VALUE, MAX_COLOR_VALUE, "Extra Range") for value in low),
+                                tuple(clamp(value, MIN_COLOR_VALUE, MAX_COLOR_VALUE, "Extra Range") for value in high))
+                               for low, high in self.__extra_ranges]
+        self.__pipeline_queue_size = clamp(self.__pipeline_queue_size, MIN_PIPELINE_QUEUE, MAX_PIPELINE_QUEUE,
+                                           "Pipeline Queue Size")
+        self.__pool_workers = clamp(self.__pool_workers, MIN_POOL_WORKERS, MAX_POOL_WORKERS, "Pool Workers")
+        self.__tile_bands = clamp(self.__tile_bands, MIN_TILE_BANDS, MAX_TILE_BANDS, "Tile Bands")
+        self.__target_width = clamp(self.__target_width, MIN_TARGET_SIZE, MAX_TARGET_SIZE, "Target Width")
+        self.__target_height = clamp(self.__target_height, MIN_TARGET_SIZE, MAX_TARGET_SIZE, "Target Height")
+        self.__publish_rate = clamp(self.__publish_rate, MIN_PUBLISH_RATE, MAX_PUBLISH_RATE, "Publish Rate")
+        self.__telemetry_port = clamp(self.__telemetry_port, MIN_TELEMETRY_PORT, MAX_TELEMETRY_PORT, "Telemetry Port")
+
+        self.__invalidate()
+
+    def __invalidate(self):
+        # Makes the next get_plan compile a new plan
+        self.__plan_version += 1
 
     def __add_section(self, section):
         # Try to add the section if it doesnt exit
@@ -376,6 +1317,8 @@ class VisionConfiguration:
             self.__three_high = self.__try_get_key(THRESHOLD_SECTION, THREE_HIGH_KEY, MAX_COLOR_VALUE)
             self.__one_low = self.__try_get_key(THRESHOLD_SECTION, ONE_LOW_KEY, MIN_COLOR_VALUE)
             self.__one_high = self.__try_get_key(THRESHOLD_SECTION, ONE_HIGH_KEY, MAX_COLOR_VALUE)
+            self.__extra_ranges = parse_ranges(self.__try_get_key(THRESHOLD_SECTION, EXTRA_RANGES_KEY, "",
+                                                                  is_string=True))
             self.__kernel_size_close = self.__try_get_key(PROCESSING_SECTION, CLOSE_KERNEL_KEY, DEFAULT_CLOSE_VALUE)
             self.__kernel_size_open = self.__try_get_key(PROCESSING_SECTION, OPEN_KERNEL_KEY, DEFAULT_OPEN_VALUE)
             self.__kernel_size_smooth = self.__try_get_key(PROCESSING_SECTION, SMOOTH_KERNEL_KEY, DEFAULT_FILTER_VALUE)
@@ -383,6 +1326,54 @@ class VisionConfiguration:
             self.__should_open = self.__try_get_key(PROCESSING_SECTION, SHOULD_OPEN_KEY, True, True)
             self.__should_use_hsv = self.__try_get_key(PROCESSING_SECTION, SHOULD_USE_HSV_KEY, True, True)
             self.__should_use_smoothing = self.__try_get_key(PROCESSING_SECTION, SHOULD_SMOOTH_KEY, False, True)
+            self.__snapshot_format = self.__try_get_key(SNAPSHOT_SECTION, SNAPSHOT_FORMAT_KEY,
+                                                        DEFAULT_SNAPSHOT_FORMAT, is_string=True)
+            self.__snapshot_quality = self.__try_get_key(SNAPSHOT_SECTION, SNAPSHOT_QUALITY_KEY,
+                                                         DEFAULT_SNAPSHOT_QUALITY)
+            self.__snapshot_queue_size = self.__try_get_key(SNAPSHOT_SECTION, SNAPSHOT_QUEUE_KEY,
+                                                            DEFAULT_SNAPSHOT_QUEUE)
+            self.__snapshot_drop_policy = self.__try_get_key(SNAPSHOT_SECTION, SNAPSHOT_DROP_POLICY_KEY,
+                                                             DEFAULT_SNAPSHOT_DROP_POLICY, is_string=True)
+            self.__record_path = self.__try_get_key(RECORDING_SECTION, RECORD_PATH_KEY, DEFAULT_RECORD_PATH,
+                                                    is_string=True)
+            self.__record_max_frames = self.__try_get_key(RECORDING_SECTION, RECORD_MAX_FRAMES_KEY,
+                                                          DEFAULT_RECORD_FRAMES)
+            self.__should_use_roi = self.__try_get_key(TRACKING_SECTION, USE_ROI_KEY, True, True)
+            self.__roi_padding = self.__try_get_key(TRACKING_SECTION, ROI_PADDING_KEY, DEFAULT_ROI_PADDING)
+            self.__roi_max_frames = self.__try_get_key(TRACKING_SECTION, ROI_MAX_FRAMES_KEY, DEFAULT_ROI_FRAMES)
+            self.__pyramid_levels = self.__try_get_key(PROCESSING_SECTION, PYRAMID_LEVELS_KEY, DEFAULT_PYRAMID_LEVELS)
+            self.__should_use_flow = self.__try_get_key(TRACKING_SECTION, USE_FLOW_KEY, False, True)
+            self.__detect_interval = self.__try_get_key(TRACKING_SECTION, DETECT_INTERVAL_KEY, DEFAULT_DETECT_INTERVAL)
+            self.__min_confidence = self.__try_get_key(TRACKING_SECTION, MIN_CONFIDENCE_KEY, DEFAULT_MIN_CONFIDENCE)
+            self.__drift_tolerance = self.__try_get_key(TRACKING_SECTION, DRIFT_TOLERANCE_KEY, DEFAULT_DRIFT_TOLERANCE)
+            self.__min_area = self.__try_get_key(CANDIDATES_SECTION, MIN_AREA_KEY, DEFAULT_MIN_AREA)
+            self.__max_candidates = self.__try_get_key(CANDIDATES_SECTION, MAX_CANDIDATES_KEY, DEFAULT_CANDIDATES)
+            self.__target_aspect = self.__try_get_key(CANDIDATES_SECTION, TARGET_ASPECT_KEY, DEFAULT_ASPECT)
+            self.__min_solidity = self.__try_get_key(CANDIDATES_SECTION, MIN_SOLIDITY_KEY, DEFAULT_SOLIDITY)
+            self.__blob_engine = self.__try_get_key(CANDIDATES_SECTION, BLOB_ENGINE_KEY,
+                                                    DEFAULT_BLOB_ENGINE, is_string=True)
+            self.__min_fill = self.__try_get_key(CANDIDATES_SECTION, MIN_FILL_KEY, DEFAULT_FILL)
+            self.__segmentation = self.__try_get_key(PROCESSING_SECTION, SEGMENTATION_KEY,
+                                                     DEFAULT_SEGMENTATION, is_string=True)
+            self.__pixel_format = self.__try_get_key(CAMERA_SECTION, PIXEL_FORMAT_KEY,
+                                                     DEFAULT_PIXEL_FORMAT, is_string=True)
+            self.__smooth_method = self.__try_get_key(PROCESSING_SECTION, SMOOTH_METHOD_KEY,
+                                                      DEFAULT_SMOOTH_METHOD, is_string=True)
+            self.__should_use_pipeline = self.__try_get_key(PIPELINE_SECTION, USE_PIPELINE_KEY, False, True)
+            self.__pipeline_queue_size = self.__try_get_key(PIPELINE_SECTION, PIPELINE_QUEUE_KEY,
+                                                            DEFAULT_PIPELINE_QUEUE)
+            self.__should_use_process_pool = self.__try_get_key(PIPELINE_SECTION, USE_PROCESS_POOL_KEY, False, True)
+            self.__pool_workers = self.__try_get_key(PIPELINE_SECTION, POOL_WORKERS_KEY, DEFAULT_POOL_WORKERS)
+            self.__tile_bands = self.__try_get_key(PROCESSING_SECTION, TILE_BANDS_KEY, DEFAULT_TILE_BANDS)
+            self.__calibration = self.__try_get_key(CAMERA_SECTION, CALIBRATION_KEY, DEFAULT_CALIBRATION,
+                                                    is_string=True)
+            self.__target_width = self.__try_get_key(CAMERA_SECTION, TARGET_WIDTH_KEY, DEFAULT_TARGET_WIDTH)
+            self.__target_height = self.__try_get_key(CAMERA_SECTION, TARGET_HEIGHT_KEY, DEFAULT_TARGET_HEIGHT)
+            self.__publish_rate = self.__try_get_key(TABLE_SECTION, PUBLISH_RATE_KEY, DEFAULT_PUBLISH_RATE)
+            self.__telemetry_host = self.__try_get_key(TABLE_SECTION, TELEMETRY_HOST_KEY, DEFAULT_TELEMETRY_HOST,
+                                                       is_string=True)
+            self.__telemetry_port = self.__try_get_key(TABLE_SECTION, TELEMETRY_PORT_KEY, DEFAULT_TELEMETRY_PORT)
+            self.__invalidate()
         else:
             # Sets the values to the config
             self.__set_key(THRESHOLD_SECTION, TWO_LOW_KEY, self.__two_low)
@@ -391,6 +1382,7 @@ class VisionConfiguration:
             self.__set_key(THRESHOLD_SECTION, THREE_HIGH_KEY, self.__three_high)
             self.__set_key(THRESHOLD_SECTION, ONE_LOW_KEY, self.__one_low)
             self.__set_key(THRESHOLD_SECTION, ONE_HIGH_KEY, self.__one_high)
+            self.__set_key(THRESHOLD_SECTION, EXTRA_RANGES_KEY, format_ranges(self.__extra_ranges))
             self.__set_key(PROCESSING_SECTION, CLOSE_KERNEL_KEY, self.__kernel_size_close)
             self.__set_key(PROCESSING_SECTION, OPEN_KERNEL_KEY, self.__kernel_size_open)
             self.__set_key(PROCESSING_SECTION, SMOOTH_KERNEL_KEY, self.__kernel_size_smooth)
@@ -398,16 +1390,52 @@ class VisionConfiguration:
             self.__set_key(PROCESSING_SECTION, SHOULD_OPEN_KEY, self.__should_open)
             self.__set_key(PROCESSING_SECTION, SHOULD_USE_HSV_KEY, self.__should_use_hsv)
             self.__set_key(PROCESSING_SECTION, SHOULD_SMOOTH_KEY, self.__should_use_smoothing)
+            self.__set_key(SNAPSHOT_SECTION, SNAPSHOT_FORMAT_KEY, self.__snapshot_format)
+            self.__set_key(SNAPSHOT_SECTION, SNAPSHOT_QUALITY_KEY, self.__snapshot_quality)
+            self.__set_key(SNAPSHOT_SECTION, SNAPSHOT_QUEUE_KEY, self.__snapshot_queue_size)
+            self.__set_key(SNAPSHOT_SECTION, SNAPSHOT_DROP_POLICY_KEY, self.__snapshot_drop_policy)
+            self.__set_key(RECORDING_SECTION, RECORD_PATH_KEY, self.__record_path)
+            self.__set_key(RECORDING_SECTION, RECORD_MAX_FRAMES_KEY, self.__record_max_frames)
+            self.__set_key(TRACKING_SECTION, USE_ROI_KEY, self.__should_use_roi)
+            self.__set_key(TRACKING_SECTION, ROI_PADDING_KEY, self.__roi_padding)
+            self.__set_key(TRACKING_SECTION, ROI_MAX_FRAMES_KEY, self.__roi_max_frames)
+            self.__set_key(PROCESSING_SECTION, PYRAMID_LEVELS_KEY, self.__pyramid_levels)
+            self.__set_key(TRACKING_SECTION, USE_FLOW_KEY, self.__should_use_flow)
+            self.__set_key(TRACKING_SECTION, DETECT_INTERVAL_KEY, self.__detect_interval)
+            self.__set_key(TRACKING_SECTION, MIN_CONFIDENCE_KEY, self.__min_confidence)
+            self.__set_key(TRACKING_SECTION, DRIFT_TOLERANCE_KEY, self.__drift_tolerance)
+            self.__set_key(CANDIDATES_SECTION, MIN_AREA_KEY, self.__min_area)
+            self.__set_key(CANDIDATES_SECTION, MAX_CANDIDATES_KEY, self.__max_candidates)
+            self.__set_key(CANDIDATES_SECTION, TARGET_ASPECT_KEY, self.__target_aspect)
+            self.__set_key(CANDIDATES_SECTION, MIN_SOLIDITY_KEY, self.__min_solidity)
+            self.__set_key(CANDIDATES_SECTION, BLOB_ENGINE_KEY, self.__blob_engine)
+            self.__set_key(CANDIDATES_SECTION, MIN_FILL_KEY, self.__min_fill)
+            self.__set_key(PROCESSING_SECTION, SEGMENTATION_KEY, self.__segmentation)
+            self.__set_key(CAMERA_SECTION, PIXEL_FORMAT_KEY, self.__pixel_format)
+            self.__set_key(PROCESSING_SECTION, SMOOTH_METHOD_KEY, self.__smooth_method)
+            self.__set_key(PIPELINE_SECTION, USE_PIPELINE_KEY, self.__should_use_pipeline)
+            self.__set_key(PIPELINE_SECTION, PIPELINE_QUEUE_KEY, self.__pipeline_queue_size)
+            self.__set_key(PIPELINE_SECTION, USE_PROCESS_POOL_KEY, self.__should_use_process_pool)
+            self.__set_key(PIPELINE_SECTION, POOL_WORKERS_KEY, self.__pool_workers)
+            self.__set_key(PROCESSING_SECTION, TILE_BANDS_KEY, self.__tile_bands)
+            self.__set_key(CAMERA_SECTION, CALIBRATION_KEY, self.__calibration)
+            self.__set_key(CAMERA_SECTION, TARGET_WIDTH_KEY, self.__target_width)
+            self.__set_key(CAMERA_SECTION, TARGET_HEIGHT_KEY, self.__target_height)
+            self.__set_key(TABLE_SECTION, PUBLISH_RATE_KEY, self.__publish_rate)
+            self.__set_key(TABLE_SECTION, TELEMETRY_HOST_KEY, self.__telemetry_host)
+            self.__set_key(TABLE_SECTION, TELEMETRY_PORT_KEY, self.__telemetry_port)
 
     def __set_key(self, section, key, value):
         # Tries to add the section if needed then setting the value
         self.__add_section(section)
         self.__config.set(section, key, value)
 
-    def __try_get_key(self, section, key, default_value=None, is_bool=False):
+    def __try_get_key(self, section, key, default_value=None, is_bool=False, is_string=False):
         try:
             if is_bool:
                 return self.__config.getboolean(section, key)
+            elif is_string:
+                return self.__config.get(section, key)
             else:
                 return self.__config.getint(section, key)
         except cP.NoSectionError:
@@ -2,20 +2,19 @@ import cv2
 import logging
 import os
 import numpy as np
-from threading import Thread
-from VisionConfiguration import VisionConfiguration
+from VisionSnapshotWriter import VisionSnapshotWriter
+from VisionFrameSource import FrameSource, FRAME_RING_SIZE
+from VisionPlan import PIXEL_BGR, PIXEL_YUYV, PIXEL_GRAY
 
 logger = logging.getLogger('VisionFrameGrabber')
 
-READ_FAILS_TIL_SHUTDOWN = 5
 
-
-def get_start_point(directory=None):
+def get_start_point(directory=None, extension='.jpg'):
     if directory is None:
         directory = '.'
 
     files = [os.path.splitext(f)[0] for f in os.listdir(directory) if
-             os.path.isfile(f) and os.path.splitext(f)[1] == '.jpg']
+             os.path.isfile(f) and os.path.splitext(f)[1] == extension]
     numbers = []
 
     # Grab the numbers from the .jpg
@@ -29,38 +28,52 @@ def get_start_point(directory=None):
     return 0 if len(numbers) == 0 else max(numbers) + 1
 
 
-class VisionFrameGrabber:
+class VisionFrameGrabber(FrameSource):
     """
-    This is for grabbing frames in a separate thread
+    This is for grabbing frames from the camera in a separate thread
     """
 
-    def __init__(self, src=0, save_frames=0):
-        self.stopped = False
+    def __init__(self, src=0, save_frames=0, ring_size=FRAME_RING_SIZE, flip_code=None, snapshot_writer=None,
+                 recorder=None, pixel_format=PIXEL_BGR):
+        FrameSource.__init__(self, ring_size, flip_code)
+
+        if snapshot_writer is None:
+            snapshot_writer = VisionSnapshotWriter()
+
+        self.snapshot_writer = snapshot_writer
+        self.recorder = recorder
         self.stream = cv2.VideoCapture(src)
-        (self.grabbed, frame) = self.stream.read()
-        self.frame = cv2.flip(frame, 0)
+        self.pixel_format = pixel_format
         self.should_save_frames = False
+        self.should_record = False
         self.current_frame = 0
         self.start_frame = 0
-        self.read_fails = 0
 
         if save_frames > 0:
-            self.start_frame = get_start_point()
+            if self.recorder is not None:
+                # Snapshots go into the frame log, so carry on from its index
+                self.start_frame = self.recorder.get_count()
+            else:
+                self.start_frame = get_start_point(extension=self.snapshot_writer.get_extension())
+
             self.should_save_frames = False
             self.save_frames = save_frames + self.start_frame
 
+        if pixel_format != PIXEL_BGR:
+            # Have the camera hand over YUYV as it is instead of converting every frame to BGR
+            self.stream.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'YUYV'))
+            self.stream.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            self.width = int(self.stream.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self._prime()
+
     def start(self):
         """
         This starts the frame grabber process
         """
-        Thread(target=self.update, args=()).start()
-        return self
-
-    def read(self):
-        """
-        This grabs the latest frame from the frame grabber
-        """
-        return self.frame
+        self.snapshot_writer.start()
+        return FrameSource.start(self)
 
     def set_should_save_frames(self, should_save):
         """
@@ -68,45 +81,77 @@ class VisionFrameGrabber:
         """
         self.should_save_frames = should_save
 
-    def update(self):
+    def set_should_record(self, should_record):
         """
-        This is called to update the frame grabber
+        Sets if every captured frame should be appended to the frame log
         """
-        while True:
-            if self.stopped:
-                break
+        self.should_record = should_record and self.recorder is not None
 
-            (self.grabbed, self.frame) = self.stream.read()
+    def _capture(self, buf):
+        if self.pixel_format != PIXEL_BGR:
+            return self.__capture_raw(buf)
 
-            # Keep track if we are actually reading frames, and if not, shutdown after
-            # Five failed reads
-            if not self.grabbed:
-                self.read_fails += 1
-            else:
-                self.read_fails = 0
+        if buf is None:
+            return self.stream.read()
 
-            if self.read_fails > READ_FAILS_TIL_SHUTDOWN:
-                self.stop()
+        return self.stream.read(buf)
 
-            # See if we should save frames
-            if self.should_save_frames:
-                # Save those frames until a certain point
-                path = 'image %d%s' % (self.current_frame, '.jpg')
-                cv2.imwrite(path, self.frame)
+    def __capture_raw(self, buf):
+        # The raw frame comes back as a flat buffer or as Y0 U Y1 V pairs depending on the backend
+        (grabbed, raw) = self.stream.read()
+        if not grabbed:
+            return grabbed, raw
 
-                self.current_frame += 1
+        if raw.size != self.width * self.height * 2:
+            logger.warning('Camera gave %d bytes instead of a %dx%d YUYV frame', raw.size, self.width, self.height)
+            return False, None
 
-                if self.current_frame > self.save_frames:
-                    self.current_frame = self.save_frames
-                    temp = self.save_frames
-                    self.save_frames += self.save_frames - self.start_frame
-                    self.start_frame = temp
-                    self.should_save_frames = False
+        frame = raw.reshape(self.height, self.width, 2)
+        if self.pixel_format == PIXEL_GRAY:
+            # Only keep the Y of each pixel
+            frame = frame[:, :, 0]
 
+        if buf is None or buf.shape != frame.shape:
+            return grabbed, np.ascontiguousarray(frame)
+
+        np.copyto(buf, frame)
+        return grabbed, buf
+
+    def _skip(self):
+        self.stream.grab()
+
+    def _on_frame(self, frame, sequence, timestamp):
+        # Record the whole match if we should
+        if self.should_record:
+            self.recorder.append(frame, sequence, timestamp)
+
+        # See if we should save frames
+        if self.should_save_frames:
+            if self.recorder is not None:
+                # Snapshots are raw frames in the frame log when we have one
+                if not self.should_record:
+                    self.recorder.append(frame, sequence, timestamp)
+            else:
+                # Hand those frames to the snapshot writer until a certain point
+                if self.pixel_format == PIXEL_YUYV:
+                    # Images can't be written as YUYV
+                    frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV)
+
+                path = 'image %d%s' % (self.current_frame, self.snapshot_writer.get_extension())
+                self.snapshot_writer.submit(frame, path)
+
+            self.current_frame += 1
+
+            if self.current_frame > self.save_frames:
+                self.current_frame = self.save_frames
+                temp = self.save_frames
+                self.save_frames += self.save_frames - self.start_frame
+                self.start_frame = temp
+                self.should_save_frames = False
+
+    def _close(self):
         self.stream.release()
+        self.snapshot_writer.stop()
 
-    def stop(self):
-        """
-        This stops the frame grabber
-        """
-        self.stopped = True
+        if self.recorder is not None:
+            self.recorder.close()
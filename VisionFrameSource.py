@@ -0,0 +1,532 @@
+import cv2
+import logging
+import os
+import time
+import numpy as np
+from threading import Thread, Condition
+from VisionRecorder import VisionRecordReader, LOG_EXTENSION
+
+'''
+This module is for the sources frames come from. Every source captures into a ring of preallocated
+buffers on its own thread, and hands out sequence numbered frames the same way, whether they come
+from the camera or are replayed from disk.
+'''
+
+logger = logging.getLogger('VisionFrameSource')
+
+READ_FAILS_TIL_SHUTDOWN = 5
+
+# Amount of preallocated frame buffers a source captures into
+FRAME_RING_SIZE = 4
+
+# Rate to replay sources that don't record when their frames were taken
+DEFAULT_REPLAY_FPS = 30.0
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameLease:
+    """
+    This is a hold on one of the frame source's ring buffers, the buffer won't be
+    captured into again until the lease is released
+    """
+
+    def __init__(self, source, slot, sequence, timestamp, frame):
+        self.__source = source
+        self.__slot = slot
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.frame = frame
+
+    def release(self):
+        """
+        Gives the buffer back to the frame source, safe to call more than once
+        """
+        if self.__source is not None:
+            self.__source._release_slot(self.__slot)
+            self.__source = None
+            self.frame = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class FrameSource:
+    """
+    This is the base of everything frames are read from. Sources implement _capture to fill a buffer
+    with the next frame, and everything else is shared
+    """
+
+    def __init__(self, ring_size=FRAME_RING_SIZE, flip_code=None, lossless=False, frame_limit=None):
+        self.stopped = False
+        self.flip_code = flip_code
+        self.lossless = lossless
+        self.frame_limit = frame_limit
+        self.grabbed = False
+        self.frame = None
+        self.sequence = -1
+        self.timestamp = 0.0
+        self.frames_captured = 0
+        self.frames_consumed = 0
+        self.frames_dropped = 0
+        self.read_fails = 0
+        self.__ring_size = max(ring_size, 2)
+        self.__ring = []
+        self.__leases = []
+        self.__latest = 0
+        self.__last_consumed = -1
+        self.__frame_ready = Condition()
+
+    def start(self):
+        """
+        This starts the frame source thread
+        """
+        Thread(target=self.update, args=()).start()
+        return self
+
+    def read(self):
+        """
+        This grabs a copy of the latest frame from the frame source
+        """
+        with self.__frame_ready:
+            if self.frame is None:
+                return None
+
+            return self.frame.copy()
+
+    def read_next(self, after_seq=-1, timeout=None):
+        """
+        Blocks until a frame newer than after_seq has been captured
+        :param after_seq: The sequence number of the last frame the caller has seen
+        :param timeout: How long to wait in seconds, None waits forever
+        :return: (sequence, timestamp, copy of the frame), or None on timeout or if the source stopped
+        """
+        with self.__frame_ready:
+            if not self.__wait_for(after_seq, timeout):
+                return None
+
+            return self.sequence, self.timestamp, self.frame.copy()
+
+    def lease_next(self, after_seq=-1, timeout=None):
+        """
+        Blocks until a frame newer than after_seq has been captured, and leases its buffer
+        without copying it. The lease must be released once the caller is done with the frame
+        :param after_seq: The sequence number of the last frame the caller has seen
+        :param timeout: How long to wait in seconds, None waits forever
+        :return: The FrameLease, or None on timeout or if the source stopped
+        """
+        with self.__frame_ready:
+            if not self.__wait_for(after_seq, timeout):
+                return None
+
+            self.__leases[self.__latest] += 1
+            return FrameLease(self, self.__latest, self.sequence, self.timestamp, self.frame)
+
+    def get_stats(self):
+        """
+        Gets the capture counters of the frame source
+        :return: A dict of the frames captured, consumed and dropped
+        """
+        return {
+            'captured': self.frames_captured,
+            'consumed': self.frames_consumed,
+            'dropped': self.frames_dropped
+        }
+
+    def set_should_save_frames(self, should_save):
+        """
+        Sets if the source should save some frames, only live sources save frames
+        """
+        pass
+
+    def set_should_record(self, should_record):
+        """
+        Sets if the source should record every frame, only live sources record
+        """
+        pass
+
+    def update(self):
+        """
+        This is called to capture frames until the source is stopped
+        """
+        while True:
+            if self.stopped:
+                break
+
+            if self.lossless and not self.__wait_for_consumer():
+                break
+
+            slot = self._next_free_slot()
+            if slot is None:
+                # Every buffer is leased, so throw this frame away instead of overwriting one
+                self._skip()
+                with self.__frame_ready:
+                    self.frames_dropped += 1
+                continue
+
+            buf = self.__ring[slot] if slot < len(self.__ring) else None
+            (grabbed, frame) = self._capture(buf)
+            timestamp = time.time()
+
+            # Keep track if we are actually reading frames, and if not, shutdown after
+            # Five failed reads
+            if not grabbed:
+                self.grabbed = False
+                self.read_fails += 1
+            else:
+                self.read_fails = 0
+                self._publish(slot, frame, timestamp)
+                self._on_frame(frame, self.sequence, timestamp)
+
+            if self.read_fails > READ_FAILS_TIL_SHUTDOWN:
+                self.stop()
+
+            if self.frame_limit is not None and self.frames_captured >= self.frame_limit:
+                self.stop()
+
+        self._close()
+
+    def stop(self):
+        """
+        This stops the frame source
+        """
+        with self.__frame_ready:
+            self.stopped = True
+            self.__frame_ready.notify_all()
+
+    def _capture(self, buf):
+        """
+        Captures the next frame, into buf when it is given and the same size
+        :param buf: The buffer to capture into, None to capture into a new frame
+        :return: (grabbed, frame)
+        """
+        raise NotImplementedError()
+
+    def _skip(self):
+        """
+        Throws away the next frame without keeping it
+        """
+        self._capture(None)
+
+    def _on_frame(self, frame, sequence, timestamp):
+        """
+        Called on the capture thread after every published frame
+        """
+        pass
+
+    def _close(self):
+        """
+        Called on the capture thread once the source has stopped
+        """
+        pass
+
+    def _prime(self):
+        # Capture the first frame so the ring can be sized from it
+        (grabbed, frame) = self._capture(None)
+        self.grabbed = grabbed
+
+        if not grabbed:
+            logger.error('%s could not read a first frame', self.__class__.__name__)
+            self.stopped = True
+            return
+
+        self._publish(0, frame, time.time())
+
+    def _publish(self, slot, frame, timestamp):
+        # Keep the buffer in the ring, flip it in place, and wake up anyone waiting for it
+        if len(self.__ring) == 0:
+            self.__ring = [np.empty_like(frame) for _ in range(self.__ring_size)]
+            self.__leases = [0] * self.__ring_size
+
+        # The capture only reallocates if the frame size changed, keep the new buffer
+        if frame is not self.__ring[slot]:
+            if frame.shape == self.__ring[slot].shape and frame.dtype == self.__ring[slot].dtype:
+                np.copyto(self.__ring[slot], frame)
+                frame = self.__ring[slot]
+            else:
+                self.__ring[slot] = frame
+
+        if self.flip_code is not None:
+            cv2.flip(frame, self.flip_code, frame)
+
+        with self.__frame_ready:
+            self.grabbed = True
+            self.__latest = slot
+            self.frame = frame
+            self.timestamp = timestamp
+            self.sequence += 1
+            self.frames_captured += 1
+            self.__frame_ready.notify_all()
+
+    def _release_slot(self, slot):
+        # Called by FrameLease when the reader is done with the buffer
+        with self.__frame_ready:
+            self.__leases[slot] -= 1
+            self.__frame_ready.notify_all()
+
+    def _next_free_slot(self):
+        # Find the next buffer that isn't the latest frame and nobody is reading
+        with self.__frame_ready:
+            count = len(self.__ring)
+            if count == 0:
+                return 0
+
+            for i in range(1, count + 1):
+                slot = (self.__latest + i) % count
+                if slot != self.__latest and self.__leases[slot] == 0:
+                    return slot
+
+        return None
+
+    def __wait_for_consumer(self):
+        # Lossless sources wait for the latest frame to be consumed before capturing another
+        with self.__frame_ready:
+            while self.__last_consumed < self.sequence and not self.stopped:
+                self.__frame_ready.wait(0.1)
+
+            return not self.stopped
+
+    def __wait_for(self, after_seq, timeout):
+        # Waits with the lock held for a frame newer than after_seq and counts it as consumed
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while self.sequence <= after_seq and not self.stopped:
+            if timeout is None:
+                self.__frame_ready.wait()
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+
+                self.__frame_ready.wait(remaining)
+
+        if self.sequence <= after_seq or self.frame is None:
+            return False
+
+        # Every frame captured since the last consumed one was never seen
+        if self.sequence > self.__last_consumed:
+            self.frames_dropped += self.sequence - self.__last_consumed - 1
+            self.__last_consumed = self.sequence
+            self.__frame_ready.notify_all()
+
+        self.frames_consumed += 1
+        return True
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    This is the base of sources that replay frames from disk, either at the times they were
+    recorded or as fast as they are consumed
+    """
+
+    def __init__(self, realtime=True, loop=False, ring_size=FRAME_RING_SIZE, flip_code=None, frame_limit=None):
+        FrameSource.__init__(self, ring_size, flip_code, not realtime, frame_limit)
+        self.realtime = realtime
+        self.loop = loop
+        self.__start_time = None
+        self.__first_time = None
+
+    def _capture(self, buf):
+        frame, frame_time = self._next_frame(buf)
+
+        if frame is None and self.loop:
+            self._rewind()
+            self.__start_time = None
+            frame, frame_time = self._next_frame(buf)
+
+        if frame is None:
+            # The end of the replay, not a failed read
+            self.stop()
+            return False, None
+
+        if self.realtime:
+            self.__wait_until(frame_time)
+
+        return True, frame
+
+    def _next_frame(self, buf):
+        """
+        Reads the next frame of the replay
+        :param buf: The buffer to read into if it can be
+        :return: (frame, the time in seconds it was recorded at), or (None, None) at the end
+        """
+        raise NotImplementedError()
+
+    def _rewind(self):
+        """
+        Goes back to the first frame of the replay
+        """
+        raise NotImplementedError()
+
+    def __wait_until(self, frame_time):
+        # Sleep so frames come out as far apart as they were recorded
+        now = time.time()
+        if self.__start_time is None:
+            self.__start_time = now
+            self.__first_time = frame_time
+            return
+
+        delay = (frame_time - self.__first_time) - (now - self.__start_time)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class VideoFileFrameSource(ReplayFrameSource):
+    """
+    This replays the frames of a video file
+    """
+
+    def __init__(self, path, realtime=True, loop=False, ring_size=FRAME_RING_SIZE, flip_code=None,
+                 frame_limit=None):
+        ReplayFrameSource.__init__(self, realtime, loop, ring_size, flip_code, frame_limit)
+        self.path = path
+        self.stream = cv2.VideoCapture(path)
+        self.fps = self.stream.get(cv2.CAP_PROP_FPS) or DEFAULT_REPLAY_FPS
+        self.__position = 0
+        self._prime()
+
+    def _next_frame(self, buf):
+        if buf is None:
+            (grabbed, frame) = self.stream.read()
+        else:
+            (grabbed, frame) = self.stream.read(buf)
+
+        if not grabbed:
+            return None, None
+
+        self.__position += 1
+        return frame, self.__position / self.fps
+
+    def _rewind(self):
+        self.stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.__position = 0
+
+    def _close(self):
+        self.stream.release()
+
+
+class ImageDirectoryFrameSource(ReplayFrameSource):
+    """
+    This replays every image in a directory in name order
+    """
+
+    def __init__(self, directory, realtime=True, loop=False, fps=DEFAULT_REPLAY_FPS, ring_size=FRAME_RING_SIZE,
+                 flip_code=None, frame_limit=None):
+        ReplayFrameSource.__init__(self, realtime, loop, ring_size, flip_code, frame_limit)
+        self.directory = directory
+        self.fps = fps
+        self.paths = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                            if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        self.__position = 0
+        self._prime()
+
+    def _next_frame(self, buf):
+        while self.__position < len(self.paths):
+            path = self.paths[self.__position]
+            self.__position += 1
+
+            frame = cv2.imread(path)
+            if frame is not None:
+                return frame, self.__position / self.fps
+
+            logger.warning('Could not read %s', path)
+
+        return None, None
+
+    def _rewind(self):
+        self.__position = 0
+
+
+class SingleImageFrameSource(ReplayFrameSource):
+    """
+    This serves the same image over and over
+    """
+
+    def __init__(self, path, realtime=True, fps=DEFAULT_REPLAY_FPS, ring_size=FRAME_RING_SIZE, flip_code=None,
+                 frame_limit=None):
+        ReplayFrameSource.__init__(self, realtime, False, ring_size, flip_code, frame_limit)
+        self.path = path
+        self.fps = fps
+        self.image = cv2.imread(path)
+        self.__position = 0
+        self._prime()
+
+    def _next_frame(self, buf):
+        if self.image is None:
+            return None, None
+
+        self.__position += 1
+        if buf is not None and buf.shape == self.image.shape:
+            np.copyto(buf, self.image)
+            return buf, self.__position / self.fps
+
+        return self.image.copy(), self.__position / self.fps
+
+    def _rewind(self):
+        self.__position = 0
+
+
+class RecordedFrameSource(ReplayFrameSource):
+    """
+    This replays the frames of a frame log at the times they were captured
+    """
+
+    def __init__(self, path, realtime=True, loop=False, ring_size=FRAME_RING_SIZE, flip_code=None,
+                 frame_limit=None):
+        ReplayFrameSource.__init__(self, realtime, loop, ring_size, flip_code, frame_limit)
+        self.path = path
+        self.reader = VisionRecordReader(path)
+        self.__position = 0
+        self._prime()
+
+    def _next_frame(self, buf):
+        if self.__position >= len(self.reader):
+            return None, None
+
+        sequence, timestamp, frame = self.reader.read(self.__position)
+        self.__position += 1
+
+        if buf is not None and buf.shape == frame.shape:
+            np.copyto(buf, frame)
+            return buf, timestamp
+
+        return np.array(frame), timestamp
+
+    def _rewind(self):
+        self.__position = 0
+
+    def _close(self):
+        self.reader.close()
+
+
+def create_frame_source(src=0, realtime=True, loop=False, frame_limit=None, ring_size=FRAME_RING_SIZE):
+    """
+    Creates the frame source for a camera index, video file, image directory, single image or frame log
+    :param src: The camera index or path to replay
+    :param realtime: If replays should run at their recorded rate instead of as fast as they are consumed
+    :param loop: If replays should start over at the end
+    :param frame_limit: Stop after this many frames, None to never stop
+    :param ring_size: The amount of frame buffers, enough for every frame that will be leased at once
+    :return: The frame source, not started
+    """
+    if isinstance(src, str) and src.isdigit():
+        src = int(src)
+
+    if isinstance(src, int):
+        from VisionFrameGrabber import VisionFrameGrabber
+        return VisionFrameGrabber(src, ring_size=ring_size)
+
+    extension = os.path.splitext(src)[1].lower()
+
+    if os.path.isdir(src):
+        return ImageDirectoryFrameSource(src, realtime, loop, ring_size=ring_size, frame_limit=frame_limit)
+    elif extension in IMAGE_EXTENSIONS:
+        return SingleImageFrameSource(src, realtime, ring_size=ring_size, frame_limit=frame_limit)
+    elif extension == LOG_EXTENSION:
+        return RecordedFrameSource(src, realtime, loop, ring_size=ring_size, frame_limit=frame_limit)
+
+    return VideoFileFrameSource(src, realtime, loop, ring_size=ring_size, frame_limit=frame_limit)
@@ -0,0 +1,173 @@
+import cv2
+import logging
+import math
+import os
+import numpy as np
+from collections import namedtuple
+from VisionProcessor import order_corners
+
+'''
+This module is for working out where the target is from its corners, with the camera's calibration.
+Only the corners are undistorted, so the pose costs next to nothing compared to undistorting the frame.
+'''
+
+logger = logging.getLogger('VisionGeometry')
+
+# Names the calibration is saved under by OpenCV's calibration sample
+CAMERA_MATRIX_NODE = 'camera_matrix'
+DISTORTION_NODE = 'distortion_coefficients'
+IMAGE_WIDTH_NODE = 'image_width'
+IMAGE_HEIGHT_NODE = 'image_height'
+
+# IPPE is made for planar targets, older versions of OpenCV only have the iterative solver
+PNP_METHOD = getattr(cv2, 'SOLVEPNP_IPPE', getattr(cv2, 'SOLVEPNP_ITERATIVE', 0))
+
+# Where the target is from the camera, in the units of the target's size, and the angle in degrees
+Pose = namedtuple('Pose', ['distance', 'yaw', 'x', 'y'])
+
+# Models that have been loaded, by their calibration file
+camera_models = {}
+
+
+def get_camera_model(config):
+    """
+    Gets the camera model for the configuration, only loading the calibration again if it changed on disk
+    :param config: The VisionConfiguration with the calibration and target size
+    :return: The CameraModel, or None if there is no calibration
+    """
+    path = config.get_calibration()
+    if not path:
+        return None
+
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        logger.warning('Calibration %s does not exist', path)
+        return None
+
+    target_size = (config.get_target_width(), config.get_target_height())
+    key = (path, modified, target_size)
+    model = camera_models.get(path)
+
+    if model is None or model.key != key:
+        model = CameraModel.load(path, target_size)
+        model.key = key
+        camera_models[path] = model
+
+    return model
+
+
+def read_calibration(path):
+    """
+    Reads the camera matrix and distortion of a calibration, from an npz or from OpenCV's yml or xml
+    :param path: The path of the calibration file
+    :return: The camera matrix, The distortion coefficients, The (width, height) calibrated at or None if not saved
+    """
+    if path.endswith('.npz'):
+        calibration = np.load(path)
+        size = None
+        if IMAGE_WIDTH_NODE in calibration and IMAGE_HEIGHT_NODE in calibration:
+            size = (int(calibration[IMAGE_WIDTH_NODE]), int(calibration[IMAGE_HEIGHT_NODE]))
+
+        return calibration[CAMERA_MATRIX_NODE], calibration[DISTORTION_NODE], size
+
+    storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    camera_matrix = storage.getNode(CAMERA_MATRIX_NODE).mat()
+    distortion = storage.getNode(DISTORTION_NODE).mat()
+
+    size = None
+    if not storage.getNode(IMAGE_WIDTH_NODE).empty() and not storage.getNode(IMAGE_HEIGHT_NODE).empty():
+        size = (int(storage.getNode(IMAGE_WIDTH_NODE).real()), int(storage.getNode(IMAGE_HEIGHT_NODE).real()))
+
+    storage.release()
+    return camera_matrix, distortion, size
+
+
+class CameraModel:
+    """
+    This holds the intrinsics and distortion of the camera, and the corners of the target in the world.
+    The intrinsics are scaled to each frame size the first time it's seen, so the frame can be smaller
+    than the calibration was made at
+    """
+
+    def __init__(self, camera_matrix, distortion, calibrated_size, target_size):
+        """
+        :param camera_matrix: The 3x3 intrinsics of the camera
+        :param distortion: The distortion coefficients of the camera
+        :param calibrated_size: The (width, height) the calibration was made at, None if the frames are the same
+        :param target_size: The (width, height) of the target
+        """
+        self.key = None
+        self.camera_matrix = np.array(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.distortion = np.array(distortion, dtype=np.float64).reshape(-1)
+        self.calibrated_size = calibrated_size
+        self.__matrices = {}
+
+        # The target's corners from the top left going clockwise, around its center, with y down like the image
+        width, height = target_size
+        self.object_points = np.array([[-width / 2.0, -height / 2.0, 0], [width / 2.0, -height / 2.0, 0],
+                                       [width / 2.0, height / 2.0, 0], [-width / 2.0, height / 2.0, 0]],
+                                      dtype=np.float64)
+
+    @staticmethod
+    def load(path, target_size):
+        """
+        Loads the model from a calibration file
+        :param path: The path of the calibration, an npz or OpenCV's yml or xml
+        :param target_size: The (width, height) of the target
+        :return: The CameraModel
+        """
+        camera_matrix, distortion, calibrated_size = read_calibration(path)
+        logger.info('Loaded calibration %s', path)
+        return CameraModel(camera_matrix, distortion, calibrated_size, target_size)
+
+    def get_camera_matrix(self, width, height):
+        """
+        Gets the intrinsics for frames of the size
+        :param width: The width of the frames
+        :param height: The height of the frames
+        :return: The 3x3 camera matrix
+        """
+        matrix = self.__matrices.get((width, height))
+
+        if matrix is None:
+            matrix = self.camera_matrix.copy()
+            if self.calibrated_size is not None:
+                matrix[0] *= float(width) / self.calibrated_size[0]
+                matrix[1] *= float(height) / self.calibrated_size[1]
+
+            self.__matrices[(width, height)] = matrix
+
+        return matrix
+
+    def undistort_points(self, points, width, height):
+        """
+        Removes the lens distortion from points in the frame
+        :param points: The (x, y) points in pixels
+        :param width: The width of the frame
+        :param height: The height of the frame
+        :return: The undistorted points in pixels, as an Nx2 array
+        """
+        matrix = self.get_camera_matrix(width, height)
+        distorted = np.array(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.undistortPoints(distorted, matrix, self.distortion, P=matrix).reshape(-1, 2)
+
+    def solve_pose(self, points, width, height):
+        """
+        Works out where the target is from its corners
+        :param points: The 4 corners of the target in pixels, in any order
+        :param width: The width of the frame
+        :param height: The height of the frame
+        :return: The Pose, or None if it couldn't be solved
+        """
+        corners = self.undistort_points(order_corners(points), width, height)
+
+        # The corners are already undistorted, so solve as if there was no distortion
+        solved, rotation, translation = cv2.solvePnP(self.object_points, corners.reshape(-1, 1, 2),
+                                                     self.get_camera_matrix(width, height), None,
+                                                     flags=PNP_METHOD)[:3]
+        if not solved:
+            return None
+
+        x, y, z = translation.reshape(3)
+        return Pose(math.sqrt(x * x + y * y + z * z), math.degrees(math.atan2(x, z)), x, y)
@@ -0,0 +1,360 @@
+import logging
+import time
+import numpy as np
+from collections import deque, namedtuple
+from threading import Thread, Condition, Lock
+from VisionProcessor import VisionProcessor, ProcessingContext, RoiTracker, align_window, order_corners
+
+'''
+This module is for running the vision on a thread per stage, so the stages of different frames overlap.
+OpenCV lets go of the GIL while it works, so each stage can have a core to itself.
+'''
+
+logger = logging.getLogger('VisionPipeline')
+
+DEFAULT_QUEUE_SIZE = 2
+
+# Seconds the capture stage waits for a frame before checking if it should stop
+CAPTURE_TIMEOUT = 1.0
+
+# What the pipeline found in a frame, handed to the publish function in frame order
+PipelineResult = namedtuple('PipelineResult', ['sequence', 'timestamp', 'points', 'candidates', 'width', 'height'])
+
+
+def get_ring_size(queue_size):
+    """
+    Gets how many frame buffers the source needs so the pipeline never runs out, every queue and stage
+    between capture and detection holds a frame, plus the one being captured
+    :param queue_size: The size of the queues between the stages
+    :return: The amount of frame buffers
+    """
+    return 2 * queue_size + 3
+
+
+class LatestQueue:
+    """
+    This is a bounded queue between two stages. When it's full the oldest item is dropped for the newest,
+    so a slow stage never holds up the ones before it or lets latency pile up
+    """
+
+    def __init__(self, name, size=DEFAULT_QUEUE_SIZE, on_drop=None):
+        self.name = name
+        self.size = max(size, 1)
+        self.on_drop = on_drop
+        self.closed = False
+        self.passed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.__depth_total = 0
+        self.__items = deque()
+        self.__has_items = Condition()
+
+    def put(self, item):
+        """
+        Adds the item, dropping the oldest one if the queue is full
+        :param item: The item to add
+        """
+        dropped = None
+
+        with self.__has_items:
+            if len(self.__items) >= self.size:
+                dropped = self.__items.popleft()
+                self.dropped += 1
+
+            self.__items.append(item)
+            self.passed += 1
+            self.__depth_total += len(self.__items)
+            self.max_depth = max(self.max_depth, len(self.__items))
+            self.__has_items.notify()
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        """
+        Takes the oldest item, waiting for one if the queue is empty
+        :param timeout: Seconds to wait, None to wait until there is one or the queue is closed
+        :return: The item, or None if the queue is closed or the wait timed out
+        """
+        with self.__has_items:
+            if timeout is not None:
+                deadline = time.time() + timeout
+
+            while len(self.__items) == 0 and not self.closed:
+                if timeout is None:
+                    self.__has_items.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+
+                    self.__has_items.wait(remaining)
+
+            if len(self.__items) == 0:
+                return None
+
+            return self.__items.popleft()
+
+    def close(self):
+        """
+        Closes the queue, the items left can still be taken and then get returns None
+        """
+        with self.__has_items:
+            self.closed = True
+            self.__has_items.notify_all()
+
+    def drain(self):
+        """
+        Drops every item left in the queue
+        """
+        with self.__has_items:
+            items = list(self.__items)
+            self.__items.clear()
+
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop(item)
+
+    def get_stats(self):
+        """
+        Gets the counters of the queue
+        :return: A dict of the current, max and average depth, and the items passed and dropped
+        """
+        with self.__has_items:
+            return {
+                'depth': len(self.__items),
+                'max_depth': self.max_depth,
+                'average_depth': self.__depth_total / float(self.passed) if self.passed > 0 else 0.0,
+                'passed': self.passed,
+                'dropped': self.dropped
+            }
+
+
+class VisionPipeline:
+    """
+    This runs capture, smooth/threshold, morph/contour/polygon and publish on their own threads with a
+    latest wins queue between each. Every stage takes frames in the order they were captured, so the
+    results are published in frame order even when frames are dropped
+    """
+
+    def __init__(self, source, config, publish, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param source: The FrameSource to lease frames from, it needs get_ring_size(queue_size) buffers
+        :param config: The VisionConfiguration to process with
+        :param publish: Called on the publish thread with each PipelineResult
+        :param queue_size: How many frames can wait between two stages
+        """
+        self.source = source
+        self.config = config
+        self.publish = publish
+        self.stopped = False
+        self.error = None
+        self.published = 0
+        self.out_of_order = 0
+        self.last_sequence = -1
+        self.tracker = RoiTracker()
+
+        # Milliseconds each stage took on its last frame
+        self.timings = {}
+
+        # Each stage processes with its own scratch images
+        self.__segmenter = VisionProcessor(config, ProcessingContext())
+        self.__detector = VisionProcessor(config, ProcessingContext())
+
+        # Masks are handed from segmentation to detection in recycled buffers
+        self.__free_masks = []
+        self.__masks_lock = Lock()
+
+        self.__leases = LatestQueue('segment', queue_size, self.__drop_lease)
+        self.__masks = LatestQueue('detect', queue_size, self.__drop_mask)
+        self.__results = LatestQueue('publish', queue_size)
+        self.__threads = []
+
+    def start(self):
+        """
+        This starts a thread for each stage
+        """
+        for stage in (self.__capture, self.__segment, self.__detect, self.__publish):
+            thread = Thread(target=stage, args=())
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+        return self
+
+    def stop(self):
+        """
+        This stops the pipeline, the frames already captured are dropped
+        """
+        self.stopped = True
+
+    def join(self, timeout=None):
+        """
+        Waits for every stage to finish
+        :param timeout: Seconds to wait for each stage
+        """
+        for thread in self.__threads:
+            thread.join(timeout)
+
+    def get_stats(self):
+        """
+        Gets the counters of the pipeline
+        :return: A dict of the stats of each queue, the stage timings, and the results published
+        """
+        return {
+            'queues': dict((queue.name, queue.get_stats()) for queue in (self.__leases, self.__masks, self.__results)),
+            'timings': dict(self.timings),
+            'published': self.published,
+            'out_of_order': self.out_of_order
+        }
+
+    def __capture(self):
+        # Lease every new frame and hand it on, the queue drops the oldest if segmentation falls behind
+        last_sequence = -1
+
+        while not self.stopped and not self.source.stopped:
+            lease = self.source.lease_next(last_sequence, CAPTURE_TIMEOUT)
+            if lease is None:
+                continue
+
+            last_sequence = lease.sequence
+            self.__leases.put(lease)
+
+        self.__leases.close()
+
+    def __segment(self):
+        # Smooth and threshold the window around the last target, or the whole frame
+        while True:
+            lease = self.__leases.get()
+            if lease is None:
+                break
+
+            if self.stopped:
+                lease.release()
+                continue
+
+            try:
+                start = time.time()
+                plan = self.config.get_plan()
+                window = align_window(self.tracker.get_window(lease.frame.shape, plan), plan)
+
+                image = lease.frame
+                if window is not None:
+                    x0, y0, x1, y1 = window
+                    image = lease.frame[y0:y1, x0:x1]
+
+                # The segmenter reuses its images on the next frame, so copy the mask out for detection
+                processed = self.__segmenter.process_frame(image)
+                mask = self.__get_mask(processed.shape)
+                np.copyto(mask, processed)
+                self.timings['segment'] = (time.time() - start) * 1000.0
+            except Exception as e:
+                lease.release()
+                self.__fail(e)
+                continue
+
+            self.__masks.put((lease, mask, window))
+
+        self.__leases.drain()
+        self.__masks.close()
+
+    def __detect(self):
+        # Find the candidates in the mask, falling back to the whole frame if the target left the window
+        while True:
+            item = self.__masks.get()
+            if item is None:
+                break
+
+            lease, mask, window = item
+            if self.stopped:
+                self.__drop_mask(item)
+                continue
+
+            try:
+                start = time.time()
+                plan = self.config.get_plan()
+                offset = (0, 0) if window is None else window[:2]
+                candidates = self.__detector.rank_candidates(mask, offset=offset)
+
+                tracked = window is not None and len(candidates) > 0
+                if window is not None and len(candidates) == 0:
+                    candidates = self.__detector.rank_candidates(self.__detector.process_frame(lease.frame))
+
+                points = candidates[0].points if len(candidates) > 0 else None
+                self.tracker.update(points, lease.frame.shape, plan, tracked)
+
+                # Published from the top left going clockwise, the same as the serial loop's tracker does
+                if points is not None:
+                    points = order_corners(points)
+
+                # A window only finds the target it's tracking, the other targets are only all known on full searches
+                if tracked:
+                    candidates = None
+
+                height, width = lease.frame.shape[:2]
+                result = PipelineResult(lease.sequence, lease.timestamp, points, candidates, width, height)
+                self.timings['detect'] = (time.time() - start) * 1000.0
+            except Exception as e:
+                self.__fail(e)
+                continue
+            finally:
+                self.__drop_mask(item)
+
+            self.__results.put(result)
+
+        self.__masks.drain()
+        self.__results.close()
+
+    def __publish(self):
+        # Hand the results on in frame order
+        while True:
+            result = self.__results.get()
+            if result is None:
+                break
+
+            if self.stopped:
+                continue
+
+            if result.sequence <= self.last_sequence:
+                self.out_of_order += 1
+                continue
+
+            try:
+                start = time.time()
+                self.publish(result)
+                self.timings['publish'] = (time.time() - start) * 1000.0
+            except Exception as e:
+                self.__fail(e)
+                continue
+
+            self.last_sequence = result.sequence
+            self.published += 1
+
+    def __fail(self, error):
+        # Keep the first error for whoever is running the pipeline and stop
+        logger.exception('Pipeline stage failed')
+
+        if self.error is None:
+            self.error = error
+
+        self.stop()
+
+    def __get_mask(self, shape):
+        # Reuse a mask from a frame that's done with when the size matches
+        with self.__masks_lock:
+            while len(self.__free_masks) > 0:
+                mask = self.__free_masks.pop()
+                if mask.shape == shape:
+                    return mask
+
+        return np.empty(shape, dtype=np.uint8)
+
+    def __drop_lease(self, lease):
+        lease.release()
+
+    def __drop_mask(self, item):
+        lease, mask, window = item
+        lease.release()
+
+        with self.__masks_lock:
+            self.__free_masks.append(mask)
@@ -0,0 +1,280 @@
+import cv2
+import numpy as np
+from collections import namedtuple
+
+'''
+This module is for the compiled processing plan, everything the processor needs from the configuration
+worked out once so no frame has to build arrays or check flags.
+'''
+
+# Stages of the processing plan
+STAGE_SMOOTH = 'smooth'
+STAGE_THRESHOLD = 'threshold'
+STAGE_OPEN = 'open'
+STAGE_CLOSE = 'close'
+
+# Ways of smoothing, mask smooths the threshold instead of the colors
+SMOOTH_BOX = 'box'
+SMOOTH_GAUSSIAN = 'gaussian'
+SMOOTH_MEDIAN = 'median'
+SMOOTH_BILATERAL = 'bilateral'
+SMOOTH_MASK = 'mask'
+SMOOTH_METHODS = (SMOOTH_BOX, SMOOTH_GAUSSIAN, SMOOTH_MEDIAN, SMOOTH_BILATERAL, SMOOTH_MASK)
+
+# Ways of finding the blobs in the mask
+BLOB_CONTOURS = 'contours'
+BLOB_COMPONENTS = 'components'
+
+# Ways of applying the color ranges
+SEGMENT_RANGE = 'range'
+SEGMENT_LUT = 'lut'
+
+# Formats of the frames being processed
+PIXEL_BGR = 'bgr'
+PIXEL_YUYV = 'yuyv'
+PIXEL_GRAY = 'gray'
+
+# Values of red built into the lookup table at a time, so the colors being converted stay small
+LUT_CHUNK = 16
+
+
+def frozen_array(values, dtype=np.uint8):
+    """
+    Creates a numpy array that can't be written to
+    :param values: The values of the array
+    :param dtype: The type of the array
+    :return: The read only array
+    """
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+def frozen_kernel(size):
+    """
+    Creates a read only structuring element of 1's of size by size
+    :param size: The size of the kernel
+    :return: The read only kernel
+    """
+    kernel = np.ones((size, size), dtype=np.uint8)
+    kernel.flags.writeable = False
+    return kernel
+
+
+def split_range(low, high):
+    """
+    Splits a color range that wraps around on any channel into ranges that don't
+    :param low: The (one, two, three) low values, a low above its high wraps around
+    :param high: The (one, two, three) high values
+    :return: The list of (low, high) ranges as read only arrays
+    """
+    ranges = [((), ())]
+
+    for channel_low, channel_high in zip(low, high):
+        if channel_low <= channel_high:
+            spans = [(channel_low, channel_high)]
+        else:
+            spans = [(channel_low, 255), (0, channel_high)]
+
+        ranges = [(lows + (span_low,), highs + (span_high,)) for lows, highs in ranges for span_low, span_high in spans]
+
+    return [(frozen_array(lows), frozen_array(highs)) for lows, highs in ranges]
+
+
+def get_process_stages(should_smooth, smooth_method, pixel_format):
+    """
+    Gets the stages run to process a frame into the mask
+    :param should_smooth: If the frame should be smoothed
+    :param smooth_method: How to smooth it, mask smooths after the threshold
+    :param pixel_format: The format of the frames
+    :return: The tuple of stages
+    """
+    stages = []
+
+    # Smoothing the colors of YUYV would mix its U and V together
+    if should_smooth and smooth_method != SMOOTH_MASK and pixel_format != PIXEL_YUYV:
+        stages.append(STAGE_SMOOTH)
+
+    stages.append(STAGE_THRESHOLD)
+
+    if should_smooth and smooth_method == SMOOTH_MASK:
+        stages.append(STAGE_SMOOTH)
+
+    return tuple(stages)
+
+
+def pair_bounds(low, high):
+    """
+    Gets the bounds of a YUV range for the left and right pixel of YUYV pixel pairs, which are Y0 U Y1 V
+    :param low: The (Y, U, V) low values
+    :param high: The (Y, U, V) high values
+    :return: (left low, left high, right low, right high) as read only arrays
+    """
+    return (frozen_array([low[0], low[1], 0, low[2]]), frozen_array([high[0], high[1], 255, high[2]]),
+            frozen_array([0, low[1], low[0], low[2]]), frozen_array([255, high[1], high[0], high[2]]))
+
+
+def build_lut(ranges, use_hsv):
+    """
+    Builds a table of if every 24 bit color is in any of the ranges, so a frame can be segmented with one lookup
+    :param ranges: The list of (low, high) ranges that don't wrap around
+    :param use_hsv: If the ranges are in HSV instead of BGR
+    :return: The read only table of 0 or 255, indexed by the color packed as b | g << 8 | r << 16
+    """
+    lut = np.empty((256, 256 * 256), dtype=np.uint8)
+
+    # Rows of the chunk are every green, columns are every blue, and red is filled in per chunk
+    colors = np.empty((LUT_CHUNK, 256, 256, 3), dtype=np.uint8)
+    colors[..., 0] = np.arange(256, dtype=np.uint8)
+    colors[..., 1] = np.arange(256, dtype=np.uint8).reshape(-1, 1)
+    colors = colors.reshape(LUT_CHUNK * 256, 256, 3)
+    converted = np.empty_like(colors)
+    in_range = np.empty(colors.shape[:2], dtype=np.uint8)
+
+    for red in range(0, 256, LUT_CHUNK):
+        colors.reshape(LUT_CHUNK, -1, 3)[..., 2] = np.arange(red, red + LUT_CHUNK, dtype=np.uint8).reshape(-1, 1)
+        image = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV, dst=converted) if use_hsv else colors
+        mask = lut[red:red + LUT_CHUNK].reshape(colors.shape[:2])
+        mask[:] = 0
+
+        for low, high in ranges:
+            cv2.bitwise_or(mask, cv2.inRange(image, low, high, dst=in_range), dst=mask)
+
+    lut = lut.reshape(-1)
+    lut.flags.writeable = False
+    return lut
+
+
+class VisionPlan(namedtuple('VisionPlan', ['version', 'low_range', 'high_range', 'use_hsv', 'smooth_size',
+                                           'kernel_open', 'kernel_close', 'process_stages', 'hull_stages',
+                                           'use_roi', 'roi_padding', 'roi_max_frames', 'pyramid_levels',
+                                           'coarse', 'use_flow', 'detect_interval', 'min_confidence',
+                                           'drift_tolerance', 'min_area', 'max_candidates', 'target_aspect',
+                                           'min_solidity', 'blob_engine', 'min_fill', 'extra_ranges', 'lut',
+                                           'pixel_format', 'pair_ranges', 'smooth_method', 'tile_bands'])):
+    """
+    This is an immutable snapshot of the configuration, compiled for the processor. A new plan is made
+    whenever the configuration changes, so a plan is never changed once built
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def compile(config, version):
+        """
+        Compiles the plan from the configuration
+        :param config: The VisionConfiguration to compile
+        :param version: The version of the configuration being compiled
+        :return: The plan
+        """
+        hull_stages = []
+        pixel_format = config.get_pixel_format()
+        process_stages = get_process_stages(config.get_should_smooth(), config.get_smooth_method(), pixel_format)
+
+        kernel_open = None
+        if config.get_should_open():
+            kernel_open = frozen_kernel(config.get_kernel_size_open())
+            hull_stages.append(STAGE_OPEN)
+
+        kernel_close = None
+        if config.get_should_close():
+            kernel_close = frozen_kernel(config.get_kernel_size_close())
+            hull_stages.append(STAGE_CLOSE)
+
+        # The window has to cover the kernels as well, or the morphology will clip the target
+        roi_padding = config.get_roi_padding()
+        if kernel_open is not None:
+            roi_padding += config.get_kernel_size_open()
+        if kernel_close is not None:
+            roi_padding += config.get_kernel_size_close()
+
+        low_range = frozen_array(config.get_low_range())
+        high_range = frozen_array(config.get_high_range())
+        extra_ranges = []
+        for low, high in config.get_extra_ranges():
+            extra_ranges.extend(split_range(low, high))
+
+        # Only BGR frames can be converted to HSV or looked up
+        use_hsv = config.get_should_use_hsv() and pixel_format == PIXEL_BGR
+
+        lut = None
+        if config.get_segmentation() == SEGMENT_LUT and pixel_format == PIXEL_BGR:
+            lut = build_lut([(low_range, high_range)] + extra_ranges, use_hsv)
+
+        pair_ranges = None
+        if pixel_format == PIXEL_YUYV:
+            pair_ranges = tuple(pair_bounds(low, high) for low, high in [(low_range, high_range)] + extra_ranges)
+        elif pixel_format == PIXEL_GRAY:
+            # Gray is just Y, so only the first value of each range is used
+            low_range = low_range[:1]
+            high_range = high_range[:1]
+            extra_ranges = [(low[:1], high[:1]) for low, high in extra_ranges]
+
+        plan = VisionPlan(version, low_range, high_range,
+                          use_hsv, config.get_kernel_size_smooth(), kernel_open, kernel_close,
+                          process_stages, tuple(hull_stages), config.get_should_use_roi(), roi_padding,
+                          config.get_roi_max_frames(), config.get_pyramid_levels(), None,
+                          config.get_should_use_flow(), config.get_detect_interval(),
+                          config.get_min_confidence() / 100.0, config.get_drift_tolerance(), config.get_min_area(),
+                          config.get_max_candidates(), config.get_target_aspect() / 100.0,
+                          config.get_min_solidity() / 100.0, config.get_blob_engine(), config.get_min_fill() / 100.0,
+                          tuple(extra_ranges), lut, pixel_format, pair_ranges, config.get_smooth_method(),
+                          config.get_tile_bands())
+
+        if plan.pyramid_levels > 0:
+            plan = plan._replace(coarse=plan.compile_coarse())
+
+        return plan
+
+    @property
+    def process_halo(self):
+        """
+        Gets how many rows past its edges a band of the frame has to be smoothed and thresholded with,
+        so its rows come out the same as if the whole frame was processed
+        :return: The amount of rows
+        """
+        # Every smoothing method reaches at most half its size each way
+        if STAGE_SMOOTH in self.process_stages:
+            return self.smooth_size
+
+        return 0
+
+    @property
+    def morph_halo(self):
+        """
+        Gets how many rows past its edges a band of the mask has to be opened and closed with
+        :return: The amount of rows
+        """
+        # Opening and closing each erode and dilate, reaching half the kernel each way twice
+        halo = 0
+        for kernel in (self.kernel_open, self.kernel_close):
+            if kernel is not None:
+                halo += kernel.shape[0]
+
+        return halo
+
+    def with_smoothing(self, smooth_method):
+        """
+        Gets this plan smoothing with a different method, for comparing them
+        :param smooth_method: The method to smooth with
+        :return: The plan with the smoothing replaced
+        """
+        return self._replace(smooth_method=smooth_method,
+                             process_stages=get_process_stages(True, smooth_method, self.pixel_format))
+
+    def compile_coarse(self):
+        """
+        Compiles the plan for the coarse search, with the kernels scaled down to the pyramid level
+        :return: The coarse plan
+        """
+        kernel_open = self.kernel_open
+        if kernel_open is not None:
+            kernel_open = frozen_kernel(max(kernel_open.shape[0] >> self.pyramid_levels, 1))
+
+        kernel_close = self.kernel_close
+        if kernel_close is not None:
+            kernel_close = frozen_kernel(max(kernel_close.shape[0] >> self.pyramid_levels, 1))
+
+        # Areas shrink by the square of the scale
+        return self._replace(smooth_size=max(self.smooth_size >> self.pyramid_levels, 1), kernel_open=kernel_open,
+                             kernel_close=kernel_close, use_roi=False, pyramid_levels=0, coarse=None,
+                             min_area=self.min_area >> (2 * self.pyramid_levels))
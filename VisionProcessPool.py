@@ -0,0 +1,278 @@
+import ctypes
+import logging
+import multiprocessing
+import time
+import numpy as np
+from collections import deque
+from threading import Thread, Condition
+from VisionProcessor import VisionProcessor, ProcessingContext, order_corners
+from VisionPipeline import PipelineResult
+
+'''
+This module is for processing frames on a pool of worker processes, for configurations too heavy to keep
+up with the camera on one core. Frames are copied into shared memory instead of being pickled, and the
+results are put back in the order the frames were captured.
+'''
+
+logger = logging.getLogger('VisionProcessPool')
+
+# Frame slots in shared memory for each worker, so a worker always has the next frame waiting
+SLOTS_PER_WORKER = 2
+
+# Seconds the collector waits for a result before checking if it should stop
+RESULT_TIMEOUT = 0.5
+
+# Seconds submit waits for a free slot before skipping the frame
+SUBMIT_TIMEOUT = 1.0
+
+
+def get_worker_count(workers=0):
+    """
+    Gets how many worker processes to run
+    :param workers: The amount asked for, 0 for one per core
+    :return: The amount of workers
+    """
+    if workers > 0:
+        return workers
+
+    return multiprocessing.cpu_count()
+
+
+def process_frames(config, frames, tasks, results):
+    """
+    This is run by each worker process, it finds the target in each frame slot it is given
+    :param config: The VisionConfiguration to process with, as it was when the pool started
+    :param frames: The numpy view of every frame slot in shared memory
+    :param tasks: The queue of (slot, sequence, timestamp, shape), None to stop
+    :param results: The queue to put (slot, sequence, timestamp, points, candidates, width, height) on
+    """
+    # A worker only sees every few frames, so a window from the last one it processed would be stale
+    config.set_should_use_roi(False)
+    processor = VisionProcessor(config, ProcessingContext())
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        slot, sequence, timestamp, shape = task
+        frame = frames[slot][:int(np.prod(shape))].reshape(shape)
+
+        try:
+            hull, points = processor.find_target(frame)
+
+            # The other targets are only all known on frames that searched the whole frame, not just a window
+            candidates = processor.candidates if processor.last_window is None else None
+
+            # Published from the top left going clockwise, the same as the serial loop's tracker does
+            if points is not None:
+                points = order_corners(points)
+        except Exception:
+            logger.exception('Worker failed to process frame %d', sequence)
+            points, candidates = None, []
+
+        results.put((slot, sequence, timestamp, points, candidates, shape[1], shape[0]))
+
+
+class VisionProcessPool:
+    """
+    This hands frames to worker processes in turn, each running its own VisionProcessor,
+    and publishes what they find in frame order
+    """
+
+    def __init__(self, config, publish, workers=0):
+        """
+        :param config: The VisionConfiguration to process with, changes after start aren't seen by the workers
+        :param publish: Called on the collector thread with each PipelineResult, in frame order, it can be set
+        after the pool starts as long as it's before the first frame is submitted
+        :param workers: The amount of worker processes, 0 for one per core
+        """
+        self.config = config
+        self.publish = publish
+        self.workers = get_worker_count(workers)
+        self.started = False
+        self.stopped = False
+        self.submitted = 0
+        self.completed = 0
+        self.reordered = 0
+        self.skipped = 0
+        self.error = None
+        self.__frames = None
+        self.__slot_size = 0
+        self.__free_slots = []
+        self.__order = deque()
+        self.__finished = {}
+        self.__slot_freed = Condition()
+        self.__tasks = None
+        self.__results = None
+        self.__processes = []
+        self.__collector = None
+
+    def start(self, shape, dtype=np.uint8):
+        """
+        This allocates the shared frame slots for frames of the shape and starts the workers. The workers fork
+        from the calling process, so it should be called before any other thread is started
+        :param shape: The shape of the biggest frame that will be submitted
+        :param dtype: The type of the frames
+        """
+        slots = self.workers * SLOTS_PER_WORKER
+        self.__slot_size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        # The slots are shared with the workers when they fork, so frames are only ever copied once
+        shared = multiprocessing.RawArray(ctypes.c_uint8, slots * self.__slot_size)
+        self.__frames = np.frombuffer(shared, dtype=dtype).reshape(slots, -1)
+        self.__free_slots = list(range(slots))
+        self.__tasks = multiprocessing.Queue()
+        self.__results = multiprocessing.Queue()
+
+        for i in range(self.workers):
+            process = multiprocessing.Process(target=process_frames,
+                                              args=(self.config, self.__frames, self.__tasks, self.__results))
+            process.daemon = True
+            process.start()
+            self.__processes.append(process)
+
+        self.__collector = Thread(target=self.update, args=())
+        self.__collector.daemon = True
+        self.__collector.start()
+        self.started = True
+        return self
+
+    def submit(self, frame, sequence, timestamp, timeout=SUBMIT_TIMEOUT):
+        """
+        Copies the frame into a free slot and hands it to the next worker
+        :param frame: The frame to process, it can be released as soon as this returns
+        :param sequence: The sequence number of the frame
+        :param timestamp: The capture timestamp of the frame
+        :param timeout: Seconds to wait for a free slot, None to wait until there is one
+        :return: If the frame was submitted
+        """
+        if frame.nbytes > self.__slot_size:
+            logger.warning('Frame of %s is bigger than the pool was started for', str(frame.shape))
+            self.skipped += 1
+            return False
+
+        with self.__slot_freed:
+            if timeout is not None:
+                deadline = time.time() + timeout
+
+            while len(self.__free_slots) == 0 and not self.stopped:
+                # A worker that died never gives its slots back
+                if self.error is not None:
+                    raise self.error
+
+                if timeout is None:
+                    self.__slot_freed.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.skipped += 1
+                        return False
+
+                    self.__slot_freed.wait(remaining)
+
+            if self.error is not None:
+                raise self.error
+
+            if self.stopped:
+                return False
+
+            slot = self.__free_slots.pop()
+            self.__order.append(sequence)
+            self.submitted += 1
+
+        np.copyto(self.__frames[slot][:frame.size].reshape(frame.shape), frame)
+        self.__tasks.put((slot, sequence, timestamp, frame.shape))
+        return True
+
+    def get_stats(self):
+        """
+        Gets the counters of the pool
+        :return: A dict of the workers, frames submitted, completed, skipped and in flight, and results reordered
+        """
+        with self.__slot_freed:
+            return {
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'skipped': self.skipped,
+                'in_flight': len(self.__order),
+                'reordered': self.reordered
+            }
+
+    def update(self):
+        """
+        This is called to collect the results and publish them in the order the frames were submitted
+        """
+        while not self.stopped or len(self.__order) > 0:
+            if not self.stopped and self.error is None:
+                self.__check_workers()
+
+            try:
+                result = self.__results.get(True, RESULT_TIMEOUT)
+            except Exception:
+                # Timed out, or the queue was closed
+                if self.stopped and not any(process.is_alive() for process in self.__processes):
+                    break
+
+                continue
+
+            slot, sequence = result[:2]
+            with self.__slot_freed:
+                self.__free_slots.append(slot)
+                self.__finished[sequence] = result[1:]
+
+                # Something earlier is still being worked on
+                if self.__order[0] != sequence:
+                    self.reordered += 1
+
+                ready = []
+                while len(self.__order) > 0 and self.__order[0] in self.__finished:
+                    ready.append(self.__finished.pop(self.__order.popleft()))
+
+                self.__slot_freed.notify_all()
+
+            for result in ready:
+                try:
+                    self.publish(PipelineResult(*result))
+                except Exception:
+                    logger.exception('Failed to publish frame %d', result[0])
+
+                self.completed += 1
+
+    def stop(self):
+        """
+        This stops the workers once the frames already submitted are done
+        """
+        with self.__slot_freed:
+            self.stopped = True
+            self.__slot_freed.notify_all()
+
+        if self.__tasks is not None:
+            for process in self.__processes:
+                self.__tasks.put(None)
+
+    def join(self, timeout=None):
+        """
+        Waits for the workers and the collector to finish
+        :param timeout: Seconds to wait for each of them
+        """
+        for process in self.__processes:
+            process.join(timeout)
+
+        if self.__collector is not None:
+            self.__collector.join(timeout)
+
+    def __check_workers(self):
+        # Keep an error for whoever submits frames if a worker died, its frames will never come back
+        for process in self.__processes:
+            if not process.is_alive():
+                with self.__slot_freed:
+                    if self.error is None:
+                        logger.error('Worker %d stopped with exit code %s', process.pid, str(process.exitcode))
+                        self.error = RuntimeError('Pool worker %d stopped with exit code %s' % (process.pid,
+                                                                                              process.exitcode))
+
+                    self.__slot_freed.notify_all()
+
+                return
@@ -1,7 +1,12 @@
 import cv2
 import logging
+import time
 import numpy as np
 import VisionConfiguration
+from collections import namedtuple
+from VisionPlan import STAGE_SMOOTH, STAGE_THRESHOLD, STAGE_OPEN, STAGE_CLOSE, BLOB_COMPONENTS, PIXEL_YUYV, \
+    SMOOTH_BOX, SMOOTH_GAUSSIAN, SMOOTH_MEDIAN, SMOOTH_MASK, SMOOTH_METHODS
+from VisionTiles import BandExecutor, should_tile
 
 '''
 This module is for Processing the image into an image that we can calculate where the target is.
@@ -13,6 +18,24 @@ BIGGEST_HULL_COLOR = (0, 0, 255)
 OTHER_HULL_COLOR = (255, 255, 255)
 POLY_HULL_COLOR = (255, 0, 255)
 
+# Amount of coarse candidates refined at full size when searching the pyramid
+PYRAMID_CANDIDATES = 3
+
+# How close the polygon has to follow the hull, as a fraction of the hull's perimeter
+POLY_EPSILON = .08
+
+# Blobs thinner than this can't have 4 corners
+MIN_BLOB_SIDE = 2
+
+# How much the newest frame counts towards the average cost of smoothing
+COST_WEIGHT = .1
+
+# OpenCV 2.4 doesn't have connected components, so it always traces contours
+HAS_COMPONENTS = hasattr(cv2, 'connectedComponentsWithStats')
+
+# A target found in the frame, the points are the 4 corners of its polygon
+Candidate = namedtuple('Candidate', ['points', 'hull', 'area', 'aspect', 'solidity', 'score'])
+
 
 def points_to_numpy_array(point_tuple):
     """
@@ -29,15 +52,239 @@ def points_to_numpy_array(point_tuple):
     array = array.reshape((-1, 1, 2))
     return array
 
+
+def order_corners(points):
+    """
+    Orders the 4 corners of a quad as top left, top right, bottom right, bottom left
+    :param points: The 4 (x, y) corners in any order
+    :return: The numpy array of the ordered corners as float32
+    """
+    corners = np.array(points, dtype=np.float32).reshape(4, 2)
+    center = corners.mean(axis=0)
+
+    # Image y points down, so going up in angle goes clockwise starting from the top left
+    angles = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+    return corners[np.argsort(angles)]
+
+
+def align_window(window, plan):
+    """
+    Lines the window up with the pixels of the frame format, YUYV windows have to start and end on a pixel pair
+    :param window: (x0, y0, x1, y1) of the window, or None for the whole frame
+    :param plan: The VisionPlan being processed with
+    :return: The aligned window
+    """
+    if window is None or plan.pixel_format != PIXEL_YUYV:
+        return window
+
+    x0, y0, x1, y1 = window
+    return x0 - x0 % 2, y0, x1 + x1 % 2, y1
+
+
+def find_contours(image, offset=(0, 0)):
+    """
+    Finds the outside contours of the image, whichever OpenCV version is installed.
+    OpenCV 3 returns (image, contours, hierarchy) while 2.4 and 4 return (contours, hierarchy)
+    :param image: The mask to find the contours in, older versions of OpenCV write over it
+    :param offset: (x, y) added to every point of the contours
+    :return: The list of contours
+    """
+    return cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)[-2]
+
+
+def contour_stats(contours):
+    """
+    Works out the area and bounding box of every contour at once, instead of one contour at a time
+    :param contours: The contours from findContours
+    :return: The numpy arrays of the areas, and of the (x, y, width, height) bounding boxes
+    """
+    counts = np.array([len(c) for c in contours], dtype=np.intp)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    xs = points[:, 0]
+    ys = points[:, 1]
+
+    # The point after each point, wrapping around to the start of its own contour
+    following = np.arange(1, len(points) + 1)
+    following[ends - 1] = starts
+
+    # Shoelace formula, summed per contour
+    cross = xs * ys[following] - xs[following] * ys
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2.0
+
+    x0 = np.minimum.reduceat(xs, starts)
+    y0 = np.minimum.reduceat(ys, starts)
+    rects = np.stack((x0, y0, np.maximum.reduceat(xs, starts) - x0 + 1, np.maximum.reduceat(ys, starts) - y0 + 1),
+                     axis=1)
+
+    return areas, rects
+
+
+class ProcessingContext:
+    """
+    This owns the scratch images the processor writes each stage into, so once they are allocated for
+    a resolution, processing a frame doesn't allocate any images
+    """
+
+    def __init__(self):
+        self.__buffers = {}
+
+    def get_buffer(self, name, shape, dtype=np.uint8):
+        """
+        Gets the scratch image for a stage, only allocating it the first time or if it needs to be bigger.
+        Smaller images, like a region of interest, are views into the top left of the scratch image
+        :param name: The name of the stage the image is for
+        :param shape: The shape the image needs to be
+        :param dtype: The type the image needs to be
+        :return: The scratch image, its contents are whatever the last frame left in it
+        """
+        buf = self.__buffers.get(name)
+
+        if buf is None or buf.dtype != dtype or buf.shape[2:] != shape[2:] or \
+                buf.shape[0] < shape[0] or buf.shape[1] < shape[1]:
+            buf = np.empty(shape, dtype=dtype)
+            self.__buffers[name] = buf
+
+        if buf.shape[:2] != shape[:2]:
+            return buf[:shape[0], :shape[1]]
+
+        return buf
+
+    def clear(self):
+        """
+        Frees all of the scratch images
+        """
+        self.__buffers = {}
+
+
+class RoiTracker:
+    """
+    This keeps the window around the last target found, so the next frame only has to search there
+    """
+
+    def __init__(self):
+        self.window = None
+        self.frames_in_window = 0
+        self.misses = 0
+
+    def get_window(self, shape, plan):
+        """
+        Gets the window to search in the next frame
+        :param shape: The shape of the frame
+        :param plan: The VisionPlan being processed with
+        :return: (x0, y0, x1, y1) of the window, or None to search the whole frame
+        """
+        if not plan.use_roi or self.window is None:
+            return None
+
+        # Search the whole frame every so often so we notice a better target
+        if self.frames_in_window >= plan.roi_max_frames:
+            return None
+
+        x0, y0, x1, y1 = self.window
+        height, width = shape[:2]
+        if x1 - x0 >= width and y1 - y0 >= height:
+            return None
+
+        return x0, y0, x1, y1
+
+    def update(self, points, shape, plan, used_window):
+        """
+        Moves the window to the target found in this frame
+        :param points: The corners of the target, or None if it was missed
+        :param shape: The shape of the frame
+        :param plan: The VisionPlan being processed with
+        :param used_window: If this frame was found in the window
+        """
+        if points is None:
+            # Go back to searching the whole frame
+            self.window = None
+            self.frames_in_window = 0
+            self.misses += 1
+            return
+
+        height, width = shape[:2]
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+        padding = plan.roi_padding
+
+        self.window = (max(min(xs) - padding, 0), max(min(ys) - padding, 0),
+                       min(max(xs) + padding + 1, width), min(max(ys) + padding + 1, height))
+        self.frames_in_window = self.frames_in_window + 1 if used_window else 0
+
+    def reset(self):
+        """
+        Forgets the window so the next frame is searched in full
+        """
+        self.window = None
+        self.frames_in_window = 0
+
+
 class VisionProcessor:
     """
     This is used to process the image to bring out the target clearly
     """
-    def __init__(self, config=None):
+    def __init__(self, config=None, context=None):
+        """
+        :param config: The configuration to process with
+        :param context: The ProcessingContext to reuse images from, if None every stage makes a new image.
+        With a context the returned images are only good until the next frame is processed
+        """
         if config is None:
             config = VisionConfiguration.VisionConfiguration('settings.conf')
 
         self.config = config
+        self.context = context
+        self.tracker = RoiTracker()
+
+        # Milliseconds each stage took on the last frame
+        self.timings = {}
+        self.last_window = None
+
+        # The best scored targets of the last search, best first
+        self.candidates = []
+
+        # Average milliseconds per frame of each smoothing method that has been run
+        self.smoothing_costs = {}
+
+        # Splits big frames into bands processed on their own threads, each with its own processor
+        self.__executor = None
+        self.__band_processors = []
+
+    def find_target(self, frame, config=None):
+        """
+        Finds the target in the frame, processing only the window around the last target when tracking it
+        :param frame: The image to search
+        :param config: The config file to use, if need to change
+        :return: The hull of the best candidate, The 4 corners of the target in full frame coordinates if found
+        """
+        if config is not None:
+            self.config = config
+
+        self.timings.clear()
+        start = time.time()
+        plan = self.config.get_plan()
+        window = self.tracker.get_window(frame.shape, plan)
+
+        hull, points = None, None
+        if window is not None:
+            hull, points = self.__find_in_window(frame, window, plan)
+
+        tracked = points is not None
+        if not tracked:
+            # Lost it in the window, so look at the whole frame before giving up
+            if plan.coarse is not None:
+                hull, points, window = self.__find_coarse_to_fine(frame, plan)
+            else:
+                window = None
+                hull, points = self.__find_in_window(frame, window, plan)
+
+        self.tracker.update(points, frame.shape, plan, tracked)
+        self.last_window = window
+        self.timings['total'] = (time.time() - start) * 1000.0
+
+        return hull, points
 
     def process_frame(self, frame, config=None, copy=False):
         """
@@ -49,64 +296,149 @@ class VisionProcessor:
         """
         image = frame
         if copy:
-            image = frame.copy()
+            image = self.__copy(frame, 'process_copy')
 
         if config is not None:
             self.config = config
 
-        smooth_image = self.__smooth(image)
-        range_image = self.__threshold(smooth_image)
+        return self.__process(image, self.config.get_plan())
 
-        return range_image
+    def morph_frame(self, frame, config=None):
+        """
+        Runs the open and close morphs on a processed frame, like rank_candidates does before finding the blobs
+        :param frame: The processed frame
+        :param config: The config file to use, if need to change
+        :return: The morphed image
+        """
+        if config is not None:
+            self.config = config
+
+        return self.__morph(frame, self.config.get_plan())
+
+    def __process(self, image, plan, tiled=True):
+        # Run the compiled stages, the plan has everything worked out already
+        if tiled and should_tile(image.shape[0], plan.tile_bands):
+            image = self.__run_bands(image, plan, plan.process_halo, 'tiled_process', plan.process_stages,
+                                     lambda band, rows: band.__process(rows, plan, False))
+        else:
+            for stage in plan.process_stages:
+                start = time.time()
+
+                if stage == STAGE_SMOOTH:
+                    image = self.__smooth(image, plan)
+                elif stage == STAGE_THRESHOLD:
+                    image = self.__threshold(image, plan)
 
-    def hull_frame(self, frame, config=None, draw_all_hulls=True, copy=False):
+                self.timings[stage] = (time.time() - start) * 1000.0
+
+        if STAGE_SMOOTH in plan.process_stages:
+            cost = self.smoothing_costs.get(plan.smooth_method, self.timings[STAGE_SMOOTH])
+            self.smoothing_costs[plan.smooth_method] = cost + (self.timings[STAGE_SMOOTH] - cost) * COST_WEIGHT
+
+        return image
+
+    def measure_smoothing(self, frame, repeats=10):
+        """
+        Times every smoothing method on the frame at the configured kernel size, so the quality of each can be
+        weighed against what it costs
+        :param frame: The image to smooth
+        :param repeats: How many times to run each method
+        :return: A dict of the average milliseconds per frame of each method
+        """
+        plan = self.config.get_plan()
+        costs = {}
+
+        for method in SMOOTH_METHODS:
+            method_plan = plan.with_smoothing(method)
+            if STAGE_SMOOTH not in method_plan.process_stages:
+                continue
+
+            total = 0.0
+            for i in range(repeats):
+                self.__process(frame, method_plan)
+                total += self.timings[STAGE_SMOOTH]
+
+            costs[method] = total / repeats
+
+        return costs
+
+    def hull_frame(self, frame, config=None, draw_all_hulls=True, copy=False, offset=(0, 0)):
         """
         Make the frame come together, right now, over me. (Open Morph -> Close Morph -> Fill Contour hulls)
         :param frame: The frame to convex hull
         :param config: The config file to use, if not specified, then it will use the one last given
         :param copy: If the frame should be copied
         :param draw_all_hulls: Should we draw all of the hulls
-        :return: The image, The biggest hull
+        :param offset: (x, y) added to the hulls, for when the frame is a window of a bigger one
+        :return: The image if the hulls were drawn, The biggest hull
         """
         image = frame
         if copy:
-            image = frame.copy()
+            image = self.__copy(frame, 'hull_copy')
 
         if config is not None:
             self.config = config
 
         # Perform operations to clean up image
-        open_image = self.__open(image)
-        close_image = self.__close(open_image)
-
-        if cv2.__version__ == "2.4.1":
-            contours, h = cv2.findContours(close_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        else:
-            crap, contours, h = cv2.findContours(close_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        close_image = self.__morph(image, self.config.get_plan())
+        start = time.time()
+        contours = find_contours(close_image, offset)
 
-        # Get size of image and create blacks
-        width, height = close_image.shape
-        hull_image = np.zeros((width, height, 3), dtype=np.uint8)
+        # Only make an image to draw on if we are going to draw
+        hull_image = None
+        if draw_all_hulls:
+            width, height = close_image.shape
+            hull_image = self.__buffer('hull', (width, height, 3))
+            hull_image[:] = 0
 
         # Create the hulls of the image and get the biggest hull
         biggest_hull = None
+        biggest_area = 0
         for c in contours:
             hull = cv2.convexHull(c)
+            area = cv2.contourArea(hull)
 
-            if biggest_hull is None or cv2.contourArea(biggest_hull) < cv2.contourArea(hull):
+            if biggest_hull is None or biggest_area < area:
                 # Set the largest hull
                 biggest_hull = hull
+                biggest_area = area
 
             if draw_all_hulls:
                 # Draw the hull if we want all of the hulls
-                hull_image = cv2.drawContours(hull_image, [hull], -1, OTHER_HULL_COLOR, -1)
+                hull_image = cv2.drawContours(hull_image, [hull], -1, OTHER_HULL_COLOR, -1,
+                                              offset=(-offset[0], -offset[1]))
 
         # Draw the largest hull if we aren't drawing all of the hulls and it isn't None
         if biggest_hull is not None and draw_all_hulls:
-            hull_image = cv2.drawContours(hull_image, [biggest_hull], -1, BIGGEST_HULL_COLOR, -1)
+            hull_image = cv2.drawContours(hull_image, [biggest_hull], -1, BIGGEST_HULL_COLOR, -1,
+                                          offset=(-offset[0], -offset[1]))
+
+        self.timings['contours'] = (time.time() - start) * 1000.0
 
         return hull_image, biggest_hull
 
+    def rank_candidates(self, frame, config=None, offset=(0, 0)):
+        """
+        Scores every contour big enough to be the target and keeps the best 4 sided ones
+        (Open Morph -> Close Morph -> Contours -> Score)
+        :param frame: The processed frame to find the targets in
+        :param config: The config file to use, if not specified, then it will use the one last given
+        :param offset: (x, y) added to the candidates, for when the frame is a window of a bigger one
+        :return: The list of Candidates, best first
+        """
+        if config is not None:
+            self.config = config
+
+        plan = self.config.get_plan()
+        close_image = self.__morph(frame, plan)
+        areas, rects, get_contour = self.__find_blobs(close_image, plan, offset)
+
+        start = time.time()
+        candidates = self.__rank(areas, rects, get_contour, plan)
+        self.timings['candidates'] = (time.time() - start) * 1000.0
+
+        return candidates
+
     def get_polygon_from_hull(self, hull, image_to_draw_on=None):
         """
         Gets the 4 sided polygon from the hull
@@ -120,7 +452,7 @@ class VisionProcessor:
 
         # Get Poly
         arc_length = cv2.arcLength(hull, True)
-        approx = cv2.approxPolyDP(hull, arc_length * .08, True)
+        approx = cv2.approxPolyDP(hull, arc_length * POLY_EPSILON, True)
 
         # We don't are unless it's a rect
         if len(approx) != 4:
@@ -134,35 +466,273 @@ class VisionProcessor:
 
         return image_to_draw_on, poly
 
-    def __open(self, image):
-        if not self.config.get_should_open():
-            return image
+    def __morph(self, image, plan, tiled=True):
+        # Runs the open and close stages of the plan
+        if tiled and len(plan.hull_stages) > 0 and should_tile(image.shape[0], plan.tile_bands):
+            return self.__run_bands(image, plan, plan.morph_halo, 'tiled_morph', plan.hull_stages,
+                                    lambda band, rows: band.__morph(rows, plan, False))
+
+        for stage in plan.hull_stages:
+            start = time.time()
+
+            if stage == STAGE_OPEN:
+                image = self.__open(image, plan)
+            elif stage == STAGE_CLOSE:
+                image = self.__close(image, plan)
+
+            self.timings[stage] = (time.time() - start) * 1000.0
+
+        return image
+
+    def __run_bands(self, image, plan, halo, name, stages, process):
+        # Processes each band of the image on its own processor and thread, then stitches the bands together
+        if self.__executor is None or self.__executor.bands != plan.tile_bands:
+            if self.__executor is not None:
+                self.__executor.close()
+
+            self.__executor = BandExecutor(plan.tile_bands)
+            self.__band_processors = []
+            for i in range(plan.tile_bands):
+                context = ProcessingContext() if self.context is not None else None
+                self.__band_processors.append(VisionProcessor(self.config, context))
+
+        start = time.time()
+        output = self.__buffer(name, image.shape[:2])
+        functions = [lambda rows, band=band: process(band, rows) for band in self.__band_processors]
+        self.__executor.run(image, output, halo, functions)
+
+        # The bands run side by side, so each stage took as long as its slowest band
+        for stage in stages:
+            self.timings[stage] = max(band.timings.get(stage, 0.0) for band in self.__band_processors)
+
+        self.timings[name] = (time.time() - start) * 1000.0
+        return output
+
+    def __find_blobs(self, image, plan, offset):
+        # The area and bounding box of every blob, and a function to get the contour of one of them
+        start = time.time()
+
+        if plan.blob_engine == BLOB_COMPONENTS and HAS_COMPONENTS:
+            # Labels and measures every blob in C, the contours are only traced for the blobs asked for
+            labels = self.__buffer('labels', image.shape, np.int32)
+            count, labels, stats, centroids = cv2.connectedComponentsWithStats(image, labels=labels, connectivity=8,
+                                                                               ltype=cv2.CV_32S)
+            self.timings['components'] = (time.time() - start) * 1000.0
+
+            # Label 0 is the background
+            areas = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)
+            rects = stats[1:, :cv2.CC_STAT_AREA]
+
+            def get_contour(i):
+                x, y, w, h = rects[i]
+                mask = (labels[y:y + h, x:x + w] == i + 1).view(np.uint8)
+                return max(find_contours(mask, (x + offset[0], y + offset[1])), key=len)
+
+            return areas, rects, get_contour
+
+        contours = find_contours(image, offset)
+        self.timings['contours'] = (time.time() - start) * 1000.0
+
+        if len(contours) == 0:
+            return np.empty(0), np.empty((0, 4), dtype=np.int64), None
+
+        areas, rects = contour_stats(contours)
+        return areas, rects, contours.__getitem__
+
+    def __find_coarse_to_fine(self, frame, plan):
+        # Find candidates on a shrunk frame, then refine each candidate's window at full size
+        start = time.time()
+        scale = 1 << plan.pyramid_levels
+        height, width = frame.shape[:2]
+
+        if plan.pixel_format == PIXEL_YUYV:
+            # Shrink whole Y0 U Y1 V pairs so the U and V stay on their own channels
+            small_size = (width // 2 // scale, height // scale)
+            small = cv2.resize(frame.reshape(height, width // 2, 4), small_size,
+                               dst=self.__buffer('pyramid', small_size[::-1] + (4,)), interpolation=cv2.INTER_AREA)
+            small = small.reshape(small_size[1], small_size[0] * 2, 2)
+        else:
+            small_size = (width // scale, height // scale)
+            small = cv2.resize(frame, small_size, dst=self.__buffer('pyramid', small_size[::-1] + frame.shape[2:]),
+                               interpolation=cv2.INTER_AREA)
 
-        # Only open image if needed
-        open_image = cv2.morphologyEx(image, cv2.MORPH_OPEN, self.config.get_kernel_open())
-        return open_image
+        coarse_image = self.__morph(self.__process(small, plan.coarse), plan.coarse)
+        areas, rects, get_contour = self.__find_blobs(coarse_image, plan.coarse, (0, 0))
+
+        rects = rects[areas >= plan.coarse.min_area]
+        rects = rects[np.argsort(-rects[:, 2] * rects[:, 3], kind='mergesort')]
+
+        self.timings['coarse'] = (time.time() - start) * 1000.0
+
+        # The padding covers the kernels and the pixels lost to shrinking
+        padding = plan.roi_padding + scale
+        for x, y, w, h in rects[:PYRAMID_CANDIDATES]:
+            window = (max(x * scale - padding, 0), max(y * scale - padding, 0),
+                      min((x + w) * scale + padding, width), min((y + h) * scale + padding, height))
+            hull, points = self.__find_in_window(frame, window, plan)
+
+            if points is not None:
+                return hull, points, window
+
+        return None, None, None
+
+    def __find_in_window(self, frame, window, plan):
+        # Runs process -> hull -> polygon on the window of the frame, or all of it if window is None
+        if window is None:
+            image = frame
+            offset = (0, 0)
+        else:
+            x0, y0, x1, y1 = align_window(window, plan)
+            image = frame[y0:y1, x0:x1]
+            offset = (x0, y0)
+
+        processed = self.__process(image, plan)
+        self.candidates = self.rank_candidates(processed, None, offset)
+
+        if len(self.candidates) == 0:
+            return None, None
+
+        best = self.candidates[0]
+        return best.hull, best.points
 
-    def __close(self, image):
-        if not self.config.get_should_close():
-            return image
+    def __rank(self, areas, rects, get_contour, plan):
+        # Filter on the stats of every blob at once, so only the few left get a contour, hull and polygon
+        widths = rects[:, 2]
+        heights = rects[:, 3]
+        bounds = widths * heights
+        survivors = np.flatnonzero((areas >= max(plan.min_area, 1)) & (widths >= MIN_BLOB_SIDE) &
+                                   (heights >= MIN_BLOB_SIDE) & (areas >= bounds * plan.min_fill))
 
-        # Only close image if needed
-        close_image = cv2.morphologyEx(image, cv2.MORPH_CLOSE, self.config.get_kernel_close())
+        # A polygon is never bigger than its bounding box, so go biggest box first and stop once no box can win
+        order = survivors[np.argsort(-bounds[survivors], kind='mergesort')]
+
+        candidates = []
+        for i in order:
+            if len(candidates) >= plan.max_candidates and bounds[i] <= candidates[-1].score:
+                break
+
+            contour = get_contour(i)
+            hull = cv2.convexHull(contour)
+            hull_area = cv2.contourArea(hull)
+
+            # Measure both as polygons, the components engine's areas count pixels and can be bigger than the hull
+            solidity = cv2.contourArea(contour) / hull_area if hull_area > 0 else 0.0
+
+            if solidity < plan.min_solidity:
+                continue
+
+            approx = cv2.approxPolyDP(hull, cv2.arcLength(hull, True) * POLY_EPSILON, True)
+            if len(approx) != 4:
+                continue
+
+            x, y, w, h = rects[i]
+            aspect = float(w) / h
+
+            # Score on the area of the polygon, so a hull the quad fits badly scores lower
+            score = cv2.contourArea(approx)
+            if plan.target_aspect > 0:
+                match = aspect / plan.target_aspect
+                score *= min(match, 1.0 / match)
+
+            candidates.append(Candidate(tuple(approx[:, 0]), hull, areas[i], aspect, solidity, score))
+            candidates.sort(key=lambda candidate: candidate.score, reverse=True)
+            del candidates[plan.max_candidates:]
+
+        return candidates
+
+    def __open(self, image, plan):
+        open_image = cv2.morphologyEx(image, cv2.MORPH_OPEN, plan.kernel_open,
+                                      dst=self.__buffer('open', image.shape, image.dtype))
+        return open_image
+
+    def __close(self, image, plan):
+        close_image = cv2.morphologyEx(image, cv2.MORPH_CLOSE, plan.kernel_close,
+                                       dst=self.__buffer('close', image.shape, image.dtype))
         return close_image
 
-    def __threshold(self, image):
+    def __threshold(self, image, plan):
+        if plan.lut is not None:
+            return self.__lookup(image, plan)
+
+        if plan.pixel_format == PIXEL_YUYV:
+            return self.__threshold_pairs(image, plan)
+
         # If we should use HSV, convert it here
-        if self.config.get_should_use_hsv():
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        if plan.use_hsv:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self.__buffer('hsv', image.shape))
 
         # For now just use a color range
-        range_image = cv2.inRange(image, self.config.get_low_range(), self.config.get_high_range())
+        range_image = cv2.inRange(image, plan.low_range, plan.high_range, dst=self.__buffer('mask', image.shape[:2]))
+
+        for low, high in plan.extra_ranges:
+            extra_image = cv2.inRange(image, low, high, dst=self.__buffer('extra_mask', image.shape[:2]))
+            range_image = cv2.bitwise_or(range_image, extra_image, dst=range_image)
+
         return range_image
 
-    def __smooth(self, image):
-        if not self.config.get_should_smooth():
-            return image
+    def __threshold_pairs(self, image, plan):
+        # Each pair of YUYV pixels is Y0 U Y1 V, so threshold the left and right pixel of every pair with
+        # the U and V they share, then interleave them back into the mask without converting any colors
+        height, width = image.shape[:2]
+        pairs = image.reshape(height, width // 2, 4)
+        left = self.__buffer('left_mask', pairs.shape[:2])
+        right = self.__buffer('right_mask', pairs.shape[:2])
+
+        for i, (left_low, left_high, right_low, right_high) in enumerate(plan.pair_ranges):
+            if i == 0:
+                cv2.inRange(pairs, left_low, left_high, dst=left)
+                cv2.inRange(pairs, right_low, right_high, dst=right)
+            else:
+                extra_image = self.__buffer('extra_mask', pairs.shape[:2])
+                cv2.bitwise_or(left, cv2.inRange(pairs, left_low, left_high, dst=extra_image), dst=left)
+                cv2.bitwise_or(right, cv2.inRange(pairs, right_low, right_high, dst=extra_image), dst=right)
+
+        range_image = self.__buffer('pair_mask', (height * width, 1)).reshape(height, width)
+        cv2.merge((left, right), range_image.reshape(height, width // 2, 2))
+        return range_image
 
-        # Only smooth image if needed
-        smooth_image = cv2.bilateralFilter(image, self.config.get_kernel_size_smooth(), 150, 150)
-        return smooth_image
+    def __lookup(self, image, plan):
+        # Pack each pixel into b | g << 8 | r << 16 and look up if it's in range, the table already has the
+        # HSV conversion and every range in it. The scratch images are asked for flat so they are contiguous
+        height, width = image.shape[:2]
+        packed = self.__buffer('packed', (height * width, 1), np.uint32).reshape(height, width)
+        cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=packed.view(np.uint8).reshape(height, width, 4))
+
+        # Drop the alpha byte
+        index = np.bitwise_and(packed, 0xFFFFFF, out=packed)
+        range_image = self.__buffer('lut_mask', (height * width, 1)).reshape(height, width)
+        return np.take(plan.lut, index, out=range_image, mode='clip')
+
+    def __smooth(self, image, plan):
+        # Gaussian and median kernels have to be odd
+        size = plan.smooth_size
+        odd_size = size | 1
+
+        if plan.smooth_method == SMOOTH_MASK:
+            return cv2.medianBlur(image, odd_size, dst=self.__buffer('smooth_mask', image.shape, image.dtype))
+
+        smooth_image = self.__buffer('smooth', image.shape, image.dtype)
+        if plan.smooth_method == SMOOTH_BOX:
+            return cv2.blur(image, (size, size), dst=smooth_image)
+        elif plan.smooth_method == SMOOTH_GAUSSIAN:
+            return cv2.GaussianBlur(image, (odd_size, odd_size), 0, dst=smooth_image)
+        elif plan.smooth_method == SMOOTH_MEDIAN:
+            return cv2.medianBlur(image, odd_size, dst=smooth_image)
+
+        return cv2.bilateralFilter(image, size, 150, 150, dst=smooth_image)
+
+    def __buffer(self, name, shape, dtype=np.uint8):
+        # The scratch image for the stage, or a new image without a context
+        if self.context is None:
+            return np.empty(shape, dtype=dtype)
+
+        return self.context.get_buffer(name, shape, dtype)
+
+    def __copy(self, image, name):
+        # Copies the image into scratch if we have a context
+        if self.context is None:
+            return image.copy()
+
+        copy = self.context.get_buffer(name, image.shape, image.dtype)
+        np.copyto(copy, image)
+        return copy
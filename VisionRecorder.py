@@ -0,0 +1,258 @@
+import logging
+import os
+import numpy as np
+
+'''
+This module is for recording raw frames to an append only, memory mapped log file, and reading them back.
+
+The log is laid out as a header, a fixed size index with an entry per frame, then the frames. Each frame
+is stored as a frame header followed by the raw pixels, so any frame can be found through the index
+without reading the ones before it.
+'''
+
+logger = logging.getLogger('VisionRecorder')
+
+LOG_EXTENSION = '.pvlog'
+LOG_MAGIC = b'PVLOG001'
+LOG_VERSION = 1
+
+# Frames are aligned so their pixels can be viewed straight out of the map
+FRAME_ALIGNMENT = 64
+
+DEFAULT_MAX_FRAMES = 4500
+DEFAULT_FRAME_SHAPE = (480, 640, 3)
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('index_capacity', '<u4'),
+    ('count', '<u4'),
+    ('reserved', '<u4'),
+    ('data_offset', '<u8'),
+    ('write_offset', '<u8'),
+    ('capacity', '<u8'),
+    ('padding', 'V16')
+])
+
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('sequence', '<u8'),
+    ('timestamp', '<f8'),
+    ('height', '<u4'),
+    ('width', '<u4'),
+    ('channels', '<u4'),
+    ('padding', 'V4')
+])
+
+FRAME_HEADER_DTYPE = np.dtype([
+    ('sequence', '<u8'),
+    ('timestamp', '<f8'),
+    ('height', '<u4'),
+    ('width', '<u4'),
+    ('channels', '<u4'),
+    ('nbytes', '<u4'),
+    ('padding', 'V32')
+])
+
+
+def align(offset):
+    """
+    Rounds the offset up to the frame alignment
+    :param offset: The offset in bytes
+    :return: The aligned offset
+    """
+    return (offset + FRAME_ALIGNMENT - 1) // FRAME_ALIGNMENT * FRAME_ALIGNMENT
+
+
+def get_record_size(shape):
+    """
+    Gets how many bytes a frame takes up in the log
+    :param shape: The shape of the uint8 frame
+    :return: The size of the header and pixels, aligned
+    """
+    return align(FRAME_HEADER_DTYPE.itemsize + int(np.prod(shape)))
+
+
+def get_frame_shape(entry):
+    """
+    Gets the numpy shape of a frame from its index entry or frame header
+    :param entry: The index entry or frame header
+    :return: The shape of the frame
+    """
+    if entry['channels'] > 1:
+        return int(entry['height']), int(entry['width']), int(entry['channels'])
+
+    return int(entry['height']), int(entry['width'])
+
+
+class VisionRecordReader:
+    """
+    This reads frames back out of a frame log without decoding the others
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__map = np.memmap(path, dtype=np.uint8, mode='r')
+        self.__header = self.__map[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+
+        if self.__header['magic'] != LOG_MAGIC:
+            raise IOError('%s is not a frame log' % path)
+
+        index_end = HEADER_DTYPE.itemsize + INDEX_DTYPE.itemsize * int(self.__header['index_capacity'])
+        self.__index = self.__map[HEADER_DTYPE.itemsize:index_end].view(INDEX_DTYPE)
+
+    def __len__(self):
+        return int(self.__header['count'])
+
+    def get_index(self):
+        """
+        Gets the index entries of the frames written so far
+        :return: The numpy array of index entries
+        """
+        return self.__index[:len(self)]
+
+    def read(self, k):
+        """
+        Reads frame k straight out of the map without copying it
+        :param k: The number of the frame in the log
+        :return: (sequence, timestamp, frame)
+        """
+        if k < 0 or k >= len(self):
+            raise IndexError('Frame %d is not in the log' % k)
+
+        entry = self.__index[k]
+        start = int(entry['offset']) + FRAME_HEADER_DTYPE.itemsize
+        shape = get_frame_shape(entry)
+        frame = self.__map[start:start + int(np.prod(shape))].reshape(shape)
+
+        return int(entry['sequence']), float(entry['timestamp']), frame
+
+    def close(self):
+        """
+        Closes the log
+        """
+        del self.__index
+        del self.__header
+        del self.__map
+
+
+class VisionRecorder:
+    """
+    This appends raw frames to a preallocated, memory mapped frame log
+    """
+
+    def __init__(self, path, max_frames=DEFAULT_MAX_FRAMES, frame_shape=DEFAULT_FRAME_SHAPE):
+        self.path = path
+
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            # Carry on from the end of the existing log
+            self.__map = np.memmap(path, dtype=np.uint8, mode='r+')
+            self.__header = self.__map[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+
+            if self.__header[0]['magic'] != LOG_MAGIC:
+                raise IOError('%s is not a frame log' % path)
+
+            logger.info('Appending to %s after %d frames', path, self.__header[0]['count'])
+        else:
+            index_size = INDEX_DTYPE.itemsize * max_frames
+            data_offset = align(HEADER_DTYPE.itemsize + index_size)
+            capacity = data_offset + get_record_size(frame_shape) * max_frames
+
+            # Truncate makes a sparse file, so the space is reserved without writing it all
+            with open(path, 'wb') as log_file:
+                log_file.truncate(capacity)
+
+            self.__map = np.memmap(path, dtype=np.uint8, mode='r+')
+            self.__header = self.__map[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+            self.__header[0]['magic'] = LOG_MAGIC
+            self.__header[0]['version'] = LOG_VERSION
+            self.__header[0]['index_capacity'] = max_frames
+            self.__header[0]['count'] = 0
+            self.__header[0]['data_offset'] = data_offset
+            self.__header[0]['write_offset'] = data_offset
+            self.__header[0]['capacity'] = capacity
+
+        index_end = HEADER_DTYPE.itemsize + INDEX_DTYPE.itemsize * int(self.__header[0]['index_capacity'])
+        self.__index = self.__map[HEADER_DTYPE.itemsize:index_end].view(INDEX_DTYPE)
+        self.full = False
+
+    def get_count(self):
+        """
+        Gets how many frames are in the log, read from the index
+        :return: The amount of frames
+        """
+        return int(self.__header[0]['count'])
+
+    def get_last_sequence(self):
+        """
+        Gets the sequence number of the last frame in the log
+        :return: The sequence number, or -1 if the log is empty
+        """
+        count = self.get_count()
+        if count == 0:
+            return -1
+
+        return int(self.__index[count - 1]['sequence'])
+
+    def append(self, frame, sequence, timestamp):
+        """
+        Appends a frame to the end of the log
+        :param frame: The uint8 frame to record
+        :param sequence: The sequence number of the frame
+        :param timestamp: The capture timestamp of the frame
+        :return: If the frame was recorded, False if the log is full
+        """
+        header = self.__header[0]
+        count = int(header['count'])
+        offset = int(header['write_offset'])
+        record_size = get_record_size(frame.shape)
+
+        if count >= int(header['index_capacity']) or offset + record_size > int(header['capacity']):
+            if not self.full:
+                logger.warning('Frame log %s is full after %d frames', self.path, count)
+                self.full = True
+
+            return False
+
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim > 2 else 1
+
+        # Write the frame header and pixels
+        frame_header = self.__map[offset:offset + FRAME_HEADER_DTYPE.itemsize].view(FRAME_HEADER_DTYPE)
+        frame_header['sequence'] = sequence
+        frame_header['timestamp'] = timestamp
+        frame_header['height'] = height
+        frame_header['width'] = width
+        frame_header['channels'] = channels
+        frame_header['nbytes'] = frame.nbytes
+
+        start = offset + FRAME_HEADER_DTYPE.itemsize
+        np.copyto(self.__map[start:start + frame.nbytes].reshape(frame.shape), frame)
+
+        # Then the index entry, and only then count it so readers never see half a frame
+        entry = self.__index[count:count + 1]
+        entry['offset'] = offset
+        entry['sequence'] = sequence
+        entry['timestamp'] = timestamp
+        entry['height'] = height
+        entry['width'] = width
+        entry['channels'] = channels
+
+        self.__header['write_offset'] = offset + record_size
+        self.__header['count'] = count + 1
+        return True
+
+    def flush(self):
+        """
+        Flushes the written frames to disk
+        """
+        self.__map.flush()
+
+    def close(self):
+        """
+        Flushes and closes the log
+        """
+        self.flush()
+        del self.__index
+        del self.__header
+        del self.__map
@@ -2,7 +2,8 @@ import SocketServer
 import VisionStream
 import threading
 
-frame_grabber = None
+# The FrameSource images are served from
+frame_source = None
 
 
 class VisionServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
@@ -15,5 +16,5 @@ class VisionHandler(SocketServer.BaseRequestHandler):
     """
     def handle(self):
         # Dispatches a new thread to stream images to the client
-        handler = VisionStream.VisionStream(self.request, frame_grabber)
+        handler = VisionStream.VisionStream(self.request, frame_source)
         handler.start()
@@ -0,0 +1,160 @@
+import cv2
+import logging
+import numpy as np
+from collections import deque
+from threading import Thread, Condition
+
+'''
+This module is for writing snapshots to disk without stalling the frame grabber.
+'''
+
+logger = logging.getLogger('VisionSnapshotWriter')
+
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_FORMAT = 'jpg'
+DEFAULT_QUALITY = 90
+
+
+def get_encode_params(image_format, quality):
+    """
+    Gets the OpenCV encode parameters for the format and quality
+    :param image_format: jpg or png
+    :param quality: The quality from 0 to 100
+    :return: The parameter list for imwrite/imencode
+    """
+    if image_format == 'png':
+        # PNG takes a compression level of 0-9, so high quality means less compression
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(round((100 - quality) * 9 / 100.0))]
+
+    return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+
+
+class VisionSnapshotWriter:
+    """
+    This encodes and writes snapshots in a separate thread with a bounded queue
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, drop_policy=DROP_OLDEST, image_format=DEFAULT_FORMAT,
+                 quality=DEFAULT_QUALITY):
+        self.queue_size = max(queue_size, 1)
+        self.drop_policy = drop_policy
+        self.image_format = image_format
+        self.quality = quality
+        self.stopped = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.__queue = deque()
+        self.__free_buffers = []
+        self.__has_work = Condition()
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates a snapshot writer from the snapshot section of the configuration
+        :param config: The VisionConfiguration to use
+        :return: The snapshot writer
+        """
+        return VisionSnapshotWriter(config.get_snapshot_queue_size(), config.get_snapshot_drop_policy(),
+                                    config.get_snapshot_format(), config.get_snapshot_quality())
+
+    def start(self):
+        """
+        This starts the snapshot writer thread
+        """
+        Thread(target=self.update, args=()).start()
+        return self
+
+    def get_extension(self):
+        """
+        Gets the file extension snapshots are written with
+        :return: The extension including the dot
+        """
+        return '.' + self.image_format
+
+    def submit(self, frame, path):
+        """
+        Queues a copy of the frame to be written, never blocks on the disk
+        :param frame: The frame to save
+        :param path: The path to write it to
+        :return: If the frame was queued
+        """
+        with self.__has_work:
+            if self.stopped:
+                return False
+
+            if len(self.__queue) >= self.queue_size:
+                self.dropped += 1
+
+                if self.drop_policy == DROP_NEWEST:
+                    return False
+
+                # Throw away the oldest snapshot and reuse its buffer
+                old_buffer, old_path = self.__queue.popleft()
+                self.__free_buffers.append(old_buffer)
+
+            buf = self.__get_buffer(frame)
+            np.copyto(buf, frame)
+            self.__queue.append((buf, path))
+            self.__has_work.notify()
+
+        return True
+
+    def get_stats(self):
+        """
+        Gets the counters of the snapshot writer
+        :return: A dict of the snapshots written, dropped, failed and waiting
+        """
+        with self.__has_work:
+            return {
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'pending': len(self.__queue)
+            }
+
+    def update(self):
+        """
+        This is called to write the queued snapshots
+        """
+        params = get_encode_params(self.image_format, self.quality)
+
+        while True:
+            with self.__has_work:
+                while len(self.__queue) == 0 and not self.stopped:
+                    self.__has_work.wait()
+
+                # Finish writing what is queued before stopping
+                if len(self.__queue) == 0:
+                    break
+
+                buf, path = self.__queue.popleft()
+
+            if cv2.imwrite(path, buf, params):
+                self.written += 1
+            else:
+                self.failed += 1
+                logger.warning('Failed to write snapshot %s', path)
+
+            with self.__has_work:
+                self.__free_buffers.append(buf)
+
+    def stop(self):
+        """
+        This stops the snapshot writer once the queued snapshots are written
+        """
+        with self.__has_work:
+            self.stopped = True
+            self.__has_work.notify_all()
+
+    def __get_buffer(self, frame):
+        # Reuse a buffer from a written or dropped snapshot when the size matches
+        while len(self.__free_buffers) > 0:
+            buf = self.__free_buffers.pop()
+            if buf.shape == frame.shape and buf.dtype == frame.dtype:
+                return buf
+
+        return np.empty_like(frame)
@@ -5,9 +5,9 @@ import struct
 import sys
 
 class VisionStream:
-    def __init__(self, socket, frame_grabber):
+    def __init__(self, socket, frame_source):
         self.socket = socket
-        self.frame_grabber = frame_grabber
+        self.frame_source = frame_source
 
     def start(self):
         """
@@ -22,7 +22,7 @@ class VisionStream:
                 command = ord(raw_string)
                 if command == 1:
                     # Send the image to him
-                    ret, image_bytes = cv2.imencode('.jpg', self.frame_grabber.read())
+                    ret, image_bytes = cv2.imencode('.jpg', self.frame_source.read())
                     if not ret:
                         # Failed to encode image, send empty string
                         self.socket.send(struct.pack('i', int(len(0))))
@@ -1,100 +1,286 @@
-from networktables import NetworkTable
+import time
+from collections import deque
+from threading import Lock
+from VisionTableBackend import NetworkTablesBackend
 
 ip = "roboRIO-3189-FRC.local"
 
 network_log_file = 'net.log'
 
-NetworkTable.setClientMode()
-NetworkTable.setIPAddress(ip)
-NetworkTable.initialize()
-
-POINT_ONE_X = 'onex'
-POINT_ONE_Y = 'oney'
-POINT_TWO_X = 'twox'
-POINT_TWO_Y = 'twoy'
-POINT_THREE_X = 'threex'
-POINT_THREE_Y = 'threey'
-POINT_FOUR_X = 'fourx'
-POINT_FOUR_Y = 'foury'
+# Where the tables come from, the robot's network tables unless another backend is set before the first table
+backend = None
 
 SHOULD_SHUTDOWN = 'shutdown'
 EXCEPTION_THROWN = 'exception'
 IS_ONLINE = 'online'
 TAKE_SNAPSHOT = 'snapshot'
 LOOP_AMOUNT = 'loops'
+TARGET_COUNT = 'targets'
+TARGET_PREFIX = 'target'
+HAS_POSE = 'pose'
+DISTANCE = 'distance'
+YAW = 'yaw'
+POSITION_X = 'x'
+POSITION_Y = 'y'
+DETECTION = 'detection'
+
+# The target is published as one number array, so its corners always come from the same frame. It replaces the
+# onex, oney ... foury keys, the robot reads it as:
+#   [0] valid, 1 if the target was found and 0 if not, then the array ends here
+#   [1] sequence number of the frame
+#   [2] time the frame was captured, in seconds since the epoch
+#   [3:11] x, y of the 4 corners from the top left going clockwise, normalized to the frame's width and height
+DETECTION_VALID = 0
+DETECTION_SEQUENCE = 1
+DETECTION_TIMESTAMP = 2
+DETECTION_CORNERS = 3
+
+# Keys the robot writes to control the vision, they are listened to instead of read every frame
+CONTROL_KEYS = (SHOULD_SHUTDOWN, TAKE_SNAPSHOT)
+
+
+def set_backend(table_backend):
+    """
+    Sets where the tables come from, like a FakeBackend or RemoteBackend to run without the robot
+    :param table_backend: The backend, None to go back to the robot's network tables
+    """
+    global backend
+    backend = table_backend
+
+
+def get_backend():
+    """
+    Gets where the tables come from, connecting to the robot's network tables the first time if none was set
+    :return: The backend
+    """
+    global backend
+    if backend is None:
+        backend = NetworkTablesBackend(ip)
+
+    return backend
 
 
 class ConnectionListener:
+    def __init__(self, on_connect=None):
+        self.on_connect = on_connect
+
     def connected(self, table):
         with file(network_log_file, 'a') as f:
             f.write('Connected to network table.\n')
 
+        if self.on_connect is not None:
+            self.on_connect()
+
     def disconnected(self, table):
         with file(network_log_file, 'a') as f:
             f.write('Disconnected from network table.\n')
 
 
+class ControlListener:
+    """
+    This is told by the network table whenever a control key changes. It only appends to a deque and sets a
+    flag, which are safe to share without a lock, so the network table thread never waits on the vision
+    """
+
+    def __init__(self):
+        self.commands = deque()
+        self.flags = {}
+
+    def __call__(self, source, key, value, is_new):
+        self.flags[key] = value
+        self.commands.append((key, value))
+
+    # Older network tables call listeners through valueChanged
+    valueChanged = __call__
+
+
 class VisionTable:
-    def __init__(self, table_name):
-        self.table = NetworkTable.getTable(table_name)
-        self.table.addConnectionListener(ConnectionListener())
-
-    def send_points(self, points):
-        for i in xrange(0, 4):
-            self.send_point(i, points[i])
-
-    def send_point(self, index, point):
-        """
-        Sends the points to the Vision Table
-        """
-        if index == 0:
-            self.table.putNumber(POINT_ONE_X, point[0])
-            self.table.putNumber(POINT_ONE_Y, point[1])
-        elif index == 1:
-            self.table.putNumber(POINT_TWO_X, point[0])
-            self.table.putNumber(POINT_TWO_Y, point[1])
-        elif index == 2:
-            self.table.putNumber(POINT_THREE_X, point[0])
-            self.table.putNumber(POINT_THREE_Y, point[1])
-        elif index == 3:
-            self.table.putNumber(POINT_FOUR_X, point[0])
-            self.table.putNumber(POINT_FOUR_Y, point[1])
+    def __init__(self, table_name, publish_rate=0):
+        """
+        :param table_name: The name of the network table
+        :param publish_rate: Most detections to publish a second, 0 to publish every one
+        """
+        self.table = get_backend().get_table(table_name)
+        self.publish_interval = 1.0 / publish_rate if publish_rate > 0 else 0.0
+        self.published = 0
+        self.suppressed = 0
+        self.__sent = {}
+        self.__pending = None
+        self.__last_publish = 0.0
+        self.__publish_lock = Lock()
+        self.__acknowledgements = deque()
+        self.__control = ControlListener()
+        self.table.addConnectionListener(ConnectionListener(self.forget_sent))
+
+        for key in CONTROL_KEYS:
+            self.subscribe(key)
+
+    def subscribe(self, key):
+        """
+        Listens for changes to a control key, they show up in take_commands. Its value when subscribing
+        is sent straight away, so a command given before the vision started isn't missed
+        :param key: The key to listen to
+        """
+        self.table.addTableListener(self.__control, True, key)
+
+    def has_commands(self):
+        """
+        Gets if any control key changed since the commands were last taken, without touching the table
+        :return: If there are commands waiting
+        """
+        return len(self.__control.commands) > 0
+
+    def take_commands(self):
+        """
+        Takes every control key change in the order they came
+        :return: The list of (key, value)
+        """
+        commands = []
+        while len(self.__control.commands) > 0:
+            commands.append(self.__control.commands.popleft())
+
+        return commands
+
+    def acknowledge(self, key, value):
+        """
+        Writes a control key back once its command is handled, on the next flush so the caller doesn't wait
+        :param key: The control key
+        :param value: The value to set it back to
+        """
+        self.__control.flags[key] = value
+        self.__acknowledgements.append((key, value))
+
+    def publish_detection(self, sequence, timestamp, points, candidates=None, pose=None):
+        """
+        Publishes what was found in a frame, the corners go in one array with the sequence, timestamp and if
+        they are valid so the robot never sees corners from two different frames. When detections come faster
+        than the publish rate the latest one waits for flush
+        :param sequence: The sequence number of the frame
+        :param timestamp: When the frame was captured
+        :param points: The normalized 4 corners of the target, None if it wasn't found
+        :param candidates: The normalized corners of every candidate, None if they weren't searched for
+        :param pose: The Pose of the target, None if it wasn't found or isn't worked out
+        :return: If it was published now
+        """
+        with self.__publish_lock:
+            self.__pending = (sequence, timestamp, points, candidates, pose)
+
+        return self.flush()
+
+    def flush(self):
+        """
+        Publishes the latest detection if it's waiting and the publish rate allows it, and writes back the
+        commands that have been acknowledged
+        :return: If a detection was published
+        """
+        # Detections can come from the pipeline's thread while the main loop flushes
+        with self.__publish_lock:
+            while len(self.__acknowledgements) > 0:
+                key, value = self.__acknowledgements.popleft()
+                self.table.putBoolean(key, value)
+
+            now = time.time()
+            if self.__pending is None or now - self.__last_publish < self.publish_interval:
+                return False
+
+            sequence, timestamp, points, candidates, pose = self.__pending
+            self.__pending = None
+            self.__last_publish = now
+
+        detection = [1.0 if points is not None else 0.0, sequence, timestamp]
+        if points is not None:
+            detection.extend(value for point in points for value in point)
+
+        self.table.putNumberArray(DETECTION, detection)
+        self.published += 1
+
+        if candidates is not None:
+            self.send_candidates(candidates)
+
+        with self.__publish_lock:
+            had_pose = self.__sent.get(HAS_POSE)
+
+        if pose is not None or had_pose:
+            self.send_pose(pose)
+
+        return True
+
+    def forget_sent(self):
+        """
+        Forgets what was sent, so every value is sent again even if it didn't change
+        """
+        with self.__publish_lock:
+            self.__sent = {}
+
+    def send_candidates(self, candidates):
+        """
+        Sends the corners of every candidate target, best first, so the robot can choose between them
+        :param candidates: The normalized 4 corners of each candidate
+        """
+        for i, points in enumerate(candidates):
+            values = [value for point in points for value in point]
+            self.__put(self.table.putNumberArray, TARGET_PREFIX + str(i), values)
+
+        self.__put(self.table.putNumber, TARGET_COUNT, len(candidates))
+
+    def send_pose(self, pose):
+        """
+        Sends where the target is from the camera
+        :param pose: The Pose of the target, None if it wasn't found
+        """
+        if pose is not None:
+            self.__put(self.table.putNumber, DISTANCE, pose.distance)
+            self.__put(self.table.putNumber, YAW, pose.yaw)
+            self.__put(self.table.putNumber, POSITION_X, pose.x)
+            self.__put(self.table.putNumber, POSITION_Y, pose.y)
+
+        self.__put(self.table.putBoolean, HAS_POSE, pose is not None)
 
     def send_exception_status(self, exception_status):
         """
         Sends true/false if the server is crashing
         """
-        self.table.putBoolean(EXCEPTION_THROWN, exception_status)
+        self.__put(self.table.putBoolean, EXCEPTION_THROWN, exception_status)
 
     def send_is_online(self, is_online):
         """
         Sets if the server is online
         :param is_online: If the server is online
         """
-        self.table.putBoolean(IS_ONLINE, is_online)
+        self.__put(self.table.putBoolean, IS_ONLINE, is_online)
 
     def get_should_shutdown(self):
         """
         Gets if the server should shutdown
         :return: If the Server should shutdown
         """
-        return self.table.getBoolean(SHOULD_SHUTDOWN, False)
+        return self.__control.flags.get(SHOULD_SHUTDOWN, False)
 
     def get_should_snapshot(self):
         """
         Gets if the server should take pictures
         :return: If the Server should take pictures
         """
-        return self.table.getBoolean(TAKE_SNAPSHOT, False)
+        return self.__control.flags.get(TAKE_SNAPSHOT, False)
 
     def send_should_snapshot(self, should_snapshot):
         """
         Sets if the vision should snapshot
         """
-        self.table.putBoolean(TAKE_SNAPSHOT, should_snapshot)
+        self.acknowledge(TAKE_SNAPSHOT, should_snapshot)
 
     def send_loops(self, loops):
         """
         Puts to the table how many loops we've done
         """
-        self.table.putNumber(LOOP_AMOUNT, loops)
+        self.__put(self.table.putNumber, LOOP_AMOUNT, loops)
+
+    def __put(self, put, key, value):
+        # Only sends the value if it isn't what was last sent, the main loop and pipeline both send
+        with self.__publish_lock:
+            if self.__sent.get(key) == value:
+                self.suppressed += 1
+                return
+
+            put(key, value)
+            self.__sent[key] = value
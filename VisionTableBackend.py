@@ -0,0 +1,376 @@
+import json
+import logging
+import socket
+import sys
+import time
+import SocketServer
+from collections import namedtuple
+from threading import Thread, Lock
+
+'''
+This module is for where the VisionTable's tables come from. On the robot they are the network tables, off the
+robot they can be kept in the process, or on a small server on localhost that stands in for the robot. The
+stand-ins keep every put with when it was made and can connect and disconnect on demand, so publishing and
+the control keys can be measured without a robot.
+'''
+
+logger = logging.getLogger('VisionTableBackend')
+
+# Seconds between tries to connect to the table server while it's down
+RECONNECT_INTERVAL = 0.5
+
+# The port the network tables serve on
+DEFAULT_SERVER_PORT = 1735
+
+# A value put to a table and when it was put
+Put = namedtuple('Put', ['timestamp', 'key', 'value'])
+
+
+class NetworkTablesBackend:
+    """
+    This gets the tables from the network tables, as a client of the robot
+    """
+
+    def __init__(self, ip):
+        """
+        :param ip: The address of the robot
+        """
+        from networktables import NetworkTable
+
+        NetworkTable.setClientMode()
+        NetworkTable.setIPAddress(ip)
+        NetworkTable.initialize()
+        self.__network_table = NetworkTable
+
+    def get_table(self, name):
+        return self.__network_table.getTable(name)
+
+
+class FakeTable:
+    """
+    This has the parts of a network table the vision uses, kept in the process. Every put is recorded, and
+    the other side of the table is played with remote_put, connect and disconnect
+    """
+
+    def __init__(self, name, on_put=None):
+        """
+        :param name: The name of the table
+        :param on_put: Called with the name, key and value of every put, None to only record them
+        """
+        self.name = name
+        self.connected = True
+        self.puts = []
+        self.values = {}
+        self.on_put = on_put
+        self.__listeners = []
+        self.__connection_listeners = []
+        self.__lock = Lock()
+
+    def putNumber(self, key, value):
+        self.put(key, value)
+
+    def putBoolean(self, key, value):
+        self.put(key, value)
+
+    def putString(self, key, value):
+        self.put(key, value)
+
+    def putNumberArray(self, key, value):
+        self.put(key, list(value))
+
+    def getNumber(self, key, default=None):
+        return self.values.get(key, default)
+
+    def getBoolean(self, key, default=None):
+        return self.values.get(key, default)
+
+    def addTableListener(self, listener, immediateNotify=False, key=None):
+        self.__listeners.append((listener, key))
+        if immediateNotify:
+            for k, value in list(self.values.items()):
+                if key is None or k == key:
+                    listener(self, k, value, True)
+
+    def addConnectionListener(self, listener, immediateNotify=False):
+        self.__connection_listeners.append(listener)
+        if immediateNotify and self.connected:
+            listener.connected(self)
+
+    def remote_put(self, key, value):
+        """
+        Puts a value from the other side of the table, like the robot would, telling the listeners of the key
+        :param key: The key
+        :param value: The value
+        """
+        with self.__lock:
+            is_new = key not in self.values
+            self.values[key] = value
+
+        for listener, listen_key in list(self.__listeners):
+            if listen_key is None or listen_key == key:
+                listener(self, key, value, is_new)
+
+    def connect(self):
+        """
+        Tells the connection listeners the table connected
+        """
+        self.connected = True
+        for listener in list(self.__connection_listeners):
+            listener.connected(self)
+
+    def disconnect(self):
+        """
+        Tells the connection listeners the table disconnected
+        """
+        self.connected = False
+        for listener in list(self.__connection_listeners):
+            listener.disconnected(self)
+
+    def get_puts(self, key=None):
+        """
+        Gets what was put to the table
+        :param key: The key to get the puts of, None for every key
+        :return: The list of Puts in the order they were put
+        """
+        with self.__lock:
+            return [put for put in self.puts if key is None or put.key == key]
+
+    def clear_puts(self):
+        """
+        Forgets the recorded puts, keeping the values
+        """
+        with self.__lock:
+            self.puts = []
+
+    def put(self, key, value):
+        """
+        Puts a value from this side of the table, recording when it was put
+        :param key: The key
+        :param value: The value
+        """
+        with self.__lock:
+            self.values[key] = value
+            self.puts.append(Put(time.time(), key, value))
+
+        if self.on_put is not None:
+            self.on_put(self.name, key, value)
+
+
+class FakeBackend:
+    """
+    This keeps the tables in the process, for running the vision and measuring it without a robot
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def get_table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = FakeTable(name)
+
+        return table
+
+    def connect(self):
+        """
+        Connects every table
+        """
+        for table in list(self.tables.values()):
+            table.connect()
+
+    def disconnect(self):
+        """
+        Disconnects every table
+        """
+        for table in list(self.tables.values()):
+            table.disconnect()
+
+
+def send_message(f, table, key, value):
+    # A message is a line of json, so either side can read it with readline
+    f.write((json.dumps([table, key, value]) + '\n').encode())
+    f.flush()
+
+
+class TableServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    This stands in for the robot on localhost. It records what its clients put, and can put values to them
+    and drop them to play the robot's side
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        """
+        :param address: The (host, port) to serve on, port 0 picks a free one
+        """
+        SocketServer.TCPServer.__init__(self, address, TableHandler)
+        self.backend = FakeBackend()
+        self.clients = []
+        self.__lock = Lock()
+
+    def start(self):
+        """
+        Serves the clients on its own thread
+        :return: self
+        """
+        t = Thread(target=self.serve_forever, args=())
+        t.daemon = True
+        t.start()
+        return self
+
+    def remote_put(self, table, key, value):
+        """
+        Puts a value to every client, like the robot would
+        :param table: The name of the table
+        :param key: The key
+        :param value: The value
+        """
+        self.backend.get_table(table).values[key] = value
+        with self.__lock:
+            for handler in list(self.clients):
+                try:
+                    send_message(handler.wfile, table, key, value)
+                except socket.error:
+                    self.clients.remove(handler)
+
+    def disconnect_clients(self):
+        """
+        Drops every client, they connect again on their own
+        """
+        with self.__lock:
+            for handler in self.clients:
+                try:
+                    handler.connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+            self.clients = []
+
+    def add_client(self, handler):
+        # Sends the client every value the robot's side has, like the network tables do when they connect
+        with self.__lock:
+            for name, table in list(self.backend.tables.items()):
+                for key, value in list(table.values.items()):
+                    send_message(handler.wfile, name, key, value)
+
+            self.clients.append(handler)
+
+    def remove_client(self, handler):
+        with self.__lock:
+            if handler in self.clients:
+                self.clients.remove(handler)
+
+
+class TableHandler(SocketServer.StreamRequestHandler):
+    """
+    This records the puts of one client of the TableServer
+    """
+    def handle(self):
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.add_client(self)
+
+        try:
+            for line in iter(self.rfile.readline, b''):
+                table, key, value = json.loads(line.decode())
+                self.server.backend.get_table(table).put(key, value)
+        except (socket.error, ValueError):
+            pass
+        finally:
+            self.server.remove_client(self)
+
+
+class RemoteBackend:
+    """
+    This gets the tables from a TableServer, connecting again whenever it's dropped. Puts made while it's
+    disconnected are kept and sent when it connects, like the network tables
+    """
+
+    def __init__(self, address):
+        """
+        :param address: The (host, port) of the TableServer
+        """
+        self.address = address
+        self.tables = {}
+        self.__file = None
+        self.__lock = Lock()
+
+        t = Thread(target=self.__run, args=())
+        t.daemon = True
+        t.start()
+
+    def get_table(self, name):
+        with self.__lock:
+            table = self.tables.get(name)
+            if table is None:
+                table = self.tables[name] = FakeTable(name, self.__send)
+                table.connected = self.__file is not None
+
+        return table
+
+    def __send(self, table, key, value):
+        with self.__lock:
+            if self.__file is None:
+                return
+
+            try:
+                send_message(self.__file, table, key, value)
+            except socket.error:
+                self.__file = None
+
+    def __run(self):
+        # Keeps connected to the server, telling the tables whenever it connects or is dropped
+        while True:
+            try:
+                connection = socket.create_connection(self.address)
+            except socket.error:
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = connection.makefile('rb')
+
+            # Send everything put while disconnected before anything new can be put
+            with self.__lock:
+                self.__file = connection.makefile('wb')
+                for name, table in list(self.tables.items()):
+                    for key, value in list(table.values.items()):
+                        send_message(self.__file, name, key, value)
+
+            for table in list(self.tables.values()):
+                table.connect()
+
+            try:
+                for line in iter(reader.readline, b''):
+                    name, key, value = json.loads(line.decode())
+                    self.get_table(name).remote_put(key, value)
+            except (socket.error, ValueError):
+                pass
+
+            with self.__lock:
+                self.__file = None
+
+            connection.close()
+            for table in list(self.tables.values()):
+                table.disconnect()
+
+            logger.info('Disconnected from the table server, connecting again')
+            time.sleep(RECONNECT_INTERVAL)
+
+
+def main(port=DEFAULT_SERVER_PORT):
+    """
+    Serves the tables on localhost, printing how many values were put to each every second
+    :param port: The port to serve on
+    """
+    server = TableServer(('localhost', port)).start()
+    print('Serving tables on localhost:%d' % port)
+
+    while True:
+        time.sleep(1.0)
+        for name, table in list(server.backend.tables.items()):
+            print('%s: %d puts, %d clients' % (name, len(table.puts), len(server.clients)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SERVER_PORT)
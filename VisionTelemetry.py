@@ -0,0 +1,225 @@
+import logging
+import select
+import socket
+import struct
+import time
+from collections import namedtuple
+
+'''
+This module is for sending each detection straight to the robot as one small UDP datagram, next to the
+network table. A datagram is never held back or resent, so the robot gets the newest detection as soon as it
+is found, with the time the frame was captured to line it up with its own sensors. It only uses the standard
+library so the receiver can be copied to the robot's code as it is.
+'''
+
+logger = logging.getLogger('VisionTelemetry')
+
+# Little endian with no padding: magic, version, flags, reserved, sequence, capture timestamp, latency,
+# the x, y of the 4 normalized corners from the top left going clockwise, then distance, yaw, x, y of the pose
+PACKET = struct.Struct('<4sBBHIdf8f4f')
+PACKET_MAGIC = b'PVTM'
+PACKET_VERSION = 1
+
+# Bits of the flags, if the corners and pose in the packet are valid
+FLAG_TARGET = 0x01
+FLAG_POSE = 0x02
+
+# Seconds between tries to look up the robot while it can't be found
+RESOLVE_INTERVAL = 1.0
+
+# What the robot gets from a packet, the points and pose are None if they weren't valid
+Telemetry = namedtuple('Telemetry', ['sequence', 'timestamp', 'latency', 'points', 'pose', 'received'])
+
+
+def pack_telemetry(sequence, timestamp, latency, points, pose=None):
+    """
+    Packs a detection into a packet
+    :param sequence: The sequence number of the frame
+    :param timestamp: When the frame was captured, in seconds since the epoch
+    :param latency: The seconds from capturing the frame to sending it
+    :param points: The normalized 4 corners of the target, None if it wasn't found
+    :param pose: The (distance, yaw, x, y) of the target, None if it wasn't found or isn't worked out
+    :return: The packet's bytes
+    """
+    flags = 0
+    corners = (0.0,) * 8
+    if points is not None:
+        flags |= FLAG_TARGET
+        corners = tuple(float(value) for point in points for value in point)
+
+    position = (0.0,) * 4
+    if pose is not None:
+        flags |= FLAG_POSE
+        position = tuple(float(value) for value in pose)
+
+    return PACKET.pack(PACKET_MAGIC, PACKET_VERSION, flags, 0, sequence & 0xFFFFFFFF, timestamp, latency,
+                       *(corners + position))
+
+
+def unpack_telemetry(packet, received=0.0):
+    """
+    Unpacks a detection from a packet
+    :param packet: The packet's bytes
+    :param received: When the packet was received
+    :return: The Telemetry, or None if it isn't a packet of this version
+    """
+    if len(packet) != PACKET.size:
+        return None
+
+    values = PACKET.unpack(packet)
+    magic, version, flags, reserved, sequence, timestamp, latency = values[:7]
+    if magic != PACKET_MAGIC or version != PACKET_VERSION:
+        return None
+
+    points = None
+    if flags & FLAG_TARGET:
+        corners = values[7:15]
+        points = tuple((corners[i], corners[i + 1]) for i in range(0, 8, 2))
+
+    pose = values[15:19] if flags & FLAG_POSE else None
+    return Telemetry(sequence, timestamp, latency, points, pose, received)
+
+
+class TelemetrySender:
+    """
+    This sends the telemetry of each detection to the robot. Sending never blocks and never raises, if the
+    robot isn't there the packet is dropped and counted
+    """
+
+    def __init__(self, host, port):
+        """
+        :param host: The host name or address of the robot
+        :param port: The UDP port the robot listens on
+        """
+        self.host = host
+        self.port = port
+        self.sent = 0
+        self.dropped = 0
+        self.__address = None
+        self.__last_resolve = 0.0
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.setblocking(False)
+
+    def send(self, sequence, timestamp, points, pose=None):
+        """
+        Sends a detection, with how long it took since the frame was captured
+        :param sequence: The sequence number of the frame
+        :param timestamp: When the frame was captured, in seconds since the epoch
+        :param points: The normalized 4 corners of the target, None if it wasn't found
+        :param pose: The (distance, yaw, x, y) of the target, None if it wasn't found or isn't worked out
+        :return: If it was sent
+        """
+        address = self.__resolve()
+        if address is None:
+            self.dropped += 1
+            return False
+
+        packet = pack_telemetry(sequence, timestamp, time.time() - timestamp, points, pose)
+
+        try:
+            self.__socket.sendto(packet, address)
+        except socket.error:
+            self.dropped += 1
+            return False
+
+        self.sent += 1
+        return True
+
+    def close(self):
+        """
+        Closes the socket
+        """
+        self.__socket.close()
+
+    def __resolve(self):
+        # Looks the robot up once, the robot's name may not resolve until it's on the network so keep trying
+        if self.__address is None:
+            now = time.time()
+            if now - self.__last_resolve < RESOLVE_INTERVAL:
+                return None
+
+            self.__last_resolve = now
+            try:
+                self.__address = (socket.gethostbyname(self.host), self.port)
+                logger.info('Sending telemetry to %s:%d', self.__address[0], self.port)
+            except socket.error:
+                logger.warning('Could not find %s to send telemetry to', self.host)
+
+        return self.__address
+
+
+class TelemetryReceiver:
+    """
+    This receives the telemetry on the robot. Packets that were captured before the latest one are dropped,
+    so a packet that comes out of order never replaces a newer detection
+    """
+
+    def __init__(self, port, host=''):
+        """
+        :param port: The UDP port to listen on
+        :param host: The address to listen on, empty for every one
+        """
+        self.latest = None
+        self.received = 0
+        self.stale = 0
+        self.invalid = 0
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind((host, port))
+        self.__socket.setblocking(False)
+
+    def receive(self, timeout=None):
+        """
+        Waits for the next detection newer than the latest
+        :param timeout: The most seconds to wait, None to wait forever
+        :return: The Telemetry, or None if the timeout passed first
+        """
+        end = None if timeout is None else time.time() + timeout
+
+        while True:
+            remaining = None if end is None else max(end - time.time(), 0.0)
+            if not select.select([self.__socket], [], [], remaining)[0]:
+                return None
+
+            telemetry = self.__read()
+            if telemetry is not None:
+                return telemetry
+
+            if end is not None and time.time() >= end:
+                return None
+
+    def poll(self):
+        """
+        Reads every packet waiting without blocking, for robot code that checks once a loop
+        :return: The latest Telemetry, None if nothing has been received yet
+        """
+        while select.select([self.__socket], [], [], 0.0)[0]:
+            self.__read()
+
+        return self.latest
+
+    def close(self):
+        """
+        Closes the socket
+        """
+        self.__socket.close()
+
+    def __read(self):
+        # Reads one packet, only keeping it if it's valid and newer than the latest
+        try:
+            packet = self.__socket.recv(PACKET.size + 1)
+        except socket.error:
+            return None
+
+        telemetry = unpack_telemetry(packet, time.time())
+        if telemetry is None:
+            self.invalid += 1
+            return None
+
+        # The capture time decides what's newer, the sequence starts again if the vision restarts
+        if self.latest is not None and telemetry.timestamp <= self.latest.timestamp:
+            self.stale += 1
+            return None
+
+        self.received += 1
+        self.latest = telemetry
+        return telemetry
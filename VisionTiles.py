@@ -0,0 +1,80 @@
+import logging
+from multiprocessing.pool import ThreadPool
+
+'''
+This module is for processing a frame in horizontal bands on a pool of threads. OpenCV lets go of the GIL
+while it works, so each band can have a core to itself, cutting the time of a single frame.
+'''
+
+logger = logging.getLogger('VisionTiles')
+
+# Bands shorter than this cost more to hand out than they save
+MIN_BAND_ROWS = 32
+
+
+def split_bands(height, bands, halo):
+    """
+    Splits the rows of an image into bands, each with the rows around it it needs to be processed
+    :param height: The amount of rows in the image
+    :param bands: The amount of bands to split it into
+    :param halo: How many rows past each edge of a band the processing reaches
+    :return: The list of (y0, y1, top, bottom), the band is rows y0 to y1 and is processed from top to bottom
+    """
+    spans = []
+
+    for i in range(bands):
+        y0 = height * i // bands
+        y1 = height * (i + 1) // bands
+        spans.append((y0, y1, max(y0 - halo, 0), min(y1 + halo, height)))
+
+    return spans
+
+
+def should_tile(height, bands):
+    """
+    Gets if an image is tall enough to be worth splitting into the bands
+    :param height: The amount of rows in the image
+    :param bands: The amount of bands it would be split into
+    :return: If it should be processed in bands
+    """
+    return bands > 1 and height >= bands * MIN_BAND_ROWS
+
+
+class BandExecutor:
+    """
+    This runs a function on each band of an image on its own thread and stitches the bands back together.
+    Each band is processed with the halo rows around it, so as long as the halo covers how far the processing
+    reaches, the stitched image is the same as processing the whole image at once
+    """
+
+    def __init__(self, bands):
+        """
+        :param bands: The amount of bands, and threads to process them on
+        """
+        self.bands = bands
+        self.__pool = ThreadPool(bands)
+
+    def run(self, image, output, halo, functions):
+        """
+        Processes the image in bands into the output
+        :param image: The image to process
+        :param output: The image to stitch the processed bands into, with the same rows as the image
+        :param halo: How many rows past each edge of a band the processing reaches
+        :param functions: A function for each band, called with the rows to process and returning them processed
+        :return: The output
+        """
+        spans = split_bands(image.shape[0], self.bands, halo)
+
+        def process_band(i):
+            y0, y1, top, bottom = spans[i]
+            processed = functions[i](image[top:bottom])
+            output[y0:y1] = processed[y0 - top:y1 - top]
+
+        self.__pool.map(process_band, range(self.bands))
+        return output
+
+    def close(self):
+        """
+        Stops the threads once they are done
+        """
+        self.__pool.close()
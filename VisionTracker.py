@@ -0,0 +1,197 @@
+import cv2
+import logging
+import numpy as np
+from VisionProcessor import order_corners
+
+'''
+This module is for following the target between full detections by moving its corners with optical flow.
+'''
+
+logger = logging.getLogger('VisionTracker')
+
+# Settings for the pyramidal Lucas-Kanade flow
+FLOW_WINDOW = (21, 21)
+FLOW_LEVELS = 3
+FLOW_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+
+# Pixels added around the tracked corners for the local threshold check
+CHECK_PADDING = 4
+
+
+class TargetTracker:
+    """
+    This runs a full detection every few frames, or whenever it loses confidence, and moves the corners
+    with sparse optical flow in between. How far the flow drifted is measured against every full detection,
+    and detections are run more often if it drifts past the tolerance
+    """
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.points = None
+        self.confidence = 0.0
+        self.detected = False
+        self.interval = None
+        self.frames_since_detection = 0
+        self.frames_tracked = 0
+        self.detections = 0
+        self.reacquisitions = 0
+        self.last_drift = None
+        self.max_drift = 0.0
+        self.__gray = None
+        self.__previous_gray = None
+
+    def track(self, frame, config=None):
+        """
+        Finds the target in the frame, with a full detection or by following it from the last frame
+        :param frame: The BGR image to search
+        :param config: The config file to use, if need to change
+        :return: The 4 corners of the target ordered from the top left going clockwise if found, The confidence
+        """
+        if config is not None:
+            self.processor.config = config
+
+        plan = self.processor.config.get_plan()
+
+        if not plan.use_flow:
+            hull, points = self.processor.find_target(frame)
+            self.detected = True
+            self.confidence = 1.0 if points is not None else 0.0
+            self.points = None if points is None else order_corners(points)
+            return self.__result()
+
+        if self.interval is None or self.interval > plan.detect_interval:
+            self.interval = plan.detect_interval
+
+        gray = self.__to_gray(frame)
+        predicted = None
+        confidence = 0.0
+
+        if self.points is not None and self.__previous_gray is not None:
+            predicted, confidence = self.__propagate(gray, frame)
+
+        low_confidence = predicted is not None and confidence < plan.min_confidence
+        if predicted is None or low_confidence or self.frames_since_detection >= self.interval:
+            self.__detect(frame, predicted, plan)
+
+            if low_confidence:
+                self.reacquisitions += 1
+        else:
+            self.points = predicted
+            self.confidence = confidence
+            self.detected = False
+            self.frames_since_detection += 1
+            self.frames_tracked += 1
+
+        # Keep this frame to flow from next time, reusing the older buffer
+        self.__gray, self.__previous_gray = self.__previous_gray, gray
+        return self.__result()
+
+    def get_stats(self):
+        """
+        Gets the counters of the tracker
+        :return: A dict of the frames tracked, detections, reacquisitions, current interval and drift
+        """
+        return {
+            'tracked': self.frames_tracked,
+            'detections': self.detections,
+            'reacquisitions': self.reacquisitions,
+            'interval': self.interval,
+            'last_drift': self.last_drift,
+            'max_drift': self.max_drift
+        }
+
+    def reset(self):
+        """
+        Forgets the target so the next frame runs a full detection
+        """
+        self.points = None
+        self.confidence = 0.0
+        self.frames_since_detection = 0
+        self.processor.tracker.reset()
+
+    def __detect(self, frame, predicted, plan):
+        # Runs a full detection, and measures how far the flow had drifted from it
+        hull, points = self.processor.find_target(frame)
+        self.detections += 1
+        self.detected = True
+        self.frames_since_detection = 0
+
+        if points is None:
+            self.points = None
+            self.confidence = 0.0
+            return
+
+        corners = order_corners(points)
+
+        if predicted is not None:
+            drift = float(np.sqrt(((corners - predicted) ** 2).sum(axis=1)).max())
+            self.last_drift = drift
+            self.max_drift = max(self.max_drift, drift)
+
+            # Detect more often when drifting too far, and back off again when well inside the tolerance
+            if drift > plan.drift_tolerance:
+                self.interval = max(self.interval // 2, 1)
+            elif drift <= plan.drift_tolerance / 2.0 and self.interval < plan.detect_interval:
+                self.interval += 1
+
+        self.points = corners
+        self.confidence = 1.0
+
+    def __propagate(self, gray, frame):
+        # Moves the corners with optical flow, then checks them against a threshold of just that area
+        previous = self.points.reshape(-1, 1, 2)
+        moved, status, error = cv2.calcOpticalFlowPyrLK(self.__previous_gray, gray, previous, None,
+                                                        winSize=FLOW_WINDOW, maxLevel=FLOW_LEVELS,
+                                                        criteria=FLOW_CRITERIA)
+
+        if moved is None or not status.all():
+            return None, 0.0
+
+        corners = moved.reshape(4, 2)
+        height, width = gray.shape[:2]
+        x0 = max(int(corners[:, 0].min()) - CHECK_PADDING, 0)
+        y0 = max(int(corners[:, 1].min()) - CHECK_PADDING, 0)
+        x1 = min(int(corners[:, 0].max()) + CHECK_PADDING + 1, width)
+        y1 = min(int(corners[:, 1].max()) + CHECK_PADDING + 1, height)
+
+        # YUYV windows have to start and end on a pixel pair
+        if frame.ndim == 3 and frame.shape[2] == 2:
+            x0 -= x0 % 2
+            x1 += x1 % 2
+
+        area = cv2.contourArea(corners)
+
+        if x1 <= x0 or y1 <= y0 or area < 1.0:
+            return None, 0.0
+
+        # The target should fill the quad, so the lit pixels around it should match its area
+        mask = self.processor.process_frame(frame[y0:y1, x0:x1])
+        fill = cv2.countNonZero(mask) / area
+        confidence = min(fill, 1.0 / fill) if fill > 0 else 0.0
+
+        return corners, confidence
+
+    def __to_gray(self, frame):
+        # Converts into whichever gray buffer isn't holding the previous frame
+        shape = frame.shape[:2]
+        if self.__previous_gray is not None and self.__previous_gray.shape != shape:
+            self.__previous_gray = None
+
+        if self.__gray is None or self.__gray.shape != shape:
+            self.__gray = np.empty(shape, dtype=np.uint8)
+
+        if frame.ndim == 2:
+            np.copyto(self.__gray, frame)
+        elif frame.shape[2] == 2:
+            # YUYV already has the brightness of every pixel as Y
+            np.copyto(self.__gray, frame[:, :, 0])
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.__gray)
+
+        return self.__gray
+
+    def __result(self):
+        if self.points is None:
+            return None, self.confidence
+
+        return tuple(tuple(point) for point in self.points), self.confidence
@@ -0,0 +1,419 @@
+import argparse
+import cv2
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+from VisionBatch import read_frames, prefetch
+from VisionConfiguration import VisionConfiguration
+from VisionProcessor import order_corners
+
+'''
+This module is for tuning the color ranges and kernels to a set of snapshots with the target marked in each.
+The snapshots are converted and binned once into a cache on disk, so every range tried is scored from
+prefix sums of the color histograms instead of running the vision again.
+'''
+
+logger = logging.getLogger('VisionTuner')
+
+# Bins per channel of the color histograms, the tuned ranges line up with the edges of the bins
+DEFAULT_BINS = 32
+
+# Share of the target's pixels left out of the starting range on each end of each channel
+START_PERCENTILE = .01
+
+# Most times to go around all 6 bounds looking for a better range
+MAX_PASSES = 20
+
+# Kernel sizes tried once the range is tuned, 0 turns the stage off
+OPEN_CHOICES = (0, 3, 5, 7)
+CLOSE_CHOICES = (0, 5, 9, 13, 17)
+
+# Files of the cache
+KEY_FILE = 'key.txt'
+SUMS_FILE = 'sums.npy'
+BINS_FILE = 'bins.npy'
+
+
+def read_labels(path):
+    """
+    Reads the marked targets, a json object of each snapshot's name to its 4 corners, or null if it has no target
+    :param path: The path of the json file
+    :return: A dict of name to the numpy array of ordered corners, or None
+    """
+    with open(path) as f:
+        labels = json.load(f)
+
+    return dict((str(name), None if points is None else order_corners(points)) for name, points in labels.items())
+
+
+def get_channel_sizes(use_hsv):
+    """
+    Gets how many values each channel can have
+    :param use_hsv: If the colors are HSV, where hue only goes to 180
+    :return: The sizes of the 3 channels
+    """
+    return (180 if use_hsv else 256), 256, 256
+
+
+def bin_to_range(low, high, bins, use_hsv):
+    """
+    Gets the color range that holds exactly the colors in a range of bins
+    :param low: The lowest bin of each channel
+    :param high: The highest bin of each channel
+    :param bins: The bins per channel
+    :param use_hsv: If the colors are HSV
+    :return: The (one, two, three) low values, The (one, two, three) high values
+    """
+    sizes = get_channel_sizes(use_hsv)
+
+    # Value v is in bin v * bins // size, so a bin starts at the first value that rounds into it
+    lows = tuple(-(-int(b) * size // bins) for b, size in zip(low, sizes))
+    highs = tuple(-(-(int(b) + 1) * size // bins) - 1 for b, size in zip(high, sizes))
+    return lows, highs
+
+
+def label_mask(points, shape):
+    """
+    Draws the marked target as a mask
+    :param points: The ordered corners of the target, None if there is no target
+    :param shape: The (height, width) of the mask
+    :return: The mask, 255 inside the target
+    """
+    mask = np.zeros(shape, dtype=np.uint8)
+    if points is not None:
+        cv2.fillConvexPoly(mask, np.round(points).astype(np.int32), 255)
+
+    return mask
+
+
+class TuningCache:
+    """
+    This holds the binned colors of every snapshot, and the prefix sums of the histograms of the colors
+    inside and outside the target, memory mapped so thousands of snapshots don't have to fit in memory
+    """
+
+    def __init__(self, directory, names, labels, bins, use_hsv):
+        """
+        :param directory: The directory the cache is in
+        :param names: The names of the snapshots in the cache, in order
+        :param labels: The dict of name to the ordered corners of the target, or None
+        :param bins: The bins per channel
+        :param use_hsv: If the colors were converted to HSV
+        """
+        self.directory = directory
+        self.names = names
+        self.labels = labels
+        self.bins = bins
+        self.use_hsv = use_hsv
+        self.sums = np.load(os.path.join(directory, SUMS_FILE), mmap_mode='r')
+        self.binned = np.load(os.path.join(directory, BINS_FILE), mmap_mode='r')
+
+    @staticmethod
+    def get_key(src, labels, bins, use_hsv):
+        """
+        Gets what the cache was built from, so it's built again if any of it changes
+        :return: The key as text
+        """
+        marked = sorted((name, None if points is None else points.tolist()) for name, points in labels.items())
+        digest = hashlib.sha1(repr(marked).encode('utf-8')).hexdigest()
+        return '%s %f %d %s %s' % (os.path.abspath(src), os.path.getmtime(src), bins, use_hsv, digest)
+
+    @staticmethod
+    def load(directory, src, labels, bins=DEFAULT_BINS, use_hsv=True):
+        """
+        Loads the cache for the snapshots, building it first if it doesn't match them
+        :param directory: The directory to keep the cache in
+        :param src: The image directory or frame log the snapshots are in
+        :param labels: The dict of name to the ordered corners of the target, or None
+        :param bins: The bins per channel
+        :param use_hsv: If the colors should be converted to HSV
+        :return: The TuningCache
+        """
+        key = TuningCache.get_key(src, labels, bins, use_hsv)
+        key_path = os.path.join(directory, KEY_FILE)
+
+        if os.path.exists(key_path):
+            with open(key_path) as f:
+                lines = f.read().splitlines()
+
+            if len(lines) > 0 and lines[0] == key:
+                return TuningCache(directory, lines[1:], labels, bins, use_hsv)
+
+        names = TuningCache.build(directory, src, labels, bins, use_hsv)
+
+        # The key is written last, so a cache that didn't finish building is never used
+        with open(key_path, 'w') as f:
+            f.write('\n'.join([key] + names))
+
+        return TuningCache(directory, names, labels, bins, use_hsv)
+
+    @staticmethod
+    def build(directory, src, labels, bins, use_hsv):
+        """
+        Converts and bins every marked snapshot, and writes the prefix sums of its histograms
+        :return: The names of the snapshots in the cache, in order
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Which bin each value of each channel falls in, the bin of a color is one * bins^2 + two * bins + three
+        scales = [bins * bins, bins, 1]
+        tables = [((np.arange(256) * bins // size).clip(0, bins - 1) * scale).astype(np.uint16)
+                  for size, scale in zip(get_channel_sizes(use_hsv), scales)]
+
+        sums = None
+        binned = None
+        names = []
+        start = time.time()
+
+        for name, frame in prefetch(read_frames(src)):
+            if name not in labels:
+                continue
+
+            if binned is None:
+                shape = frame.shape[:2]
+                count = len(labels)
+                sums = np.lib.format.open_memmap(os.path.join(directory, SUMS_FILE), mode='w+', dtype=np.uint32,
+                                                 shape=(count, 2, bins + 1, bins + 1, bins + 1))
+                binned = np.lib.format.open_memmap(os.path.join(directory, BINS_FILE), mode='w+', dtype=np.uint16,
+                                                   shape=(count, shape[0], shape[1]))
+            elif frame.shape[:2] != binned.shape[1:]:
+                logger.warning('Skipping %s, it is not the same size as the other snapshots', name)
+                continue
+
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV) if use_hsv else frame
+            colors = binned[len(names)]
+            np.take(tables[0], image[:, :, 0], out=colors)
+            colors += np.take(tables[1], image[:, :, 1])
+            colors += np.take(tables[2], image[:, :, 2])
+
+            # Histograms of the colors in and out of the target, summed up every channel so any box is 8 lookups
+            inside = label_mask(labels[name], shape) > 0
+            for side, pixels in enumerate((colors[inside], colors[~inside])):
+                histogram = np.bincount(pixels, minlength=bins ** 3).reshape(bins, bins, bins)
+                sums[len(names), side, 1:, 1:, 1:] = histogram.cumsum(0).cumsum(1).cumsum(2)
+
+            names.append(name)
+
+        if binned is None:
+            raise ValueError('None of the snapshots in %s are marked' % src)
+
+        sums.flush()
+        binned.flush()
+        logger.info('Cached %d snapshots in %.2f seconds', len(names), time.time() - start)
+        return names
+
+    def count(self, side, low, high):
+        """
+        Counts the pixels of every snapshot in boxes of bins
+        :param side: 0 for the pixels inside the target, 1 for outside
+        :param low: The (K, 3) lowest bins of each box
+        :param high: The (K, 3) highest bins of each box
+        :return: The (snapshots, K) counts
+        """
+        sums = self.sums[:len(self.names), side]
+        total = 0
+
+        # Inclusion and exclusion over the 8 corners of each box
+        for corner in range(8):
+            picks = [(corner >> channel) & 1 for channel in range(3)]
+            x, y, z = [high[:, c] + 1 if pick else low[:, c] for c, pick in enumerate(picks)]
+            sign = 1 if (3 - sum(picks)) % 2 == 0 else -1
+            total = total + sign * sums[:, x, y, z].astype(np.int64)
+
+        return total
+
+    def score(self, low, high):
+        """
+        Scores ranges of bins over every snapshot, with how well the pixels in range match the target,
+        as the F1 of the pixels in snapshots with a target and how little is in range in ones without
+        :param low: The (K, 3) lowest bins of each range
+        :param high: The (K, 3) highest bins of each range
+        :return: The (K,) average score of each range, 1 is perfect
+        """
+        found = self.count(0, low, high)
+        extra = self.count(1, low, high)
+        targets = self.sums[:len(self.names), 0, -1, -1, -1].astype(np.int64).reshape(-1, 1)
+        average_target = max(targets[targets > 0].mean(), 1.0) if (targets > 0).any() else 1.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(targets > 0, 2.0 * found / (found + extra + targets),
+                              np.maximum(1.0 - extra / average_target, 0.0))
+
+        return scores.mean(axis=0)
+
+    def get_starting_range(self):
+        """
+        Gets the range of bins holding all but the ends of the target's colors on each channel
+        :return: The lowest bins, The highest bins
+        """
+        sums = self.sums[:len(self.names), 0].sum(axis=0, dtype=np.int64)
+        total = max(sums[-1, -1, -1], 1)
+        cumulative = [sums[1:, -1, -1], sums[-1, 1:, -1], sums[-1, -1, 1:]]
+
+        low = np.array([np.searchsorted(c, total * START_PERCENTILE, 'right') for c in cumulative])
+        high = np.array([np.searchsorted(c, total * (1 - START_PERCENTILE), 'left') for c in cumulative])
+        return low.clip(0, self.bins - 1), np.maximum(high.clip(0, self.bins - 1), low)
+
+    def tune_range(self):
+        """
+        Searches for the best range of bins, trying every value of one bound at a time until none get better
+        :return: The lowest bins, The highest bins, The score
+        """
+        low, high = self.get_starting_range()
+        best = self.score(low.reshape(1, 3), high.reshape(1, 3))[0]
+        values = np.arange(self.bins)
+
+        for i in range(MAX_PASSES):
+            improved = False
+
+            for bound in range(6):
+                channel = bound % 3
+                lows = np.tile(low, (self.bins, 1))
+                highs = np.tile(high, (self.bins, 1))
+
+                if bound < 3:
+                    lows[:, channel] = values
+                    valid = values <= high[channel]
+                else:
+                    highs[:, channel] = values
+                    valid = values >= low[channel]
+
+                scores = np.where(valid, self.score(np.minimum(lows, highs), highs), -1.0)
+                k = int(np.argmax(scores))
+
+                if scores[k] > best + 1e-9:
+                    best = scores[k]
+                    low, high = lows[k], highs[k]
+                    improved = True
+
+            if not improved:
+                break
+
+        return low, high, best
+
+    def tune_kernels(self, low, high):
+        """
+        Tries every open and close kernel on the snapshots thresholded to the range of bins, straight from
+        the binned colors
+        :param low: The lowest bins of the range
+        :param high: The highest bins of the range
+        :return: The open kernel size, The close kernel size, The score, a size of 0 means the stage is off
+        """
+        lut = np.zeros((self.bins, self.bins, self.bins), dtype=np.uint8)
+        lut[low[0]:high[0] + 1, low[1]:high[1] + 1, low[2]:high[2] + 1] = 255
+        lut = lut.reshape(-1)
+
+        choices = [(open_size, close_size) for open_size in OPEN_CHOICES for close_size in CLOSE_CHOICES]
+        kernels = dict((size, np.ones((size, size), dtype=np.uint8)) for size in OPEN_CHOICES + CLOSE_CHOICES)
+        totals = np.zeros(len(choices))
+        shape = self.binned.shape[1:]
+
+        for i, name in enumerate(self.names):
+            mask = np.take(lut, self.binned[i])
+            target = label_mask(self.labels[name], shape)
+            target_pixels = cv2.countNonZero(target)
+
+            for k, (open_size, close_size) in enumerate(choices):
+                image = mask
+                if open_size > 0:
+                    image = cv2.morphologyEx(image, cv2.MORPH_OPEN, kernels[open_size])
+                if close_size > 0:
+                    image = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernels[close_size])
+
+                found = cv2.countNonZero(cv2.bitwise_and(image, target))
+                extra = cv2.countNonZero(image) - found
+
+                if target_pixels > 0:
+                    totals[k] += 2.0 * found / (found + extra + target_pixels)
+                else:
+                    totals[k] += max(1.0 - extra / float(shape[0] * shape[1]), 0.0)
+
+        k = int(np.argmax(totals))
+        return choices[k][0], choices[k][1], totals[k] / max(len(self.names), 1)
+
+
+def set_range(config, low, high):
+    """
+    Sets the color range of the configuration, each bound is clamped to the other one so they are set in an
+    order that never clamps the new range
+    :param config: The VisionConfiguration to set the range of
+    :param low: The (one, two, three) low values
+    :param high: The (one, two, three) high values
+    """
+    setters = ((config.set_one_low, config.set_one_high), (config.set_two_low, config.set_two_high),
+               (config.set_three_low, config.set_three_high))
+
+    for (set_low, set_high), current_high, channel_low, channel_high in zip(setters, config.get_high_range(),
+                                                                            low, high):
+        # Move the high out of the way first if the new low is above it
+        if channel_low > current_high:
+            set_high(channel_high)
+            set_low(channel_low)
+        else:
+            set_low(channel_low)
+            set_high(channel_high)
+
+
+def tune(config, src, labels, cache_directory, bins=DEFAULT_BINS):
+    """
+    Tunes the color range and kernels of the configuration to the marked snapshots
+    :param config: The VisionConfiguration to tune, its HSV setting picks the colors tuned in
+    :param src: The image directory or frame log the snapshots are in
+    :param labels: The dict of name to the ordered corners of the target, or None
+    :param cache_directory: The directory to keep the cache in
+    :param bins: The bins per channel
+    :return: The score of the color range, The score with the kernels
+    """
+    use_hsv = config.get_should_use_hsv()
+    cache = TuningCache.load(cache_directory, src, labels, bins, use_hsv)
+
+    low, high, range_score = cache.tune_range()
+    open_size, close_size, kernel_score = cache.tune_kernels(low, high)
+    set_range(config, *bin_to_range(low, high, bins, use_hsv))
+
+    config.set_should_open(open_size > 0)
+    if open_size > 0:
+        config.set_kernel_open_size(open_size)
+
+    config.set_should_close(close_size > 0)
+    if close_size > 0:
+        config.set_kernel_close_size(close_size)
+
+    return range_score, kernel_score
+
+
+def main(args=None):
+    """
+    Tunes a configuration to marked snapshots and saves it
+    :param args: The command line arguments, None for sys.argv
+    :return: The exit code
+    """
+    parser = argparse.ArgumentParser(description='Tunes the color range and kernels to marked snapshots')
+    parser.add_argument('source', help='Image directory or frame log of the snapshots')
+    parser.add_argument('labels', help='Json of each snapshot name to the 4 corners of its target, or null')
+    parser.add_argument('-c', '--config', default='settings.conf', help='Configuration to tune')
+    parser.add_argument('-o', '--output', default=None, help='Where to save the tuned configuration')
+    parser.add_argument('--cache', default=None, help='Directory to cache the binned snapshots in')
+    parser.add_argument('-b', '--bins', type=int, default=DEFAULT_BINS, help='Bins per color channel')
+    args = parser.parse_args(args)
+
+    config = VisionConfiguration(args.config)
+    cache_directory = args.cache or os.path.splitext(os.path.abspath(args.source))[0] + '.tune'
+
+    start = time.time()
+    range_score, kernel_score = tune(config, args.source, read_labels(args.labels), cache_directory, args.bins)
+    config.save(args.output)
+
+    print('Tuned in %.2f seconds, range score %.3f, with kernels %.3f' % (time.time() - start, range_score,
+                                                                          kernel_score))
+    print('Low %s High %s' % (config.get_low_range(), config.get_high_range()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
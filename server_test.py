@@ -1,4 +1,4 @@
-import SingleFrameGrabber
+import VisionFrameSource
 import VisionServer
 import socket
 import threading
@@ -8,8 +8,8 @@ import numpy as np
 
 def main():
     address = ('localhost', 4269)
-    frame_grabber = SingleFrameGrabber.SingleFrameGrabber('pupp.jpg').start()
-    VisionServer.frame_grabber = frame_grabber
+    frame_source = VisionFrameSource.create_frame_source('pupp.jpg').start()
+    VisionServer.frame_source = frame_source
     server = VisionServer.VisionServer(address, VisionServer.VisionHandler)
 
     t = threading.Thread(target=server.serve_forever)
@@ -46,6 +46,7 @@ def main():
     cv2.waitKey(0)
 
     s.close()
+    frame_source.stop()
     server.socket.close()
 
 
@@ -0,0 +1,84 @@
+import VisionTable
+import VisionTableBackend
+import time
+
+DETECTIONS = 5000
+COMMANDS = 100
+
+
+def measure_publish():
+    backend = VisionTableBackend.FakeBackend()
+    VisionTable.set_backend(backend)
+    table = VisionTable.VisionTable('Publish')
+    fake = backend.get_table('Publish')
+    points = ((0.25, 0.25), (0.75, 0.25), (0.75, 0.75), (0.25, 0.75))
+
+    start = time.time()
+    for sequence in range(DETECTIONS):
+        table.publish_detection(sequence, time.time(), points, [points])
+    elapsed = time.time() - start
+
+    print('Publishing: %.1f us a detection, %.2f puts a detection, %d suppressed' % (
+        elapsed * 1e6 / DETECTIONS, len(fake.puts) / float(DETECTIONS), table.suppressed))
+
+    # The table sends everything again when it connects, even if it didn't change
+    fake.clear_puts()
+    fake.disconnect()
+    fake.connect()
+    table.publish_detection(DETECTIONS, time.time(), points, [points])
+    print('Puts after connecting again: %d' % len(fake.puts))
+
+
+def measure_control():
+    server = VisionTableBackend.TableServer(('localhost', 0)).start()
+    VisionTable.set_backend(VisionTableBackend.RemoteBackend(server.server_address))
+    table = VisionTable.VisionTable('Vision')
+    robot = server.backend.get_table('Vision')
+
+    while not table.table.connected:
+        time.sleep(0.01)
+
+    commands = []
+    acknowledgements = []
+    for i in range(COMMANDS):
+        robot.clear_puts()
+
+        # The robot asks for a snapshot, the vision sees it and writes it back
+        start = time.time()
+        server.remote_put('Vision', VisionTable.TAKE_SNAPSHOT, True)
+        while not table.has_commands():
+            time.sleep(0.0001)
+        commands.append(time.time() - start)
+
+        table.take_commands()
+        table.send_should_snapshot(False)
+        table.flush()
+        while len(robot.get_puts(VisionTable.TAKE_SNAPSHOT)) == 0:
+            time.sleep(0.0001)
+        acknowledgements.append(robot.get_puts(VisionTable.TAKE_SNAPSHOT)[0].timestamp - start)
+
+    commands.sort()
+    acknowledgements.sort()
+    print('Command latency ms: median %.3f, max %.3f' % (commands[COMMANDS // 2] * 1000, commands[-1] * 1000))
+    print('Round trip ms: median %.3f, max %.3f' % (acknowledgements[COMMANDS // 2] * 1000,
+                                                    acknowledgements[-1] * 1000))
+
+    # Drop the vision like the robot would, it should connect again and send its values again
+    table.send_is_online(True)
+    robot.clear_puts()
+    server.disconnect_clients()
+    while len(robot.get_puts(VisionTable.IS_ONLINE)) == 0:
+        time.sleep(0.01)
+    print('Connected again after being dropped')
+
+    server.shutdown()
+    server.server_close()
+
+
+def main():
+    measure_publish()
+    measure_control()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import VisionTelemetry
+import threading
+import time
+
+PORT = 5800
+PACKETS = 1000
+RATE = 100.0
+
+
+def main():
+    receiver = VisionTelemetry.TelemetryReceiver(PORT, 'localhost')
+    sender = VisionTelemetry.TelemetrySender('localhost', PORT)
+    points = ((0.25, 0.25), (0.75, 0.25), (0.75, 0.75), (0.25, 0.75))
+    pose = (2000.0, 5.0, 170.0, -40.0)
+
+    def send():
+        for sequence in range(PACKETS):
+            # Pretend every frame was just captured, so the latency is only the trip through the socket
+            sender.send(sequence, time.time(), points, pose)
+            time.sleep(1.0 / RATE)
+
+    t = threading.Thread(target=send)
+    t.setDaemon(True)
+    t.start()
+    print('Sending %d packets of %d bytes' % (PACKETS, VisionTelemetry.PACKET.size))
+
+    latencies = []
+    while True:
+        telemetry = receiver.receive(1.0)
+        if telemetry is None:
+            break
+
+        assert telemetry.points == points
+        assert telemetry.pose == pose
+        latencies.append((telemetry.received - telemetry.timestamp) * 1000.0)
+
+    latencies.sort()
+    print('Received %d, stale %d, invalid %d, dropped %d' % (receiver.received, receiver.stale, receiver.invalid,
+                                                             sender.dropped))
+    if len(latencies) > 0:
+        print('Latency ms: min %.3f, median %.3f, 99%% %.3f, max %.3f' % (
+            latencies[0], latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1]))
+
+    sender.close()
+    receiver.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import itertools
+import os
+import shutil
+import tempfile
+import numpy as np
+import VisionConfiguration
+import VisionProcessor
+import VisionTuner
+from VisionPlan import SMOOTH_METHODS
+
+BANDS = (2, 3, 7)
+SMOOTH_SIZES = (3, 4, 7, 8)
+MORPH_SIZES = ((3, 5), (4, 8), (7, 2))
+
+
+def make_frame(seed=3189):
+    # Noise with blocks of color in it, an odd height so the bands aren't all the same size
+    random = np.random.RandomState(seed)
+    frame = random.randint(0, 256, (481, 640, 3)).astype(np.uint8)
+    for i in range(40):
+        x, y = random.randint(0, 600), random.randint(0, 440)
+        frame[y:y + random.randint(4, 40), x:x + random.randint(4, 40)] = random.randint(0, 256, 3)
+
+    return frame
+
+
+def compare(config, frame):
+    # Processes the frame whole and in each amount of bands, and counts the ones that came out different
+    config.set_tile_bands(0)
+    whole = VisionProcessor.VisionProcessor(config, VisionProcessor.ProcessingContext())
+    processed = whole.process_frame(frame).copy()
+    morphed = whole.morph_frame(processed).copy()
+
+    failures = 0
+    for bands in BANDS:
+        config.set_tile_bands(bands)
+        tiled = VisionProcessor.VisionProcessor(config, VisionProcessor.ProcessingContext())
+
+        if not np.array_equal(tiled.process_frame(frame), processed):
+            print('process differs with %d bands' % bands)
+            failures += 1
+
+        if not np.array_equal(tiled.morph_frame(processed), morphed):
+            print('morph differs with %d bands' % bands)
+            failures += 1
+
+    return failures
+
+
+def test():
+    directory = tempfile.mkdtemp()
+    try:
+        config = VisionConfiguration.VisionConfiguration(os.path.join(directory, 'settings.conf'))
+        VisionTuner.set_range(config, (0, 60, 40), (150, 255, 200))
+        frame = make_frame()
+        cases = 0
+        failures = 0
+
+        for method, size in itertools.product((None,) + SMOOTH_METHODS, SMOOTH_SIZES):
+            config.set_should_use_smoothing(method is not None)
+            if method is not None:
+                config.set_smooth_method(method)
+            config.set_kernel_smoothing_size(size)
+
+            for open_size, close_size in MORPH_SIZES:
+                config.set_should_open(True)
+                config.set_should_close(True)
+                config.set_kernel_open_size(open_size)
+                config.set_kernel_close_size(close_size)
+
+                failed = compare(config, frame)
+                if failed > 0:
+                    print('  with smoothing %s of %d, open %d, close %d' % (method, size, open_size, close_size))
+
+                failures += failed
+                cases += len(BANDS) * 2
+
+        assert failures == 0, '%d of %d cases differ' % (failures, cases)
+        print('Every band count matched the whole frame in %d cases' % cases)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    test()
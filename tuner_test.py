@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import VisionConfiguration
+import VisionTuner
+
+
+def save_range(low, high, start_low, start_high):
+    # Sets the range over a config that starts at another range, then reads back what was saved
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'settings.conf')
+        config = VisionConfiguration.VisionConfiguration(path)
+        VisionTuner.set_range(config, start_low, start_high)
+        VisionTuner.set_range(config, low, high)
+        config.save()
+
+        saved = VisionConfiguration.VisionConfiguration(path)
+        return tuple(saved.get_low_range().tolist()), tuple(saved.get_high_range().tolist())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test():
+    # A tuned range above the current high used to have its low clamped to the old high
+    assert save_range((57, 120, 90), (61, 255, 255), (0, 0, 0), (20, 100, 80)) == ((57, 120, 90), (61, 255, 255))
+
+    # And below the current low
+    assert save_range((0, 10, 5), (20, 30, 40), (57, 120, 90), (61, 255, 255)) == ((0, 10, 5), (20, 30, 40))
+
+    # And overlapping it
+    assert save_range((10, 50, 50), (70, 200, 200), (40, 100, 100), (90, 255, 255)) == ((10, 50, 50), (70, 200, 200))
+    print('Tuned ranges are saved unchanged')
+
+
+if __name__ == "__main__":
+    test()
@@ -4,11 +4,26 @@ import time
 import VisionConfiguration
 import VisionProcessor
 from VisionFrameGrabber import VisionFrameGrabber
+from VisionFrameSource import create_frame_source, FRAME_RING_SIZE
+from VisionPlan import PIXEL_BGR
+from VisionSnapshotWriter import VisionSnapshotWriter
+from VisionRecorder import VisionRecorder, LOG_EXTENSION
+from VisionTracker import TargetTracker
+from VisionPipeline import VisionPipeline, get_ring_size
+from VisionProcessPool import VisionProcessPool
+from VisionGeometry import get_camera_model
+from VisionTelemetry import TelemetrySender
+from VisionTableBackend import FakeBackend, RemoteBackend
 import VisionTable
+import os
 import sys
+import argparse
 
 log_file = 'run.log'
 
+# Seconds between checks of the table while the pipeline is processing
+CONTROL_INTERVAL = 0.05
+
 def normalize_points(points, width, height):
     '''
     Normalizes a set of points
@@ -25,57 +40,183 @@ def normalize_points(points, width, height):
     return tuple(norm)
 
 
-def main():
+def publish_targets(table, sequence, timestamp, points, candidates, width, height, camera=None, telemetry=None):
+    '''
+    Sends the target and the other candidates to the table
+    :param table: The VisionTable to send to
+    :param sequence: The sequence number of the frame
+    :param timestamp: When the frame was captured
+    :param points: The corners of the target, None if not found
+    :param candidates: The candidates, None if they weren't searched for in this frame
+    :param width: Width of the frame
+    :param height: Height of the frame
+    :param camera: The CameraModel to work out the pose with, None to not send the pose
+    :param telemetry: The TelemetrySender to also send the target straight to the robot, None to only use the table
+    '''
+    pose = None
+    if camera is not None and points is not None:
+        pose = camera.solve_pose(points, width, height)
+
+    if points is not None:
+        points = normalize_points(points, width, height)
+
+    # The telemetry goes first since it's never held back by the publish rate
+    if telemetry is not None:
+        telemetry.send(sequence, timestamp, points, pose)
+
+    if candidates is not None:
+        candidates = [normalize_points(candidate.points, width, height) for candidate in candidates]
+
+    table.publish_detection(sequence, timestamp, points, candidates, pose)
+
+
+def main(source=0, realtime=True):
+    """
+    Runs the vision processing until told to shutdown
+    :param source: The camera index, or a video, image, image directory or frame log to replay
+    :param realtime: If replays should run at their recorded rate instead of as fast as possible
+    :return: The exit code
+    """
     with open(log_file, 'a') as f:
         f.write('Server Started\n')
 
-    vfg = VisionFrameGrabber(0, 5).start()
     config = VisionConfiguration.VisionConfiguration("settings.conf")
-    vp = VisionProcessor.VisionProcessor(config)
-    table = VisionTable.VisionTable('Vision')
+    snapshot_writer = VisionSnapshotWriter.from_config(config)
+
+    # Record the whole match to the frame log if one is configured
+    recorder = None
+    if config.get_record_path():
+        recorder = VisionRecorder(config.get_record_path(), config.get_record_max_frames())
+
+    # The pipeline holds a frame in every stage and queue, the pool copies frames out as soon as they are leased
+    ring_size = FRAME_RING_SIZE
+    if config.get_should_use_pipeline() and not config.get_should_use_process_pool():
+        ring_size = get_ring_size(config.get_pipeline_queue_size())
+
+    if isinstance(source, int):
+        vfg = VisionFrameGrabber(source, 5, ring_size=ring_size, snapshot_writer=snapshot_writer, recorder=recorder,
+                                 pixel_format=config.get_pixel_format())
+
+        # Set properties of kinect
+        vfg.stream.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.0)
+        vfg.stream.set(cv2.CAP_PROP_EXPOSURE, 0.0)
+    else:
+        # Only frame logs keep the camera's format, everything else is replayed as BGR
+        if os.path.splitext(source)[1].lower() != LOG_EXTENSION and config.get_pixel_format() != PIXEL_BGR:
+            print('Replaying %s as bgr instead of %s' % (source, config.get_pixel_format()))
+            with open(log_file, 'a') as f:
+                f.write('Replaying as bgr instead of %s\n' % config.get_pixel_format())
+
+            config.set_pixel_format(PIXEL_BGR)
+
+        vfg = create_frame_source(source, realtime, ring_size=ring_size)
+
+    # The workers fork with the shared frame slots, so start them at the size of the first frame and before
+    # the capture, the snapshot writer or the table start threads that could hold a lock while they fork
+    pool = None
+    if config.get_should_use_process_pool() and vfg.frame is not None:
+        pool = VisionProcessPool(config, None, config.get_pool_workers())
+        pool.start(vfg.frame.shape, vfg.frame.dtype)
+
+    vfg.set_should_record(recorder is not None)
+    vfg.start()
+    vp = VisionProcessor.VisionProcessor(config, VisionProcessor.ProcessingContext())
+    tracker = TargetTracker(vp)
+    table = VisionTable.VisionTable('Vision', config.get_publish_rate())
+
+    # The calibration is loaded once, only the corners of each target are undistorted
+    camera = get_camera_model(config)
 
-    # Set properties of kinect
-    vfg.stream.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.0)
-    vfg.stream.set(cv2.CAP_PROP_EXPOSURE, 0.0)
+    # Each detection can also go straight to the robot, without waiting on the table
+    telemetry = None
+    if config.get_telemetry_host():
+        telemetry = TelemetrySender(config.get_telemetry_host(), config.get_telemetry_port())
+
+    def publish(result):
+        publish_targets(table, result.sequence, result.timestamp, result.points, result.candidates, result.width,
+                        result.height, camera, telemetry)
+
+    pipeline = None
+    if pool is not None:
+        pool.publish = publish
+    elif config.get_should_use_pipeline() and not config.get_should_use_process_pool():
+        pipeline = VisionPipeline(vfg, config, publish, config.get_pipeline_queue_size()).start()
 
     if not vfg.stopped:
         with open(log_file, 'a') as f:
             f.write('Starting Vision Processing\n')
 
     loops = 0
+    last_seq = -1
 
     while not vfg.stopped:
         try:
-            table.send_exception_status(False)
-            table.send_is_online(True)
-            frame = vfg.read()
+            if pipeline is not None:
+                # The pipeline finds and publishes the targets, so this only keeps up with the table
+                time.sleep(CONTROL_INTERVAL)
+
+                if pipeline.error is not None:
+                    raise pipeline.error
+
+                loops = pipeline.published
+            elif pool is not None:
+                lease = vfg.lease_next(last_seq, 1.0)
+                if lease is None:
+                    continue
+
+                last_seq = lease.sequence
+
+                # Skips the frame if every worker is busy, and raises if one of them died
+                with lease:
+                    pool.submit(lease.frame, lease.sequence, lease.timestamp)
+
+                if pool.error is not None:
+                    raise pool.error
+
+                loops = pool.completed
+            else:
+                # Wait for a frame we haven't processed yet, and hold its buffer while we use it
+                lease = vfg.lease_next(last_seq, 1.0)
+                if lease is None:
+                    continue
 
-            height, width, c = frame.shape
+                last_seq = lease.sequence
 
-            processed = vp.process_frame(frame, config)
-            hull, biggest_hull = vp.hull_frame(processed, config, False)
-            drawn_image, points = vp.get_polygon_from_hull(biggest_hull)
+                with lease:
+                    height, width = lease.frame.shape[:2]
+                    timestamp = lease.timestamp
 
-            if points is not None:
-                normalized = normalize_points(points, width, height)
-                table.send_points(normalized)
+                    # Only runs a full search every few frames while we are tracking the target
+                    points, confidence = tracker.track(lease.frame, config)
 
-            # Get if we should shut down
-            if table.get_should_shutdown():
-                vfg.stop()
+                # The other targets are only all known on frames that searched the whole frame, not just a window
+                candidates = vp.candidates if tracker.detected and vp.last_window is None else None
+                publish_targets(table, last_seq, timestamp, points, candidates, width, height, camera, telemetry)
+                loops += 1
 
-            # Get if we should save frames
-            if table.get_should_snapshot():
-                vfg.set_should_save_frames(True)
-                table.send_should_snapshot(False)
-                with open(log_file, 'a') as f:
-                    f.write('Setting save frames true\n')
+            # The table tells us when a control key changes, so nothing is read from it here
+            if table.has_commands():
+                for key, value in table.take_commands():
+                    # Get if we should shut down
+                    if key == VisionTable.SHOULD_SHUTDOWN and value:
+                        vfg.stop()
 
-                print('Saving Images')
+                    # Get if we should save frames
+                    if key == VisionTable.TAKE_SNAPSHOT and value:
+                        vfg.set_should_save_frames(True)
+                        table.send_should_snapshot(False)
+                        with open(log_file, 'a') as f:
+                            f.write('Setting save frames true\n')
 
-            loops += 1
+                        print('Saving Images')
+
+            table.send_exception_status(False)
+            table.send_is_online(True)
             table.send_loops(loops)
 
+            # Send the latest detection if the publish rate held it back, and any acknowledgements
+            table.flush()
+
         except KeyboardInterrupt:
             vfg.stop()
             time.sleep(5)
@@ -87,8 +228,8 @@ def main():
             vfg.stop()
             with open(log_file, 'a') as f:
                 f.write('Exception Processing vision\n')
-                f.write(e.args)
-                f.write(e.message)
+                f.write(str(e.args) + '\n')
+                f.write(str(e.message) + '\n')
         except:
             print(sys.exc_info())
             print(sys.exc_traceback)
@@ -99,6 +240,15 @@ def main():
                 f.write(sys.exc_info())
                 f.write(sys.exc_traceback)
 
+    if pipeline is not None:
+        pipeline.stop()
+
+    if pool is not None:
+        pool.stop()
+
+    if telemetry is not None:
+        telemetry.close()
+
     with open(log_file, 'a') as f:
         f.write('Server shutting down\n')
 
@@ -116,5 +266,21 @@ def main():
     return 0
 
 if __name__ == '__main__':
-    code = main()
+    parser = argparse.ArgumentParser(description='Runs the vision processing')
+    parser.add_argument('source', nargs='?', default='0',
+                        help='Camera index, or a video, image, image directory or frame log to replay')
+    parser.add_argument('--max-rate', action='store_true',
+                        help='Replay as fast as frames are processed instead of at the recorded rate')
+    parser.add_argument('--table', default=None,
+                        help='"fake" to keep the tables in the process, or the host:port of a table server')
+    args = parser.parse_args()
+
+    # Off the robot the tables can be faked, or served by VisionTableBackend on another machine or localhost
+    if args.table == 'fake':
+        VisionTable.set_backend(FakeBackend())
+    elif args.table is not None:
+        host, port = args.table.rsplit(':', 1)
+        VisionTable.set_backend(RemoteBackend((host, int(port))))
+
+    code = main(int(args.source) if args.source.isdigit() else args.source, not args.max_rate)
     sys.exit(code)